@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import json
 from pathlib import Path
 from decouple import config, Csv
 
@@ -56,6 +57,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'notifications.metrics.MetricsMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -86,6 +88,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Banco de testes em arquivo: o SQLite em memória usa cache
+        # compartilhado, que não espera por locks e faz os testes de envio
+        # concorrente falharem com "database table is locked".
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
@@ -158,3 +166,105 @@ EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@example.com')
+
+# Cache Configuration
+# Backend do cache: locmem (padrão, por processo), arquivo
+# (django.core.cache.backends.filebased.FileBasedCache, com um diretório em
+# CACHE_LOCATION) ou Redis (django.core.cache.backends.redis.RedisCache, com
+# redis://host:6379/0 em CACHE_LOCATION; requer o pacote redis)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='notifications'),
+    }
+}
+
+# Notifications Configuration
+# 'sync' envia o email durante a requisição; 'queue' apenas enfileira a
+# notificação para os workers iniciados com `manage.py deliver_notifications`.
+NOTIFICATIONS_SEND_MODE = config('NOTIFICATIONS_SEND_MODE', default='sync')
+# Tempo após o qual uma notificação reservada por um worker que não a
+# concluiu (por exemplo, porque o processo morreu) volta para a fila.
+NOTIFICATIONS_DELIVERY_LEASE_SECONDS = config('NOTIFICATIONS_DELIVERY_LEASE_SECONDS', default=300, cast=int)
+# Pool de conexões SMTP reutilizadas pelos envios (ver notifications/smtp_pool.py)
+NOTIFICATIONS_SMTP_POOL_SIZE = config('NOTIFICATIONS_SMTP_POOL_SIZE', default=4, cast=int)
+NOTIFICATIONS_SMTP_POOL_IDLE_TIMEOUT = config('NOTIFICATIONS_SMTP_POOL_IDLE_TIMEOUT', default=60, cast=int)
+NOTIFICATIONS_SMTP_POOL_MAX_MESSAGES = config('NOTIFICATIONS_SMTP_POOL_MAX_MESSAGES', default=100, cast=int)
+# Quantidade máxima de notificações aceitas por POST /api/notifications/send-batch/
+NOTIFICATIONS_BATCH_MAX_SIZE = config('NOTIFICATIONS_BATCH_MAX_SIZE', default=1000, cast=int)
+# Paginação da listagem: 'page' (número de página, com contagem total) ou
+# 'cursor' (keyset sobre created_at/id, custo constante em qualquer página)
+NOTIFICATIONS_PAGINATION = config('NOTIFICATIONS_PAGINATION', default='page')
+NOTIFICATIONS_MAX_PAGE_SIZE = config('NOTIFICATIONS_MAX_PAGE_SIZE', default=100, cast=int)
+# Novas tentativas de envio após erros temporários (respostas SMTP 4xx,
+# quedas de conexão, timeouts), com backoff exponencial entre elas
+NOTIFICATIONS_MAX_ATTEMPTS = config('NOTIFICATIONS_MAX_ATTEMPTS', default=5, cast=int)
+NOTIFICATIONS_RETRY_BASE_DELAY = config('NOTIFICATIONS_RETRY_BASE_DELAY', default=30, cast=int)
+NOTIFICATIONS_RETRY_MAX_DELAY = config('NOTIFICATIONS_RETRY_MAX_DELAY', default=3600, cast=int)
+# Limites de envio por domínio do destinatário (ver notifications/throttling.py).
+# RATE é o número de emails por segundo, BURST quantos podem sair de uma vez
+# e CONCURRENCY o número de envios simultâneos; 0 desativa o limite. Os
+# envios acima do limite são adiados, não marcados como falha.
+NOTIFICATIONS_DOMAIN_RATE = config('NOTIFICATIONS_DOMAIN_RATE', default=0, cast=float)
+NOTIFICATIONS_DOMAIN_BURST = config('NOTIFICATIONS_DOMAIN_BURST', default=0, cast=int)
+NOTIFICATIONS_DOMAIN_CONCURRENCY = config('NOTIFICATIONS_DOMAIN_CONCURRENCY', default=0, cast=int)
+# Limites específicos por domínio, em JSON, por exemplo:
+# {"gmail.com": {"rate": 5, "burst": 10, "concurrency": 2}}
+NOTIFICATIONS_DOMAIN_LIMITS = config('NOTIFICATIONS_DOMAIN_LIMITS', default='{}', cast=json.loads)
+# Pesos das faixas de prioridade da fila de entrega: cada lote reservado por
+# um worker reserva para cada faixa uma parte proporcional ao seu peso, para
+# que as faixas de menor prioridade não fiquem paradas durante campanhas
+NOTIFICATIONS_PRIORITY_WEIGHTS = config(
+    'NOTIFICATIONS_PRIORITY_WEIGHTS', default='{"high": 6, "normal": 3, "low": 1}', cast=json.loads
+)
+# Clientes SMTP em uso ao mesmo tempo no envio assíncrono (POST /api/notifications/send-async/)
+# por event loop, quando o pacote opcional aiosmtplib está instalado
+NOTIFICATIONS_ASYNC_SMTP_CONCURRENCY = config('NOTIFICATIONS_ASYNC_SMTP_CONCURRENCY', default=200, cast=int)
+# Quantidade de templates de notificação compilados mantidos em cache por processo
+NOTIFICATIONS_TEMPLATE_CACHE_SIZE = config('NOTIFICATIONS_TEMPLATE_CACHE_SIZE', default=128, cast=int)
+# Corpos de mensagem a partir deste tamanho (em bytes) são gravados
+# comprimidos com zlib; 0 desativa a compressão
+NOTIFICATIONS_BODY_COMPRESSION_THRESHOLD = config('NOTIFICATIONS_BODY_COMPRESSION_THRESHOLD', default=1024, cast=int)
+# Retenção do histórico (comando purge_notifications): notificações enviadas
+# e com falha criadas há mais dias que estes são removidas; 0 mantém para sempre
+NOTIFICATIONS_RETENTION_SENT_DAYS = config('NOTIFICATIONS_RETENTION_SENT_DAYS', default=90, cast=int)
+NOTIFICATIONS_RETENTION_FAILED_DAYS = config('NOTIFICATIONS_RETENTION_FAILED_DAYS', default=30, cast=int)
+# Notificações lidas do banco por consulta na exportação do histórico
+# (GET /api/notifications/export/)
+NOTIFICATIONS_EXPORT_CHUNK_SIZE = config('NOTIFICATIONS_EXPORT_CHUNK_SIZE', default=2000, cast=int)
+# Notificações removidas ou reenfileiradas por transação nas ações em
+# conjunto (bulk-delete, bulk-requeue e ações do admin)
+NOTIFICATIONS_BULK_CHUNK_SIZE = config('NOTIFICATIONS_BULK_CHUNK_SIZE', default=1000, cast=int)
+# Tempo, em segundos, que as respostas da listagem, dos detalhes e das
+# estatísticas ficam no cache (CACHES); 0 desativa o cache de respostas. As
+# respostas são invalidadas a cada alteração das notificações feita pela
+# aplicação. Com vários processos, use um cache compartilhado (Redis ou
+# arquivo), e não o locmem.
+NOTIFICATIONS_RESPONSE_CACHE_TIMEOUT = config('NOTIFICATIONS_RESPONSE_CACHE_TIMEOUT', default=0, cast=int)
+# Espera padrão e máxima, em segundos, do long-poll
+# (GET /api/notifications/{id}/wait/) e do stream SSE de status
+# (GET /api/notifications/events/)
+NOTIFICATIONS_WAIT_TIMEOUT = config('NOTIFICATIONS_WAIT_TIMEOUT', default=30, cast=float)
+NOTIFICATIONS_WAIT_MAX_TIMEOUT = config('NOTIFICATIONS_WAIT_MAX_TIMEOUT', default=120, cast=float)
+# Quantidade máxima de notificações acompanhadas por um stream SSE
+NOTIFICATIONS_EVENTS_MAX_IDS = config('NOTIFICATIONS_EVENTS_MAX_IDS', default=100, cast=int)
+# Intervalo, em segundos, da consulta que percebe as mudanças de status
+# feitas por outros processos (workers) enquanto há clientes aguardando;
+# 0 desativa, restando apenas os eventos do próprio processo
+NOTIFICATIONS_EVENTS_POLL_INTERVAL = config('NOTIFICATIONS_EVENTS_POLL_INTERVAL', default=2, cast=float)
+# Métricas no formato do Prometheus (GET /metrics): duração das etapas do
+# envio, resultados por domínio, duração e consultas por requisição e
+# profundidade da fila. Desativadas, a instrumentação não registra nada e o
+# endpoint responde 404. Os valores valem por processo.
+NOTIFICATIONS_METRICS_ENABLED = config('NOTIFICATIONS_METRICS_ENABLED', default=False, cast=bool)
+# Domínios de destinatário com série própria nas métricas; os demais são
+# agrupados como "other"
+NOTIFICATIONS_METRICS_MAX_DOMAINS = config('NOTIFICATIONS_METRICS_MAX_DOMAINS', default=50, cast=int)
+# Indica se há workers de `manage.py deliver_notifications` em execução para
+# repetir os envios adiados. Sem eles, os envios síncronos não agendam novas
+# tentativas: erros temporários e o limite do domínio resultam em 'failed',
+# liberando o conteúdo para ser enviado de novo. Ativado por padrão no modo
+# 'queue', que depende dos workers.
+NOTIFICATIONS_DELIVERY_WORKERS = config(
+    'NOTIFICATIONS_DELIVERY_WORKERS', default=NOTIFICATIONS_SEND_MODE == 'queue', cast=bool
+)
@@ -1,22 +1,136 @@
-from django.contrib import admin
-from .models import Notification
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ORDER_VAR, PAGE_VAR, ChangeList
+from .models import Notification, NotificationCounter, NotificationTemplate
+from .pagination import EstimatedCountPaginator
+
+
+class NotificationAdminForm(forms.ModelForm):
+    """
+    Formulário do admin com o corpo da mensagem editável como texto; ele é
+    gravado em MessageBody ao salvar a notificação.
+    """
+    message = forms.CharField(
+        label='Mensagem',
+        required=False,
+        widget=forms.Textarea,
+        help_text='Corpo da mensagem do email (vazio quando gerado por um template)'
+    )
+    
+    class Meta:
+        model = Notification
+        exclude = ['message_body']
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk is not None:
+            self.initial.setdefault('message', self.instance.message)
+    
+    def clean(self):
+        cleaned_data = super().clean()
+        # Antes da validação do modelo, que verifica duplicatas pelo corpo
+        if 'message' in self.changed_data:
+            self.instance.message = cleaned_data.get('message')
+        return cleaned_data
+
+
+class NotificationChangeList(ChangeList):
+    """
+    Listagem do admin que lê do banco apenas as colunas exibidas, sem os
+    campos de texto longos (error_message, context).
+    """
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).only(
+            'id', *self.model_admin.list_display
+        )
 
 
 @admin.register(Notification)
 class NotificationAdmin(admin.ModelAdmin):
-    list_display = ['subject', 'recipient_email', 'status', 'created_at', 'sent_at']
-    list_filter = ['status', 'created_at', 'sent_at']
-    search_fields = ['recipient_email', 'subject', 'message']
+    form = NotificationAdminForm
+    list_display = ['subject', 'recipient_email', 'status', 'priority', 'created_at', 'sent_at']
+    list_filter = ['status', 'priority', 'sent_at']
+    # Navegação por data de criação, coberta por notif_created_id_idx
+    date_hierarchy = 'created_at'
+    # A busca é exata e indexada (ver get_search_results): um LIKE '%...%'
+    # percorreria a tabela inteira
+    search_fields = ['recipient_email']
+    search_help_text = 'Email exato do destinatário ou id da notificação'
     readonly_fields = ['created_at', 'sent_at']
+    # Sem o COUNT(*) da tabela inteira a cada página filtrada
+    show_full_result_count = False
+    paginator = EstimatedCountPaginator
+    
+    actions = ['delete_notifications', 'requeue_notifications']
     
     fieldsets = (
         ('Informações do Email', {
-            'fields': ('recipient_email', 'subject', 'message')
+            'fields': ('recipient_email', 'subject', 'message', 'template', 'context')
         }),
         ('Status', {
-            'fields': ('status', 'error_message')
+            'fields': ('status', 'priority', 'error_message')
         }),
         ('Datas', {
             'fields': ('created_at', 'sent_at')
         }),
     )
+    
+    def get_changelist(self, request, **kwargs):
+        return NotificationChangeList
+    
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        return self.paginator(
+            queryset, per_page, orphans, allow_empty_first_page,
+            estimate=lambda: self.estimate_count(request)
+        )
+    
+    def estimate_count(self, request):
+        """
+        Conta as notificações da listagem pelos contadores das estatísticas
+        quando ela não tem filtros ou é filtrada apenas por status; retorna
+        None nos demais casos.
+        """
+        params = set(request.GET) - {PAGE_VAR, ORDER_VAR}
+        if not params:
+            return NotificationCounter.objects.totals()['total']
+        if params == {'status__exact'}:
+            return NotificationCounter.objects.totals().get(request.GET['status__exact'], 0)
+        return None
+    
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if search_term.isdigit():
+            return queryset.filter(pk=int(search_term)), False
+        return queryset.filter(recipient_email=search_term.lower()), False
+    
+    def get_actions(self, request):
+        # A ação padrão carrega e remove as notificações uma a uma
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+    
+    @admin.action(description='Remover notificações selecionadas', permissions=['delete'])
+    def delete_notifications(self, request, queryset):
+        deleted = Notification.objects.bulk_delete(queryset)
+        self.message_user(request, f'{deleted} notificação(ões) removida(s).', messages.SUCCESS)
+    
+    @admin.action(description='Reenfileirar notificações com falha', permissions=['change'])
+    def requeue_notifications(self, request, queryset):
+        requeued, skipped = Notification.objects.bulk_requeue(queryset)
+        self.message_user(
+            request,
+            f'{requeued} notificação(ões) reenfileirada(s), {skipped} ignorada(s) por já '
+            f'haver outra pendente ou enviada com o mesmo conteúdo.',
+            messages.SUCCESS
+        )
+
+
+@admin.register(NotificationTemplate)
+class NotificationTemplateAdmin(admin.ModelAdmin):
+    list_display = ['name', 'subject', 'version', 'updated_at']
+    search_fields = ['name', 'subject']
+    readonly_fields = ['version', 'created_at', 'updated_at']
+
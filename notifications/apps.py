@@ -5,3 +5,10 @@ class NotificationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'notifications'
     verbose_name = 'Notificações'
+    
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from .metrics import install_query_counter
+        
+        # Conta as consultas de cada requisição (ver MetricsMiddleware)
+        connection_created.connect(install_query_counter)
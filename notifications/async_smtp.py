@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import time
+import weakref
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .metrics import timed
+from .smtp_pool import PooledConnection, get_pool
+
+try:
+    import aiosmtplib
+except ImportError:  # dependência opcional
+    aiosmtplib = None
+
+logger = logging.getLogger(__name__)
+
+
+SMTP_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+
+# Um pool por event loop: os clientes do aiosmtplib e as primitivas do
+# asyncio não podem ser compartilhados entre loops diferentes
+_pools = weakref.WeakKeyDictionary()
+
+
+def async_transport_available():
+    """
+    Indica se os envios assíncronos usam o cliente SMTP não bloqueante:
+    requer o pacote aiosmtplib e EMAIL_BACKEND configurado para SMTP. Com
+    outros backends (console, locmem, arquivo), o envio é delegado ao pool
+    síncrono em uma thread.
+    """
+    return aiosmtplib is not None and settings.EMAIL_BACKEND == SMTP_BACKEND
+
+
+class AsyncSMTPConnectionPool:
+    """
+    Pool de clientes aiosmtplib conectados e autenticados de um event loop,
+    reutilizados entre envios como no SMTPConnectionPool síncrono.
+    
+    Cada cliente é aberto uma única vez (conexão, STARTTLS e autenticação)
+    e devolvido ao pool após o envio, até atingir `max_messages` mensagens
+    ou ficar ocioso por mais de `idle_timeout` segundos. No máximo `size`
+    clientes ficam em uso ao mesmo tempo; os demais envios aguardam um
+    cliente ser liberado.
+    """
+    
+    def __init__(self, size=200, idle_timeout=60, max_messages=100):
+        self.idle_timeout = idle_timeout
+        self.max_messages = max_messages
+        self._idle = []
+        self._slots = asyncio.Semaphore(size)
+        self.connections_opened = 0
+    
+    async def _open(self):
+        client = aiosmtplib.SMTP(
+            hostname=settings.EMAIL_HOST,
+            port=settings.EMAIL_PORT,
+            username=settings.EMAIL_HOST_USER or None,
+            password=settings.EMAIL_HOST_PASSWORD or None,
+            use_tls=settings.EMAIL_USE_SSL,
+            start_tls=settings.EMAIL_USE_TLS,
+            timeout=settings.EMAIL_TIMEOUT,
+        )
+        # connect() faz a conexão, o STARTTLS e a autenticação
+        with timed('smtp_connect'):
+            await client.connect()
+        self.connections_opened += 1
+        return PooledConnection(client)
+    
+    async def _discard(self, pooled):
+        try:
+            await pooled.backend.quit()
+        except Exception as e:
+            logger.warning(f"Erro ao fechar conexão SMTP assíncrona descartada: {e}")
+            pooled.backend.close()
+    
+    async def _checkout(self):
+        while self._idle:
+            pooled = self._idle.pop()
+            if pooled.idle_for() <= self.idle_timeout and pooled.backend.is_connected:
+                return pooled
+            # Cliente ocioso demais: o servidor provavelmente já o desconectou
+            await self._discard(pooled)
+        return await self._open()
+    
+    async def _checkin(self, pooled):
+        if pooled.messages_sent < self.max_messages:
+            pooled.last_used = time.monotonic()
+            self._idle.append(pooled)
+        else:
+            await self._discard(pooled)
+    
+    async def send(self, message):
+        """
+        Envia uma EmailMessage por um cliente do pool.
+        
+        Se a conexão tiver caído, o cliente é substituído por um novo e o
+        envio é repetido uma vez. Um cliente cujo envio falhou por outro
+        motivo é descartado.
+        
+        Returns:
+            int: número de mensagens enviadas
+        """
+        async with self._slots:
+            for attempt in range(2):
+                pooled = await self._checkout()
+                try:
+                    with timed('smtp_data'):
+                        await pooled.backend.send_message(
+                            message.message(),
+                            sender=message.from_email,
+                            recipients=message.recipients(),
+                        )
+                except aiosmtplib.SMTPServerDisconnected as e:
+                    pooled.backend.close()
+                    if attempt:
+                        raise
+                    logger.warning(f"Conexão SMTP assíncrona perdida ({e}); reconectando")
+                    continue
+                except BaseException:
+                    await self._discard(pooled)
+                    raise
+                pooled.messages_sent += 1
+                await self._checkin(pooled)
+                return 1
+    
+    def idle_connections(self):
+        return len(self._idle)
+    
+    def close(self):
+        """
+        Fecha as conexões dos clientes ociosos do pool, sem a conversa de
+        encerramento (QUIT), para poder ser chamado fora do event loop.
+        """
+        idle, self._idle = self._idle, []
+        for pooled in idle:
+            try:
+                pooled.backend.close()
+            except RuntimeError:
+                # O event loop do cliente já foi encerrado
+                pass
+
+
+def get_async_pool():
+    """
+    Retorna o pool de clientes SMTP assíncronos do event loop em execução,
+    criando-o na primeira chamada a partir de
+    NOTIFICATIONS_ASYNC_SMTP_CONCURRENCY e NOTIFICATIONS_SMTP_POOL_*.
+    """
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        pool = _pools[loop] = AsyncSMTPConnectionPool(
+            size=settings.NOTIFICATIONS_ASYNC_SMTP_CONCURRENCY,
+            idle_timeout=settings.NOTIFICATIONS_SMTP_POOL_IDLE_TIMEOUT,
+            max_messages=settings.NOTIFICATIONS_SMTP_POOL_MAX_MESSAGES,
+        )
+    return pool
+
+
+@receiver(setting_changed)
+def _reset_async_pools_on_setting_change(setting, **kwargs):
+    if setting.startswith(('EMAIL_', 'NOTIFICATIONS_SMTP_POOL_', 'NOTIFICATIONS_ASYNC_SMTP_')):
+        pools = list(_pools.values())
+        _pools.clear()
+        for pool in pools:
+            pool.close()
+
+
+async def asend_message(message):
+    """
+    Envia uma EmailMessage sem bloquear o event loop.
+    
+    Com aiosmtplib, o envio usa um cliente já conectado do pool do event
+    loop (ver AsyncSMTPConnectionPool), e no máximo
+    NOTIFICATIONS_ASYNC_SMTP_CONCURRENCY clientes ficam em uso ao mesmo
+    tempo por event loop. Sem ele, o envio é feito pelo pool de conexões
+    síncrono em uma thread separada.
+    """
+    if not async_transport_available():
+        # thread_sensitive=False: os envios não precisam ficar serializados
+        # na thread compartilhada usada pelo ORM
+        return await sync_to_async(get_pool().send, thread_sensitive=False)(message)
+    
+    return await get_async_pool().send(message)
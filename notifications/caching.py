@@ -0,0 +1,195 @@
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+# Versão do conteúdo das notificações: faz parte da chave de todas as
+# respostas em cache e é incrementada a cada alteração, invalidando-as de
+# uma vez sem precisar apagá-las
+VERSION_KEY = 'notifications:version'
+
+
+def response_cache_enabled():
+    return settings.NOTIFICATIONS_RESPONSE_CACHE_TIMEOUT > 0
+
+
+def get_version():
+    """
+    Retorna a versão atual do conteúdo das notificações.
+    
+    A versão inicial vem do relógio, e não de 1, para que um cache
+    reiniciado ou que descartou a chave não volte a uma versão já usada.
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # A chave expirou ou foi descartada
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def invalidate_responses():
+    """
+    Invalida as respostas em cache das notificações.
+    
+    A versão é incrementada imediatamente, para que as próximas leituras na
+    mesma transação não usem respostas antigas, e de novo após o commit,
+    para descartar respostas montadas por outras requisições com os dados
+    de antes do commit.
+    """
+    if not response_cache_enabled():
+        return
+    _bump_version()
+    transaction.on_commit(_bump_version)
+
+
+def request_digest(request, *parts):
+    """
+    Resume em um hash as partes informadas, o caminho com os query
+    parameters (filtros, página) e o formato negociado da requisição.
+    """
+    params = sorted(request.query_params.lists())
+    accepted = getattr(request, 'accepted_renderer', None)
+    return hashlib.sha256(
+        f'{parts}|{request.path}|{params}|{accepted.format if accepted else ""}'.encode('utf-8')
+    ).hexdigest()
+
+
+def cached_response(request, build):
+    """
+    Retorna a resposta de uma leitura da API a partir do cache, montando-a
+    com `build()` quando necessário.
+    
+    A chave inclui o caminho com os query parameters (filtros, página),
+    o formato negociado e a versão do conteúdo. A resposta leva um ETag
+    derivado da chave; se o cliente enviar o mesmo ETag em If-None-Match, a
+    resposta é 304, sem consultar o banco nem o conteúdo em cache.
+    
+    Args:
+        request: requisição DRF
+        build (callable): monta a Response quando ela não está em cache;
+            apenas respostas 200 são guardadas
+    """
+    if not response_cache_enabled():
+        return build()
+    
+    digest = request_digest(request, get_version())
+    etag = quote_etag(digest[:32])
+    
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    
+    key = f'notifications:response:{digest}'
+    data = cache.get(key)
+    if data is not None:
+        response = Response(data)
+    else:
+        response = build()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        cache.set(key, response.data, settings.NOTIFICATIONS_RESPONSE_CACHE_TIMEOUT)
+    response['ETag'] = etag
+    return response
+
+
+def cache_response(view_method):
+    """
+    Decorator de métodos de ViewSet que passa a resposta por
+    cached_response.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        return cached_response(request, lambda: view_method(self, request, *args, **kwargs))
+    return wrapper
+
+
+def validator_etag(request, *parts):
+    """
+    Monta o ETag de uma resposta a partir das partes que determinam o seu
+    conteúdo, como a data da última alteração.
+    """
+    return quote_etag(request_digest(request, *parts)[:32])
+
+
+def conditional_response(request, validators, build):
+    """
+    Atende requisições condicionais (If-None-Match e If-Modified-Since)
+    sem montar a resposta.
+    
+    Os validadores vêm de uma consulta barata, que não serializa as
+    notificações; se o cliente já tem a versão atual, a resposta é 304.
+    Caso contrário, a resposta de `build()` (que pode vir de
+    cached_response) recebe os cabeçalhos ETag e Last-Modified. Ao
+    contrário do ETag de cached_response, este não muda a cada invalidação
+    do cache, apenas quando as notificações da resposta mudam.
+    
+    Last-Modified tem precisão de segundos: enquanto o segundo de
+    last_modified não terminou, uma nova alteração no mesmo segundo teria
+    a mesma data, e If-Modified-Since responderia 304 com a versão antiga.
+    Nesse intervalo a resposta traz só o ETag e If-Modified-Since é ignorado.
+    
+    Args:
+        request: requisição DRF
+        validators (callable): retorna (etag, last_modified), com
+            last_modified datetime ou None, ou None quando não há o que
+            validar (por exemplo, notificação inexistente)
+        build (callable): monta a Response
+    """
+    if response_cache_enabled():
+        # Os validadores ficam em cache com a versão do conteúdo, como as
+        # respostas: leituras repetidas não consultam o banco
+        key = f'notifications:validators:{request_digest(request, get_version())}'
+        current = cache.get(key)
+        if current is None:
+            current = validators()
+            if current is not None:
+                cache.set(key, current, settings.NOTIFICATIONS_RESPONSE_CACHE_TIMEOUT)
+    else:
+        current = validators()
+    if current is None:
+        return build()
+    
+    etag, last_modified = current
+    headers = {'ETag': etag}
+    timestamp = None
+    if last_modified is not None and int(timezone.now().timestamp()) > int(last_modified.timestamp()):
+        timestamp = int(last_modified.timestamp())
+        headers['Last-Modified'] = http_date(timestamp)
+    
+    response = get_conditional_response(request._request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = build()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def conditional(view_method):
+    """
+    Decorator de métodos de ViewSet que passa a resposta por
+    conditional_response, com os validadores de `get_validators()` da view.
+    """
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        return conditional_response(
+            request, self.get_validators, lambda: view_method(self, request, *args, **kwargs)
+        )
+    return wrapper
@@ -0,0 +1,93 @@
+import logging
+import threading
+
+from django.db import close_old_connections, connection
+
+from .services import EmailService
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryWorker(threading.Thread):
+    """
+    Worker que drena a fila de notificações pendentes.
+    
+    Cada worker reserva lotes de notificações com
+    EmailService.claim_pending e as entrega uma a uma. Quando a fila está
+    vazia, aguarda `poll_interval` segundos antes de consultar de novo, ou
+    encerra se `drain` for True.
+    """
+    
+    def __init__(self, stop_event, batch_size=50, poll_interval=1.0, drain=False, **kwargs):
+        super().__init__(daemon=True, **kwargs)
+        self.stop_event = stop_event
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.drain = drain
+        self.sent = 0
+        self.failed = 0
+        self.deferred = 0
+    
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                close_old_connections()
+                batch = EmailService.claim_pending(self.batch_size)
+                
+                if not batch:
+                    if self.drain:
+                        break
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+                
+                for notification in batch:
+                    success, _ = EmailService.deliver(notification)
+                    if success:
+                        self.sent += 1
+                    elif notification.status == 'pending':
+                        # Nova tentativa agendada ou domínio acima do limite
+                        self.deferred += 1
+                    else:
+                        self.failed += 1
+        except Exception:
+            logger.exception(f"Worker {self.name} interrompido por erro inesperado")
+        finally:
+            connection.close()
+
+
+def run_workers(workers=4, batch_size=50, poll_interval=1.0, drain=False, stop_event=None):
+    """
+    Inicia `workers` DeliveryWorkers e aguarda até que todos terminem.
+    
+    Returns:
+        tuple: (enviadas, falhas, adiadas) somadas entre os workers
+    """
+    stop_event = stop_event or threading.Event()
+    pool = [
+        DeliveryWorker(
+            stop_event,
+            batch_size=batch_size,
+            poll_interval=poll_interval,
+            drain=drain,
+            name=f'delivery-worker-{index}',
+        )
+        for index in range(workers)
+    ]
+    for worker in pool:
+        worker.start()
+    
+    try:
+        for worker in pool:
+            # join com timeout para que o KeyboardInterrupt seja tratado
+            while worker.is_alive():
+                worker.join(timeout=0.5)
+    except KeyboardInterrupt:
+        stop_event.set()
+        for worker in pool:
+            worker.join()
+    
+    return (
+        sum(w.sent for w in pool),
+        sum(w.failed for w in pool),
+        sum(w.deferred for w in pool),
+    )
@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.dispatch import receiver
+
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+
+# Campos das notificações enviados nos eventos de status
+EVENT_FIELDS = ['id', 'status', 'attempts', 'error_message', 'sent_at', 'updated_at']
+
+
+def notification_event(notification):
+    """
+    Monta o evento de status de uma notificação.
+    """
+    return {field: getattr(notification, field) for field in EVENT_FIELDS}
+
+
+def read_events(ids):
+    """
+    Lê do banco o estado atual das notificações, como eventos de status.
+    """
+    return list(Notification.objects.filter(id__in=ids).order_by('id').values(*EVENT_FIELDS))
+
+
+class Subscription:
+    """
+    Inscrição de um cliente (long-poll ou SSE) nos eventos de status de um
+    conjunto de notificações.
+    
+    Os eventos chegam por uma fila do event loop em que a inscrição foi
+    criada. Cada notificação só gera um novo evento quando o seu updated_at
+    avança, de modo que o mesmo estado publicado pelo EmailService e lido
+    pela consulta periódica do broker é entregue uma única vez.
+    """
+    
+    def __init__(self, broker, ids, loop):
+        self.broker = broker
+        self.ids = frozenset(ids)
+        self.loop = loop
+        self._queue = asyncio.Queue()
+        self._last = {}
+    
+    def mark(self, event):
+        """
+        Registra um estado já conhecido pelo cliente, sem enfileirá-lo.
+        Retorna False se o estado não for mais recente que o último.
+        """
+        last = self._last.get(event['id'])
+        if last is not None and event['updated_at'] <= last:
+            return False
+        self._last[event['id']] = event['updated_at']
+        return True
+    
+    def _deliver(self, event):
+        # Executado no event loop da inscrição
+        if self.mark(event):
+            self._queue.put_nowait(event)
+    
+    async def next_event(self, timeout):
+        """
+        Aguarda o próximo evento por até `timeout` segundos; retorna None
+        se nenhum chegar.
+        """
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+    
+    def close(self):
+        self.broker.unsubscribe(self)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class StatusBroker:
+    """
+    Distribui, dentro do processo, os eventos de status das notificações
+    aos clientes que aguardam por eles (ver views.wait_notification e
+    views.notification_events).
+    
+    O EmailService publica as transições feitas no próprio processo assim
+    que são gravadas. As feitas por outros processos (workers de
+    deliver_notifications, outras instâncias da API) são percebidas por uma
+    consulta periódica, a cada `poll_interval` segundos, que lê de uma vez
+    todas as notificações aguardadas no event loop, qualquer que seja o
+    número de clientes.
+    """
+    
+    def __init__(self, poll_interval=2.0):
+        self.poll_interval = poll_interval
+        self._subscriptions = {}
+        self._loop_counts = {}
+        self._pollers = {}
+        self._lock = threading.Lock()
+    
+    def has_subscribers(self):
+        return bool(self._subscriptions)
+    
+    def subscribe(self, ids):
+        """
+        Inscreve o event loop atual nos eventos das notificações informadas.
+        """
+        loop = asyncio.get_running_loop()
+        subscription = Subscription(self, ids, loop)
+        with self._lock:
+            for notification_id in subscription.ids:
+                self._subscriptions.setdefault(notification_id, set()).add(subscription)
+            self._loop_counts[loop] = self._loop_counts.get(loop, 0) + 1
+            if self.poll_interval > 0 and loop not in self._pollers:
+                self._pollers[loop] = loop.create_task(self._poll(loop))
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for notification_id in subscription.ids:
+                subscriptions = self._subscriptions.get(notification_id)
+                if subscriptions is not None:
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del self._subscriptions[notification_id]
+            self._loop_counts[subscription.loop] -= 1
+            if not self._loop_counts[subscription.loop]:
+                # Último cliente do event loop: encerra a consulta periódica
+                del self._loop_counts[subscription.loop]
+                poller = self._pollers.pop(subscription.loop, None)
+                if poller is not None:
+                    poller.cancel()
+    
+    def publish(self, events):
+        """
+        Entrega os eventos aos inscritos nas respectivas notificações. Pode
+        ser chamado de qualquer thread.
+        """
+        deliveries = []
+        with self._lock:
+            for event in events:
+                for subscription in self._subscriptions.get(event['id'], ()):
+                    deliveries.append((subscription, event))
+        for subscription, event in deliveries:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._deliver, event)
+            except RuntimeError:
+                # O event loop da inscrição já foi encerrado
+                pass
+    
+    def _loop_ids(self, loop):
+        return {
+            notification_id
+            for notification_id, subscriptions in self._subscriptions.items()
+            if any(subscription.loop is loop for subscription in subscriptions)
+        }
+    
+    async def _poll(self, loop):
+        read = sync_to_async(self._read_events, thread_sensitive=False)
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            with self._lock:
+                ids = self._loop_ids(loop)
+            if not ids:
+                continue
+            try:
+                self.publish(await read(ids))
+            except Exception:
+                # Uma falha de leitura (banco indisponível, conexão caída)
+                # não pode encerrar a consulta periódica: os clientes do
+                # event loop deixariam de perceber as transições de outros
+                # processos. _read_events já descartou, com
+                # close_old_connections, a conexão que falhou.
+                logger.exception('Falha na consulta periódica dos eventos de status')
+    
+    @staticmethod
+    def _read_events(ids):
+        # Executado em uma thread do pool, fora do ciclo de uma requisição
+        close_old_connections()
+        try:
+            return read_events(ids)
+        finally:
+            close_old_connections()
+
+
+def publish_notifications(notifications):
+    """
+    Publica o estado das notificações após o commit da transação atual.
+    Não faz nada se nenhum cliente estiver aguardando.
+    """
+    broker = get_broker()
+    if not broker.has_subscribers():
+        return
+    events = [notification_event(notification) for notification in notifications]
+    transaction.on_commit(lambda: broker.publish(events))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """
+    Retorna o broker de eventos de status do processo, criado na primeira
+    chamada a partir de NOTIFICATIONS_EVENTS_POLL_INTERVAL.
+    """
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = StatusBroker(poll_interval=settings.NOTIFICATIONS_EVENTS_POLL_INTERVAL)
+    return _broker
+
+
+def reset_broker():
+    """
+    Descarta o broker do processo; o próximo get_broker() cria um novo com
+    as configurações atuais.
+    """
+    global _broker
+    with _broker_lock:
+        _broker = None
+
+
+@receiver(setting_changed)
+def _reset_broker_on_setting_change(setting, **kwargs):
+    if setting == 'NOTIFICATIONS_EVENTS_POLL_INTERVAL':
+        reset_broker()
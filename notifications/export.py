@@ -0,0 +1,97 @@
+import csv
+import json
+import zlib
+
+from rest_framework.renderers import BaseRenderer
+
+
+# Tamanho aproximado, em bytes, de cada pedaço enviado ao cliente: linhas
+# demais por pedaço aumentam a memória, de menos multiplicam as escritas
+STREAM_BUFFER_SIZE = 64 * 1024
+
+
+class JSONLinesRenderer(BaseRenderer):
+    """
+    Formato `jsonl` da exportação: um objeto JSON por linha.
+    
+    As linhas da exportação são geradas por export_lines; o render() só é
+    usado para respostas comuns, como as de erro.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'jsonl'
+    charset = 'utf-8'
+    
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return (json.dumps(data, ensure_ascii=False) + '\n').encode(self.charset)
+
+
+class CSVRenderer(JSONLinesRenderer):
+    """
+    Formato `csv` da exportação, com uma linha de cabeçalho.
+    """
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class _LineBuffer:
+    """
+    Destino do csv.writer que apenas devolve a linha escrita.
+    """
+    
+    def write(self, value):
+        return value
+
+
+def export_lines(notifications, serializer, export_format):
+    """
+    Gera as linhas da exportação, uma por notificação.
+    
+    Args:
+        notifications (iterable): notificações, normalmente de
+            QuerySet.iterator(), para não carregar o resultado em memória
+        serializer: NotificationSerializer usado para todas as linhas; os
+            campos são montados uma única vez
+        export_format (str): 'jsonl' ou 'csv'
+    """
+    if export_format == 'csv':
+        writer = csv.writer(_LineBuffer())
+        names = list(serializer.fields)
+        yield writer.writerow(names)
+        for notification in notifications:
+            data = serializer.to_representation(notification)
+            yield writer.writerow([
+                json.dumps(data[name], ensure_ascii=False) if isinstance(data[name], dict) else data[name]
+                for name in names
+            ])
+    else:
+        for notification in notifications:
+            yield json.dumps(serializer.to_representation(notification), ensure_ascii=False) + '\n'
+
+
+def buffered(lines, size=STREAM_BUFFER_SIZE):
+    """
+    Agrupa as linhas em pedaços de aproximadamente `size` bytes, em UTF-8.
+    """
+    buffer = []
+    buffered_size = 0
+    for line in lines:
+        buffer.append(line)
+        buffered_size += len(line)
+        if buffered_size >= size:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+            buffered_size = 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def gzip_stream(chunks):
+    """
+    Comprime os pedaços em formato gzip à medida que são gerados.
+    """
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
@@ -0,0 +1,460 @@
+import hashlib
+import json
+import math
+import platform
+import subprocess
+import time
+from collections import Counter
+from datetime import timedelta
+from statistics import median
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from notifications.async_smtp import SMTP_BACKEND
+from notifications.models import MessageBody, Notification, NotificationCounter
+from notifications.smtp_pool import reset_pool
+from notifications.smtp_sink import LocalSMTPSink
+
+
+SCENARIOS = ['send', 'send_duplicate', 'list_filtered', 'deep_page', 'cursor_pages', 'statistics']
+
+# Destinatários e corpos distintos da tabela semeada
+SEED_RECIPIENTS = 1000
+SEED_BODIES = 100
+
+# Tamanho de página usado nos cenários de listagem
+PAGE_SIZE = 20
+
+# Opções que alteram as medições; execuções só são comparadas se forem iguais
+MEASUREMENT_OPTIONS = (
+    'rows', 'requests', 'rounds', 'warmup', 'handshake_latency', 'message_latency', 'response_cache'
+)
+
+
+def percentile(values, quantile):
+    """
+    Percentil por posição mais próxima de uma lista já ordenada: o menor
+    valor com pelo menos `quantile` das amostras menores ou iguais a ele.
+    """
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, math.ceil(quantile * len(values)) - 1))
+    return values[index]
+
+
+def summarize(rounds):
+    """
+    Resume as medições de um cenário: requisições por segundo, percentis
+    da latência (em ms) e consultas ao banco por requisição, sobre as
+    amostras de todas as rodadas.
+    
+    As requisições são feitas uma de cada vez, então `sequential_rps` é o
+    inverso da latência média, e não a vazão sob carga concorrente.
+    `sequential_rps_median` e `p95_ms_median` são as medianas de cada
+    rodada, menos sensíveis a uma rodada afetada por ruído da máquina e
+    usadas na comparação entre execuções.
+    
+    Args:
+        rounds (list): tuplas (latências, consultas, status, duração) de
+            cada rodada
+    """
+    latencies = sorted(latency for round_ in rounds for latency in round_[0])
+    queries = [count for round_ in rounds for count in round_[1]]
+    statuses = [code for round_ in rounds for code in round_[2]]
+    elapsed = sum(round_[3] for round_ in rounds)
+    total = len(latencies)
+    return {
+        'requests': total,
+        'rounds': len(rounds),
+        'seconds': round(elapsed, 4),
+        'sequential_rps': round(total / elapsed, 1) if elapsed else None,
+        'sequential_rps_median': round(median(len(round_[0]) / round_[3] for round_ in rounds), 1),
+        'mean_ms': round(sum(latencies) / total * 1000, 3),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p95_ms_median': round(median(percentile(sorted(round_[0]), 0.95) for round_ in rounds) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'queries_mean': round(sum(queries) / total, 2),
+        'queries_max': max(queries),
+        'statuses': {str(code): count for code, count in sorted(Counter(statuses).items())},
+    }
+
+
+def option_differences(baseline, current):
+    """
+    Retorna as opções de medição (MEASUREMENT_OPTIONS) que diferem entre
+    duas execuções, como tuplas (opção, valor anterior, valor atual).
+    """
+    before = baseline.get('options', {})
+    after = current.get('options', {})
+    return [
+        (name, before.get(name), after.get(name))
+        for name in MEASUREMENT_OPTIONS
+        if before.get(name) != after.get(name)
+    ]
+
+
+def compare_results(baseline, current, tolerance):
+    """
+    Compara os cenários de duas execuções feitas com as mesmas opções de
+    medição (ver option_differences).
+    
+    Uma regressão é uma queda das requisições por segundo ou um aumento do
+    p95 acima de `tolerance` (fração), comparando as medianas entre as
+    rodadas, ou qualquer aumento das consultas por requisição, que não
+    dependem da máquina.
+    
+    Returns:
+        tuple: (linhas do relatório, lista de regressões)
+    """
+    lines = []
+    regressions = []
+    for name, result in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if before is None:
+            continue
+        rps_before = before['sequential_rps_median']
+        rps_after = result['sequential_rps_median']
+        p95_before = before['p95_ms_median']
+        p95_after = result['p95_ms_median']
+        rps_change = (rps_after - rps_before) / rps_before if rps_before else 0
+        p95_change = (p95_after - p95_before) / p95_before if p95_before else 0
+        lines.append(
+            f"{name}: {rps_before} -> {rps_after} req/s ({rps_change:+.1%}), "
+            f"p95 {p95_before} -> {p95_after} ms ({p95_change:+.1%}), "
+            f"consultas {before['queries_mean']} -> {result['queries_mean']}"
+        )
+        if rps_change < -tolerance:
+            regressions.append(f'{name}: requisições por segundo caíram {-rps_change:.1%}')
+        if p95_change > tolerance:
+            regressions.append(f'{name}: p95 aumentou {p95_change:.1%}')
+        if result['queries_mean'] > before['queries_mean']:
+            regressions.append(
+                f"{name}: consultas por requisição passaram de {before['queries_mean']} "
+                f"para {result['queries_mean']}"
+            )
+    return lines, regressions
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede as requisições por segundo feitas em sequência, a latência '
+        '(p50/p95/p99) e as consultas por requisição dos principais endpoints da API contra uma tabela semeada '
+        'e um servidor SMTP local, em um banco de dados de teste, e grava os '
+        'resultados em JSON para comparação entre commits.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, default=10000,
+            help='Notificações semeadas na tabela antes das medições (padrão: 10000)'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=500,
+            help='Requisições medidas em cada rodada de cada cenário (padrão: 500)'
+        )
+        parser.add_argument(
+            '--rounds', type=int, default=3,
+            help=(
+                'Rodadas de medição; os cenários se alternam entre as rodadas, e a '
+                'comparação usa a mediana das requisições por segundo e do p95 entre elas (padrão: 3)'
+            )
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=10,
+            help='Requisições de aquecimento, não medidas, em cada rodada de cada cenário (padrão: 10)'
+        )
+        parser.add_argument(
+            '--scenarios', default=','.join(SCENARIOS),
+            help=f"Cenários executados, separados por vírgula (padrão: {','.join(SCENARIOS)})"
+        )
+        parser.add_argument(
+            '--seed-batch-size', type=int, default=5000,
+            help='Notificações inseridas por consulta ao semear a tabela (padrão: 5000)'
+        )
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help=(
+                'Mantém o banco de teste e a tabela semeada entre execuções; a '
+                'tabela só é semeada de novo se o número de linhas mudar'
+            )
+        )
+        parser.add_argument(
+            '--handshake-latency', type=float, default=0.0,
+            help='Latência simulada, em ms, para abrir cada conexão SMTP (padrão: 0)'
+        )
+        parser.add_argument(
+            '--message-latency', type=float, default=0.0,
+            help='Latência simulada, em ms, da resposta do servidor a cada mensagem (padrão: 0)'
+        )
+        parser.add_argument(
+            '--response-cache', type=int, default=0,
+            help='NOTIFICATIONS_RESPONSE_CACHE_TIMEOUT durante as medições (padrão: 0, desativado)'
+        )
+        parser.add_argument(
+            '--output',
+            help='Arquivo em que os resultados são gravados em JSON'
+        )
+        parser.add_argument(
+            '--compare',
+            help='Resultados JSON de uma execução anterior para comparação'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=20.0,
+            help='Variação de requisições por segundo ou de p95, em %%, tolerada na comparação (padrão: 20)'
+        )
+    
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options['scenarios'].split(',') if name.strip()]
+        invalid = [name for name in scenarios if name not in SCENARIOS]
+        if invalid:
+            raise CommandError(f"Cenário(s) inválido(s): {', '.join(invalid)}. Disponíveis: {', '.join(SCENARIOS)}.")
+        if options['rows'] < PAGE_SIZE:
+            raise CommandError(f'--rows deve ser ao menos {PAGE_SIZE}.')
+        if options['requests'] < 1 or options['rounds'] < 1:
+            raise CommandError('--requests e --rounds devem ser ao menos 1.')
+        
+        measurement_options = {name: options[name] for name in MEASUREMENT_OPTIONS}
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                baseline = json.load(file)
+            # Com outra tabela ou outra quantidade de requisições, as
+            # consultas e as latências não são comparáveis
+            differences = option_differences(baseline, {'options': measurement_options})
+            if differences:
+                raise CommandError(
+                    f"As opções diferem das de {options['compare']}; repita com as mesmas opções:\n"
+                    + '\n'.join(f'  --{name.replace("_", "-")}: {before} -> {after}' for name, before, after in differences)
+                )
+        
+        # As notificações do benchmark vão para um banco de teste descartável
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False, keepdb=options['keepdb']
+        )
+        try:
+            self.seed(options['rows'], options['seed_batch_size'])
+            with LocalSMTPSink(
+                handshake_latency=options['handshake_latency'] / 1000,
+                message_latency=options['message_latency'] / 1000,
+            ) as sink:
+                with override_settings(
+                    ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                    EMAIL_BACKEND=SMTP_BACKEND,
+                    EMAIL_HOST=sink.host,
+                    EMAIL_PORT=sink.port,
+                    EMAIL_HOST_USER='',
+                    EMAIL_HOST_PASSWORD='',
+                    EMAIL_USE_TLS=False,
+                    EMAIL_USE_SSL=False,
+                    NOTIFICATIONS_SEND_MODE='sync',
+                    NOTIFICATIONS_RESPONSE_CACHE_TIMEOUT=options['response_cache'],
+                    NOTIFICATIONS_DOMAIN_RATE=0,
+                    NOTIFICATIONS_DOMAIN_CONCURRENCY=0,
+                ):
+                    results = self.run_scenarios(scenarios, options)
+                reset_pool()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+        
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'commit': self.git_commit(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'options': measurement_options,
+            'scenarios': results,
+        }
+        
+        # Respostas de erro (ex.: 404 de uma página inexistente) também têm
+        # latência, mas não medem o endpoint
+        errors = {
+            name: {code: count for code, count in result['statuses'].items() if not code.startswith('2')}
+            for name, result in results.items()
+        }
+        errors = {name: codes for name, codes in errors.items() if codes}
+        if errors:
+            raise CommandError(
+                'Cenários com respostas de erro; os resultados não foram gravados:\n'
+                + '\n'.join(f'  {name}: {codes}' for name, codes in errors.items())
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Resultados gravados em {options['output']}")
+        
+        if baseline is not None:
+            lines, regressions = compare_results(baseline, report, options['tolerance'] / 100)
+            self.stdout.write(f"Comparação com {options['compare']} (commit {baseline.get('commit')}):")
+            for line in lines:
+                self.stdout.write(f'  {line}')
+            if regressions:
+                raise CommandError('Regressões encontradas:\n' + '\n'.join(f'  {item}' for item in regressions))
+            self.stdout.write(self.style.SUCCESS('Nenhuma regressão encontrada.'))
+    
+    def seed(self, rows, batch_size):
+        """
+        Semeia a tabela com `rows` notificações: 80% enviadas, 15% com falha
+        e 5% pendentes (agendadas para o futuro), entre SEED_RECIPIENTS
+        destinatários e SEED_BODIES corpos distintos.
+        
+        Com --keepdb, as notificações criadas pelos cenários de envio de uma
+        execução anterior são removidas, com os seus corpos de mensagem, e a
+        tabela só é semeada de novo se o número de linhas mudou.
+        """
+        Notification.objects.bulk_delete(Notification.objects.filter(recipient_email__startswith='bench'))
+        if Notification.objects.count() == rows:
+            NotificationCounter.objects.rebuild()
+            self.stdout.write(f'Tabela já semeada com {rows} notificações')
+            return
+        Notification.objects.all().delete()
+        MessageBody.objects.all().delete()
+        
+        started = time.perf_counter()
+        bodies = MessageBody.objects.intern_many(
+            f'Mensagem de benchmark {index}' for index in range(SEED_BODIES)
+        )
+        bodies = [bodies[f'Mensagem de benchmark {index}'] for index in range(SEED_BODIES)]
+        now = timezone.now()
+        later = now + timedelta(days=365)
+        
+        for start in range(0, rows, batch_size):
+            batch = []
+            for index in range(start, min(start + batch_size, rows)):
+                kind = index % 20
+                status = 'pending' if kind == 0 else 'failed' if kind <= 3 else 'sent'
+                batch.append(Notification(
+                    recipient_email=f'user{index % SEED_RECIPIENTS}@example.com',
+                    subject=f'Benchmark {index}',
+                    message_body=bodies[index % SEED_BODIES],
+                    status=status,
+                    sent_at=now if status == 'sent' else None,
+                    attempts=0 if status == 'pending' else 1,
+                    error_message='Falha simulada' if status == 'failed' else None,
+                    next_attempt_at=later if status == 'pending' else None,
+                    content_hash=hashlib.sha256(f'benchmark-seed-{index}'.encode('ascii')).hexdigest(),
+                ))
+            Notification.objects.bulk_create(batch)
+        NotificationCounter.objects.rebuild()
+        
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'Tabela semeada com {rows} notificações em {elapsed:.1f}s ({rows / elapsed:.0f} linhas/s)')
+    
+    def run_scenarios(self, scenarios, options):
+        client = Client()
+        rows = options['rows']
+        # Páginas perto do fim da listagem por número de página (OFFSET)
+        deep_page = max(1, int(rows / PAGE_SIZE * 0.9))
+        filters = [
+            '?status=failed',
+            *(f'?recipient_email=user{index}@example.com' for index in range(0, SEED_RECIPIENTS, 97)),
+            '?status=sent&fields=all',
+        ]
+        duplicates = [self.payload('duplicate', index) for index in range(10)]
+        for payload in duplicates:
+            client.post('/api/notifications/send/', payload, content_type='application/json')
+        cursor = {'next': f'/api/notifications/?pagination=cursor&page_size={PAGE_SIZE}'}
+        
+        def next_cursor_page():
+            # Segue os links `next`, voltando ao início ao fim da listagem
+            response = client.get(cursor['next'])
+            cursor['next'] = response.data.get('next') or f'/api/notifications/?pagination=cursor&page_size={PAGE_SIZE}'
+            return response
+        
+        requests = {
+            'send': lambda index: client.post(
+                '/api/notifications/send/', self.payload('send', index), content_type='application/json'
+            ),
+            'send_duplicate': lambda index: client.post(
+                '/api/notifications/send/', duplicates[index % len(duplicates)], content_type='application/json'
+            ),
+            'list_filtered': lambda index: client.get(
+                f'/api/notifications/{filters[index % len(filters)]}&page_size={PAGE_SIZE}'
+            ),
+            'deep_page': lambda index: client.get(
+                f'/api/notifications/?page={max(1, deep_page - index % 10)}&page_size={PAGE_SIZE}'
+            ),
+            'cursor_pages': lambda index: next_cursor_page(),
+            'statistics': lambda index: client.get('/api/notifications/statistics/'),
+        }
+        
+        # As rodadas alternam os cenários, para que uma variação passageira da
+        # máquina afete uma rodada de cada cenário e não um cenário inteiro
+        rounds = {name: [] for name in scenarios}
+        for round_index in range(options['rounds']):
+            for name in scenarios:
+                rounds[name].append(self.measure(
+                    requests[name], options['requests'], options['warmup'],
+                    offset=round_index * (options['requests'] + options['warmup'])
+                ))
+        
+        results = {}
+        for name in scenarios:
+            results[name] = result = summarize(rounds[name])
+            by_status = ', '.join(f'{code}: {count}' for code, count in result['statuses'].items())
+            self.stdout.write(
+                f"{name}: {result['requests']} requisições em {result['rounds']} rodada(s), "
+                f"{result['sequential_rps']} req/s sequenciais (mediana {result['sequential_rps_median']}), "
+                f"p50 {result['p50_ms']} ms, "
+                f"p95 {result['p95_ms']} ms (mediana {result['p95_ms_median']}), p99 {result['p99_ms']} ms, "
+                f"{result['queries_mean']} consultas/req (máx. {result['queries_max']}), "
+                f"respostas [{by_status}]"
+            )
+        return results
+    
+    def measure(self, request, total, warmup, offset=0):
+        """
+        Executa `warmup` requisições sem medir e `total` medindo a latência
+        e as consultas ao banco de cada uma. Os índices das requisições
+        começam em `offset`, para que cada rodada envie conteúdos novos.
+        
+        Returns:
+            tuple: (latências, consultas, status, duração)
+        """
+        for index in range(warmup):
+            request(offset + total + index)
+        
+        query_count = [0]
+        
+        def count_queries(execute, sql, params, many, context):
+            query_count[0] += 1
+            return execute(sql, params, many, context)
+        
+        latencies = []
+        queries = []
+        statuses = []
+        with connection.execute_wrapper(count_queries):
+            started = time.perf_counter()
+            for index in range(total):
+                query_count[0] = 0
+                request_started = time.perf_counter()
+                response = request(offset + index)
+                latencies.append(time.perf_counter() - request_started)
+                queries.append(query_count[0])
+                statuses.append(response.status_code)
+            elapsed = time.perf_counter() - started
+        return latencies, queries, statuses, elapsed
+    
+    def payload(self, scenario, index):
+        return {
+            'recipient_email': f'bench{index}@example.com',
+            'subject': f'Benchmark {scenario}',
+            'message': f'Mensagem de benchmark {scenario} {index}',
+        }
+    
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
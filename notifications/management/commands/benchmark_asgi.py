@@ -0,0 +1,127 @@
+import asyncio
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+
+from notifications.async_smtp import SMTP_BACKEND, async_transport_available
+from notifications.smtp_sink import LocalSMTPSink
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara a vazão do envio síncrono (WSGI, uma thread por requisição) '
+        'com a do envio assíncrono (ASGI), usando um servidor SMTP local e um '
+        'banco de dados de teste temporário.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Quantidade de requisições de envio em cada cenário (padrão: 200)'
+        )
+        parser.add_argument(
+            '--threads', type=int, default=8,
+            help='Threads do cenário WSGI, como as de um servidor WSGI (padrão: 8)'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=100,
+            help='Requisições simultâneas do cenário ASGI (padrão: 100)'
+        )
+        parser.add_argument(
+            '--handshake-latency', type=float, default=20.0,
+            help='Latência simulada, em ms, para abrir cada conexão SMTP (padrão: 20)'
+        )
+        parser.add_argument(
+            '--message-latency', type=float, default=250.0,
+            help='Latência simulada, em ms, da resposta do servidor a cada mensagem (padrão: 250)'
+        )
+
+    def handle(self, *args, **options):
+        # As notificações do benchmark vão para um banco de teste descartável
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with LocalSMTPSink(
+                handshake_latency=options['handshake_latency'] / 1000,
+                message_latency=options['message_latency'] / 1000,
+            ) as sink:
+                with override_settings(
+                    ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+                    EMAIL_BACKEND=SMTP_BACKEND,
+                    EMAIL_HOST=sink.host,
+                    EMAIL_PORT=sink.port,
+                    EMAIL_HOST_USER='',
+                    EMAIL_HOST_PASSWORD='',
+                    EMAIL_USE_TLS=False,
+                    EMAIL_USE_SSL=False,
+                    # Uma conexão SMTP por thread WSGI, para não limitar o cenário síncrono
+                    NOTIFICATIONS_SMTP_POOL_SIZE=options['threads'],
+                ):
+                    if not async_transport_available():
+                        self.stdout.write(self.style.WARNING(
+                            'aiosmtplib não está instalado: o cenário ASGI usará o pool '
+                            'síncrono em threads.'
+                        ))
+
+                    sink.reset()
+                    started = time.perf_counter()
+                    statuses = self.run_wsgi(options['requests'], options['threads'])
+                    self.report(
+                        f"WSGI ({options['threads']} threads)", statuses,
+                        time.perf_counter() - started, sink
+                    )
+
+                    sink.reset()
+                    started = time.perf_counter()
+                    statuses = asyncio.run(self.run_asgi(options['requests'], options['concurrency']))
+                    self.report(
+                        f"ASGI ({options['concurrency']} simultâneas)", statuses,
+                        time.perf_counter() - started, sink
+                    )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def payload(self, scenario, index):
+        return {
+            'recipient_email': f'user{index}@example.com',
+            'subject': f'Benchmark {scenario}',
+            'message': f'Mensagem de benchmark {index}',
+        }
+
+    def run_wsgi(self, total, threads):
+        def send(index):
+            response = Client().post(
+                '/api/notifications/send/', self.payload('wsgi', index),
+                content_type='application/json'
+            )
+            return response.status_code
+
+        with ThreadPoolExecutor(threads) as executor:
+            return list(executor.map(send, range(total)))
+
+    async def run_asgi(self, total, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def send(index):
+            async with semaphore:
+                response = await client.post(
+                    '/api/notifications/send-async/', self.payload('asgi', index),
+                    content_type='application/json'
+                )
+                return response.status_code
+
+        return await asyncio.gather(*(send(index) for index in range(total)))
+
+    def report(self, label, statuses, elapsed, sink):
+        total = len(statuses)
+        by_status = ', '.join(f'{code}: {count}' for code, count in sorted(Counter(statuses).items()))
+        self.stdout.write(
+            f'{label}: {total} requisições em {elapsed:.2f}s '
+            f'({total / elapsed:.1f} req/s), respostas [{by_status}], '
+            f'{sink.messages} email(s) em {sink.connections} conexão(ões)'
+        )
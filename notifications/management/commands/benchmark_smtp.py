@@ -0,0 +1,78 @@
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+
+from notifications.smtp_pool import SMTPConnectionPool
+from notifications.smtp_sink import LocalSMTPSink
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara o envio com uma conexão SMTP por mensagem e o envio pelo pool '
+        'de conexões, usando um servidor SMTP local.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--messages', type=int, default=200,
+            help='Quantidade de mensagens enviadas em cada cenário (padrão: 200)'
+        )
+        parser.add_argument(
+            '--handshake-latency', type=float, default=20.0,
+            help='Latência simulada, em ms, para abrir cada conexão (padrão: 20)'
+        )
+    
+    def handle(self, *args, **options):
+        total = options['messages']
+        
+        with LocalSMTPSink(handshake_latency=options['handshake_latency'] / 1000) as sink:
+            def connection_factory():
+                return get_connection(
+                    'django.core.mail.backends.smtp.EmailBackend',
+                    host=sink.host,
+                    port=sink.port,
+                    username='',
+                    password='',
+                    use_tls=False,
+                    use_ssl=False,
+                    fail_silently=False,
+                )
+            
+            def build_message(index):
+                return EmailMessage(
+                    subject=f'Benchmark {index}',
+                    body='Mensagem de benchmark',
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    to=[f'user{index}@example.com'],
+                )
+            
+            # Cenário 1: uma conexão nova por mensagem (comportamento de send_mail)
+            sink.reset()
+            started = time.perf_counter()
+            for index in range(total):
+                connection_factory().send_messages([build_message(index)])
+            self.report('Conexão por mensagem', total, time.perf_counter() - started, sink)
+            
+            # Cenário 2: conexões reutilizadas pelo pool
+            sink.reset()
+            pool = SMTPConnectionPool(
+                size=settings.NOTIFICATIONS_SMTP_POOL_SIZE,
+                idle_timeout=settings.NOTIFICATIONS_SMTP_POOL_IDLE_TIMEOUT,
+                max_messages=settings.NOTIFICATIONS_SMTP_POOL_MAX_MESSAGES,
+                connection_factory=connection_factory,
+            )
+            started = time.perf_counter()
+            for index in range(total):
+                pool.send(build_message(index))
+            elapsed = time.perf_counter() - started
+            pool.close()
+            self.report('Pool de conexões', total, elapsed, sink)
+    
+    def report(self, label, total, elapsed, sink):
+        self.stdout.write(
+            f'{label}: {total} mensagens em {elapsed:.2f}s '
+            f'({total / elapsed:.1f} msg/s, {elapsed / total * 1000:.2f} ms/msg), '
+            f'{sink.connections} conexão(ões) aberta(s)'
+        )
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from notifications.delivery import run_workers
+
+
+class Command(BaseCommand):
+    help = 'Inicia workers que entregam as notificações pendentes da fila.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Número de workers de entrega em paralelo (padrão: 4)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=50,
+            help='Quantidade de notificações reservadas por consulta (padrão: 50)'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Segundos de espera quando a fila está vazia (padrão: 1.0)'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Drena a fila uma vez e encerra, em vez de aguardar novas notificações'
+        )
+    
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"Iniciando {options['workers']} worker(s) de entrega"
+            + (' (modo drenagem)' if options['once'] else '')
+        )
+        sent, failed, deferred = run_workers(
+            workers=options['workers'],
+            batch_size=options['batch_size'],
+            poll_interval=options['poll_interval'],
+            drain=options['once'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Entrega finalizada: {sent} enviada(s), {failed} com falha, '
+            f'{deferred} adiada(s).'
+        ))
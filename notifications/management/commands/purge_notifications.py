@@ -0,0 +1,103 @@
+import gzip
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from notifications.models import Notification
+from notifications.retention import purge_batch, retention_cutoffs
+
+
+class Command(BaseCommand):
+    help = (
+        'Remove, em lotes, as notificações enviadas e com falha mais antigas '
+        'que o período de retenção, opcionalmente arquivando-as antes em '
+        'JSONL comprimido.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sent-days', type=int,
+            help='Dias de retenção das notificações enviadas '
+                 '(padrão: NOTIFICATIONS_RETENTION_SENT_DAYS; 0 mantém todas)'
+        )
+        parser.add_argument(
+            '--failed-days', type=int,
+            help='Dias de retenção das notificações com falha '
+                 '(padrão: NOTIFICATIONS_RETENTION_FAILED_DAYS; 0 mantém todas)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Notificações removidas por transação (padrão: 1000)'
+        )
+        parser.add_argument(
+            '--sleep', type=float, default=0.0,
+            help='Segundos de pausa entre os lotes, para aliviar o banco (padrão: 0)'
+        )
+        parser.add_argument(
+            '--archive-dir',
+            help='Diretório onde gravar as notificações removidas em '
+                 'notifications-<status>-<data>.jsonl.gz antes de removê-las'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Apenas informa quantas notificações seriam removidas'
+        )
+    
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size deve ser maior que zero.')
+        if options['archive_dir'] and not os.path.isdir(options['archive_dir']):
+            raise CommandError(f"Diretório de arquivamento inexistente: {options['archive_dir']}")
+        
+        now = timezone.now()
+        cutoffs = retention_cutoffs(
+            {'sent': options['sent_days'], 'failed': options['failed_days']}, now=now
+        )
+        if not cutoffs:
+            self.stdout.write('Nenhum período de retenção configurado; nada a remover.')
+            return
+        
+        for status, before in cutoffs.items():
+            if options['dry_run']:
+                count = Notification.objects.filter(status=status, created_at__lt=before).count()
+                self.stdout.write(
+                    f'{status}: {count} notificação(ões) criada(s) antes de '
+                    f'{before:%Y-%m-%d %H:%M} seria(m) removida(s).'
+                )
+                continue
+            
+            archive = None
+            if options['archive_dir']:
+                path = os.path.join(
+                    options['archive_dir'], f'notifications-{status}-{now:%Y%m%d%H%M%S}.jsonl.gz'
+                )
+                archive = gzip.open(path, 'wt', encoding='utf-8')
+            try:
+                deleted, elapsed = self.purge(status, before, archive, options)
+            finally:
+                if archive is not None:
+                    archive.close()
+            
+            self.stdout.write(self.style.SUCCESS(
+                f'{status}: {deleted} notificação(ões) removida(s) em {elapsed:.2f}s '
+                f'({deleted / elapsed if elapsed else 0:.0f} por segundo)'
+                + (f', arquivada(s) em {path}' if archive is not None else '')
+            ))
+    
+    def purge(self, status, before, archive, options):
+        deleted = 0
+        started = time.perf_counter()
+        while True:
+            selected, removed = purge_batch(
+                status, before, batch_size=options['batch_size'], archive=archive
+            )
+            deleted += removed
+            if selected < options['batch_size']:
+                break
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{status}: {deleted} removida(s)...')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        return deleted, time.perf_counter() - started
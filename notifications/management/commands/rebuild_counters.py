@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from notifications.models import NotificationCounter
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula os contadores de notificações usados pelas estatísticas a '
+        'partir de uma recontagem completa da tabela.'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Apenas compara os contadores com a recontagem, sem alterá-los'
+        )
+    
+    def handle(self, *args, **options):
+        if options['check']:
+            mismatches = NotificationCounter.objects.check_consistency()
+            for period, bucket, status, expected, actual in mismatches:
+                self.stdout.write(
+                    f'{period} {bucket.isoformat()} {status}: esperado {expected}, atual {actual}'
+                )
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} contador(es) divergente(s).')
+            self.stdout.write(self.style.SUCCESS('Contadores consistentes com a tabela de notificações.'))
+            return
+        
+        created = NotificationCounter.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'{created} contador(es) recalculado(s).'))
@@ -0,0 +1,418 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import timedelta
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.models import Count, F, Q
+from django.dispatch import receiver
+from django.http import Http404, HttpResponse
+from django.utils import timezone
+
+from .models import Notification, NotificationCounter
+
+
+# Limites superiores (em segundos) das faixas do histograma de latência de
+# envio, do registro da notificação até o email sair
+LATENCY_BUCKETS = (0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600)
+
+LATENCY_QUANTILES = (('p50', 0.5), ('p95', 0.95), ('p99', 0.99))
+
+
+def histogram_quantile(quantile, buckets, count):
+    """
+    Estima um quantil a partir de um histograma cumulativo, interpolando
+    linearmente dentro da faixa em que ele cai (como o histogram_quantile
+    do Prometheus).
+    
+    Args:
+        quantile (float): quantil entre 0 e 1
+        buckets (list): contagens cumulativas para cada limite de
+            LATENCY_BUCKETS
+        count (int): total de observações
+    
+    Returns:
+        float: latência estimada em segundos, ou None sem observações. Se o
+            quantil passar da última faixa, retorna o último limite.
+    """
+    if not count:
+        return None
+    
+    rank = quantile * count
+    lower_bound, lower_count = 0.0, 0
+    for upper_bound, upper_count in zip(LATENCY_BUCKETS, buckets):
+        if upper_count >= rank:
+            if upper_count == lower_count:
+                return float(upper_bound)
+            fraction = (rank - lower_count) / (upper_count - lower_count)
+            return round(lower_bound + (upper_bound - lower_bound) * fraction, 3)
+        lower_bound, lower_count = upper_bound, upper_count
+    return float(LATENCY_BUCKETS[-1])
+
+
+def latency_by_priority(queryset=None):
+    """
+    Calcula, em uma única consulta, o histograma da latência de envio
+    (sent_at - created_at) das notificações enviadas de cada faixa de
+    prioridade, com os quantis p50, p95 e p99 estimados a partir dele.
+    
+    Args:
+        queryset: notificações consideradas (por padrão, todas)
+    
+    Returns:
+        dict: para cada faixa, {'count', 'p50', 'p95', 'p99', 'buckets'},
+            em que 'buckets' lista as contagens cumulativas por limite 'le'
+    """
+    queryset = Notification.objects.all() if queryset is None else queryset
+    aggregates = {
+        f'le_{index}': Count(
+            'id', filter=Q(sent_at__lte=F('created_at') + timedelta(seconds=bound))
+        )
+        for index, bound in enumerate(LATENCY_BUCKETS)
+    }
+    rows = {
+        row['priority']: row
+        for row in queryset.filter(status='sent').order_by().values('priority').annotate(
+            count=Count('id'), **aggregates
+        )
+    }
+    
+    lanes = {}
+    for lane in Notification.PRIORITY_LANES:
+        row = rows.get(lane, {})
+        count = row.get('count', 0)
+        buckets = [row.get(f'le_{index}', 0) for index in range(len(LATENCY_BUCKETS))]
+        lanes[lane] = {
+            'count': count,
+            **{
+                name: histogram_quantile(quantile, buckets, count)
+                for name, quantile in LATENCY_QUANTILES
+            },
+            'buckets': [
+                {'le': bound, 'count': bucket_count}
+                for bound, bucket_count in zip(LATENCY_BUCKETS, buckets)
+            ] + [{'le': '+Inf', 'count': count}],
+        }
+    return lanes
+
+
+# Limites superiores (em segundos) das faixas dos histogramas de duração das
+# etapas do envio e das requisições
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Limites superiores das faixas do histograma de consultas por requisição
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+# Métricas acumuladas pelo processo: nome -> (tipo, descrição, rótulos,
+# faixas do histograma)
+METRICS = {
+    'notifications_stage_duration_seconds': (
+        'histogram', 'Duração de cada etapa do envio', ('stage',), DURATION_BUCKETS
+    ),
+    'notifications_deliveries_total': (
+        'counter', 'Resultados dos envios por domínio do destinatário', ('outcome', 'domain'), None
+    ),
+    'notifications_http_request_duration_seconds': (
+        'histogram', 'Duração das requisições HTTP', ('view', 'method'), DURATION_BUCKETS
+    ),
+    'notifications_http_request_db_queries': (
+        'histogram', 'Consultas ao banco por requisição HTTP', ('view', 'method'), QUERY_COUNT_BUCKETS
+    ),
+}
+
+# Valor do rótulo `domain` dos domínios além de NOTIFICATIONS_METRICS_MAX_DOMAINS
+OTHER_DOMAIN = 'other'
+
+
+def metrics_enabled():
+    return settings.NOTIFICATIONS_METRICS_ENABLED
+
+
+class MetricsRegistry:
+    """
+    Contadores e histogramas do processo, exportados no formato de texto do
+    Prometheus por render().
+    
+    Os valores valem por processo, como os limites por domínio: com vários
+    processos, cada um deve ser coletado separadamente.
+    """
+    
+    def __init__(self, max_domains=50):
+        self.max_domains = max_domains
+        self._values = {name: {} for name in METRICS}
+        self._domains = set()
+        self._lock = threading.Lock()
+    
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            series = self._values[name]
+            series[labels] = series.get(labels, 0) + amount
+    
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][3]
+        with self._lock:
+            series = self._values[name].get(labels)
+            if series is None:
+                series = self._values[name][labels] = [[0] * len(buckets), 0, 0.0]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+    
+    def domain_label(self, recipient_email):
+        """
+        Retorna o rótulo do domínio do destinatário. Apenas os primeiros
+        `max_domains` domínios têm série própria, para limitar a quantidade
+        de séries.
+        """
+        domain = recipient_email.rsplit('@', 1)[-1].strip().lower()
+        with self._lock:
+            if domain in self._domains:
+                return domain
+            if len(self._domains) < self.max_domains:
+                self._domains.add(domain)
+                return domain
+        return OTHER_DOMAIN
+    
+    def render(self):
+        lines = []
+        with self._lock:
+            values = {name: dict(series) for name, series in self._values.items()}
+            histograms = {
+                name: {labels: (list(series[0]), series[1], series[2]) for labels, series in values[name].items()}
+                for name, (kind, *_) in METRICS.items() if kind == 'histogram'
+            }
+        for name, (kind, description, label_names, buckets) in METRICS.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            if kind == 'counter':
+                for labels, value in sorted(values[name].items()):
+                    lines.append(f'{name}{format_labels(label_names, labels)} {value}')
+                continue
+            for labels, (counts, count, total) in sorted(histograms[name].items()):
+                for bound, bucket_count in zip(buckets, counts):
+                    lines.append(
+                        f'{name}_bucket{format_labels((*label_names, "le"), (*labels, bound))} {bucket_count}'
+                    )
+                lines.append(f'{name}_bucket{format_labels((*label_names, "le"), (*labels, "+Inf"))} {count}')
+                lines.append(f'{name}_sum{format_labels(label_names, labels)} {total}')
+                lines.append(f'{name}_count{format_labels(label_names, labels)} {count}')
+        return lines
+
+
+def format_labels(names, values):
+    """
+    Formata os rótulos de uma série, com os valores escapados.
+    """
+    if not names:
+        return ''
+    pairs = (
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    )
+    return '{' + ','.join(pairs) + '}'
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """
+    Retorna o registro de métricas do processo, criado na primeira chamada.
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = MetricsRegistry(max_domains=settings.NOTIFICATIONS_METRICS_MAX_DOMAINS)
+    return _registry
+
+
+def reset_registry():
+    """
+    Descarta as métricas acumuladas pelo processo.
+    """
+    global _registry
+    with _registry_lock:
+        _registry = None
+
+
+@receiver(setting_changed)
+def _reset_registry_on_setting_change(setting, **kwargs):
+    if setting.startswith('NOTIFICATIONS_METRICS_'):
+        reset_registry()
+
+
+# Retornado por timed() com as métricas desativadas: evita criar um
+# gerador por etapa medida
+_NOT_TIMED = nullcontext()
+
+
+def timed(stage):
+    """
+    Mede a duração de uma etapa do envio (por exemplo, 'dedup', 'insert',
+    'smtp_connect', 'smtp_data' e 'update') no histograma
+    notifications_stage_duration_seconds. Não faz nada com as métricas
+    desativadas.
+    """
+    if not metrics_enabled():
+        return _NOT_TIMED
+    return _timer(stage)
+
+
+@contextmanager
+def _timer(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        get_registry().observe('notifications_stage_duration_seconds', (stage,), time.perf_counter() - start)
+
+
+def record_outcome(recipient_email, outcome):
+    """
+    Conta o resultado de um envio ('sent', 'retry', 'failed', 'deferred',
+    'duplicate' ou 'queued') por domínio do destinatário.
+    """
+    if not metrics_enabled():
+        return
+    registry = get_registry()
+    registry.inc('notifications_deliveries_total', (outcome, registry.domain_label(recipient_email)))
+
+
+# Consultas ao banco da requisição atual; propagado às threads de
+# sync_to_async, que copiam o contexto
+_request_queries = contextvars.ContextVar('notifications_request_queries', default=None)
+
+
+def count_queries(execute, sql, params, many, context):
+    counter = _request_queries.get()
+    if counter is not None:
+        counter[0] += 1
+    return execute(sql, params, many, context)
+
+
+def install_query_counter(connection, **kwargs):
+    """
+    Receptor de connection_created que instala count_queries na conexão.
+    """
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+class MetricsMiddleware:
+    """
+    Registra a duração e a quantidade de consultas ao banco de cada
+    requisição, por view. Atende views síncronas e assíncronas; com as
+    métricas desativadas, apenas repassa a requisição.
+    """
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not metrics_enabled():
+            return self.get_response(request)
+        token, start = self.start()
+        try:
+            return self.get_response(request)
+        finally:
+            self.finish(request, token, start)
+    
+    async def __acall__(self, request):
+        if not metrics_enabled():
+            return await self.get_response(request)
+        token, start = self.start()
+        try:
+            return await self.get_response(request)
+        finally:
+            self.finish(request, token, start)
+    
+    def start(self):
+        return _request_queries.set([0]), time.perf_counter()
+    
+    def finish(self, request, token, start):
+        duration = time.perf_counter() - start
+        queries = _request_queries.get()[0]
+        _request_queries.reset(token)
+        match = getattr(request, 'resolver_match', None)
+        labels = (match.view_name if match else 'unmatched', request.method)
+        registry = get_registry()
+        registry.observe('notifications_http_request_duration_seconds', labels, duration)
+        registry.observe('notifications_http_request_db_queries', labels, queries)
+
+
+def gauge_lines():
+    """
+    Métricas calculadas no momento da coleta: profundidade da fila de
+    entrega por faixa de prioridade (pelo índice notif_pending_lane_due_idx),
+    totais por status (pelos contadores das estatísticas) e estado do pool
+    de conexões SMTP do processo.
+    """
+    from .smtp_pool import get_pool
+    
+    lanes = {
+        row['priority']: row
+        for row in Notification.objects.filter(status='pending').order_by().values('priority').annotate(
+            total=Count('id'), due=Count('id', filter=Q(next_attempt_at__lte=timezone.now()))
+        )
+    }
+    lines = [
+        '# HELP notifications_queue_depth Notificações pendentes por faixa; due já podem ser entregues',
+        '# TYPE notifications_queue_depth gauge',
+    ]
+    for lane in Notification.PRIORITY_LANES:
+        row = lanes.get(lane, {})
+        due = row.get('due', 0)
+        lines.append(f'notifications_queue_depth{format_labels(("priority", "state"), (lane, "due"))} {due}')
+        lines.append(
+            f'notifications_queue_depth{format_labels(("priority", "state"), (lane, "scheduled"))} '
+            f'{row.get("total", 0) - due}'
+        )
+    
+    totals = NotificationCounter.objects.totals()
+    lines += [
+        '# HELP notifications_status Notificações registradas por status',
+        '# TYPE notifications_status gauge',
+        *(
+            f'notifications_status{format_labels(("status",), (status,))} {totals[status]}'
+            for status, _ in Notification.STATUS_CHOICES
+        ),
+    ]
+    
+    pool = get_pool()
+    lines += [
+        '# HELP notifications_smtp_connections_opened_total Conexões SMTP abertas pelo pool',
+        '# TYPE notifications_smtp_connections_opened_total counter',
+        f'notifications_smtp_connections_opened_total {pool.connections_opened}',
+        '# HELP notifications_smtp_connections_idle Conexões SMTP ociosas no pool',
+        '# TYPE notifications_smtp_connections_idle gauge',
+        f'notifications_smtp_connections_idle {pool.idle_connections()}',
+    ]
+    return lines
+
+
+def metrics_view(request):
+    """
+    Exporta as métricas no formato de texto do Prometheus.
+    
+    GET /metrics
+    
+    Responde 404 quando NOTIFICATIONS_METRICS_ENABLED está desativado.
+    """
+    if not metrics_enabled():
+        raise Http404
+    lines = get_registry().render() + gauge_lines()
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')
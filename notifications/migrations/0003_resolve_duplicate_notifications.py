@@ -0,0 +1,56 @@
+# Generated by Django 4.2.25 on 2026-10-17 09:50
+
+from django.db import migrations
+
+
+def content_key(recipient_email, subject, message):
+    # Cópia congelada da normalização de Notification.compute_content_hash:
+    # migrações não devem depender do código atual do modelo.
+    return (
+        (recipient_email or '').strip().lower(),
+        (subject or '').strip(),
+        (message or '').strip(),
+    )
+
+
+def resolve_duplicates(apps, schema_editor):
+    # Envios concorrentes, ou uma notificação que falhou e foi enviada de
+    # novo, podem ter deixado mais de uma notificação pendente ou enviada
+    # com o mesmo conteúdo. A enviada mais antiga (ou, se não houver, a
+    # pendente mais antiga) é mantida; as demais são marcadas como falha
+    # para que a restrição única da próxima migração possa ser criada
+    Notification = apps.get_model('notifications', 'Notification')
+    kept = {}
+    duplicates = {}
+    for notification_id, recipient_email, subject, message, status in Notification.objects.filter(
+        status__in=['pending', 'sent']
+    ).order_by('id').values_list('id', 'recipient_email', 'subject', 'message', 'status').iterator(chunk_size=2000):
+        key = content_key(recipient_email, subject, message)
+        current = kept.get(key)
+        if current is None:
+            kept[key] = (notification_id, status)
+        elif status == 'sent' and current[1] != 'sent':
+            kept[key] = (notification_id, status)
+            duplicates[current[0]] = key
+        else:
+            duplicates[notification_id] = key
+    
+    losers = {}
+    for notification_id, key in duplicates.items():
+        losers.setdefault(kept[key][0], []).append(notification_id)
+    for kept_id, ids in losers.items():
+        Notification.objects.filter(id__in=ids).update(
+            status='failed',
+            error_message=f'Duplicata da notificação {kept_id}, removida da deduplicação na migração'
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_notification_notif_dup_check_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(resolve_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.25 on 2026-10-17 10:00
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def compute_content_hash(recipient_email, subject, message):
+    # Cópia congelada de Notification.compute_content_hash: migrações não
+    # devem depender do código atual do modelo.
+    normalized = '\x00'.join([
+        (recipient_email or '').strip().lower(),
+        (subject or '').strip(),
+        (message or '').strip(),
+    ])
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def populate_content_hash(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    batch = []
+    for notification in Notification.objects.only(
+        'id', 'recipient_email', 'subject', 'message'
+    ).iterator(chunk_size=2000):
+        notification.content_hash = compute_content_hash(
+            notification.recipient_email, notification.subject, notification.message
+        )
+        batch.append(notification)
+        if len(batch) >= 2000:
+            Notification.objects.bulk_update(batch, ['content_hash'])
+            batch = []
+    if batch:
+        Notification.objects.bulk_update(batch, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_resolve_duplicate_notifications'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='content_hash',
+            field=models.CharField(default='', editable=False, help_text='SHA-256 do destinatário, assunto e mensagem normalizados', max_length=64, verbose_name='Hash do Conteúdo'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(populate_content_hash, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='notification',
+            name='notif_dup_check_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'sent'])), fields=('content_hash',), name='notif_claimed_content_hash_uniq'),
+        ),
+    ]
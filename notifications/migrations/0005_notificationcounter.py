@@ -0,0 +1,55 @@
+# Generated by Django 4.2.25 on 2026-10-17 13:00
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDay, TruncHour
+
+
+def populate_counters(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    NotificationCounter = apps.get_model('notifications', 'NotificationCounter')
+    
+    notifications = Notification.objects.order_by()
+    counters = []
+    for period, trunc in (('day', TruncDay), ('hour', TruncHour)):
+        rows = (
+            notifications.annotate(bucket=trunc('created_at'))
+            .values('bucket', 'status')
+            .annotate(total=Count('id'))
+        )
+        counters.extend(
+            NotificationCounter(
+                period=period, bucket=row['bucket'], status=row['status'], count=row['total']
+            )
+            for row in rows
+        )
+    NotificationCounter.objects.bulk_create(counters, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_notification_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('day', 'Dia'), ('hour', 'Hora')], max_length=4, verbose_name='Período')),
+                ('bucket', models.DateTimeField(help_text='Início do dia ou da hora de criação das notificações contadas', verbose_name='Início do Período')),
+                ('status', models.CharField(choices=[('pending', 'Pendente'), ('sent', 'Enviado'), ('failed', 'Falhou')], max_length=10, verbose_name='Status')),
+                ('count', models.BigIntegerField(default=0, verbose_name='Quantidade')),
+            ],
+            options={
+                'verbose_name': 'Contador de Notificações',
+                'verbose_name_plural': 'Contadores de Notificações',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='notificationcounter',
+            constraint=models.UniqueConstraint(fields=('period', 'bucket', 'status'), name='notif_counter_bucket_uniq'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.25 on 2026-10-17 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0005_notificationcounter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['-created_at', '-id'], name='notif_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.25 on 2026-10-17 15:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0006_notification_notif_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['status', '-created_at', '-id'], name='notif_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient_email', '-created_at', '-id'], name='notif_recipient_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['-sent_at'], name='notif_sent_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['content_hash'], name='notif_content_hash_idx'),
+        ),
+    ]
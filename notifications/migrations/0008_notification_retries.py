@@ -0,0 +1,30 @@
+# Generated by Django 4.2.25 on 2026-10-17 16:00
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def schedule_pending(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    Notification.objects.filter(status='pending').update(next_attempt_at=timezone.now())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0007_notification_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Quantidade de tentativas de envio já realizadas', verbose_name='Tentativas'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Quando uma notificação pendente pode ser entregue por um worker. Fica no futuro enquanto um envio está em andamento ou uma nova tentativa está agendada.', null=True, verbose_name='Próxima Tentativa'),
+        ),
+        migrations.RunPython(schedule_pending, migrations.RunPython.noop),
+    ]
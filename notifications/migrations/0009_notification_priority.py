@@ -0,0 +1,22 @@
+# Generated by Django 4.2.25 on 2026-10-17 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0008_notification_retries'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='priority',
+            field=models.CharField(choices=[('high', 'Alta'), ('normal', 'Normal'), ('low', 'Baixa')], default='normal', help_text='Faixa da fila de entrega; as de maior prioridade são entregues primeiro', max_length=10, verbose_name='Prioridade'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['priority', 'next_attempt_at'], name='notif_pending_lane_due_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.25 on 2026-10-17 18:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0009_notification_priority'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.SlugField(help_text='Identificador do template (ex.: password-reset)', max_length=100, unique=True, verbose_name='Nome')),
+                ('subject', models.CharField(help_text='Template do assunto do email', max_length=200, verbose_name='Assunto')),
+                ('body', models.TextField(help_text='Template do corpo do email', verbose_name='Corpo')),
+                ('version', models.PositiveIntegerField(default=1, editable=False, help_text='Incrementada a cada edição; cada versão é guardada em NotificationTemplateVersion', verbose_name='Versão')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Data de Criação')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Data de Atualização')),
+            ],
+            options={
+                'verbose_name': 'Template de Notificação',
+                'verbose_name_plural': 'Templates de Notificação',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='context',
+            field=models.JSONField(blank=True, help_text='Variáveis usadas para renderizar o template', null=True, verbose_name='Contexto'),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='message',
+            field=models.TextField(blank=True, help_text='Corpo da mensagem do email (vazio quando gerado por um template)', verbose_name='Mensagem'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='template',
+            field=models.ForeignKey(blank=True, help_text='Template usado para gerar o corpo da mensagem', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='notifications', to='notifications.notificationtemplate', verbose_name='Template'),
+        ),
+    ]
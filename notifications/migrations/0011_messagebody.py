@@ -0,0 +1,108 @@
+# Generated by Django 4.2.25 on 2026-10-17 19:00
+
+import hashlib
+import zlib
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def pack_body(text):
+    # Cópia congelada de MessageBodyManager.prepare: migrações não devem
+    # depender do código atual do modelo.
+    raw = text.encode('utf-8')
+    data, compressed = raw, False
+    threshold = getattr(settings, 'NOTIFICATIONS_BODY_COMPRESSION_THRESHOLD', 1024)
+    if threshold and len(raw) >= threshold:
+        packed = zlib.compress(raw)
+        if len(packed) < len(raw):
+            data, compressed = packed, True
+    return hashlib.sha256(raw).hexdigest(), data, compressed, len(raw)
+
+
+def move_bodies(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    MessageBody = apps.get_model('notifications', 'MessageBody')
+    
+    def flush(batch):
+        digests = {}
+        for notification in batch:
+            digests.setdefault(pack_body(notification.message)[0], notification.message)
+        existing = MessageBody.objects.in_bulk(list(digests), field_name='digest')
+        MessageBody.objects.bulk_create(
+            [
+                MessageBody(digest=digest, data=data, compressed=compressed, size=size)
+                for digest, data, compressed, size in map(pack_body, digests.values())
+                if digest not in existing
+            ],
+            ignore_conflicts=True
+        )
+        ids = dict(
+            MessageBody.objects.filter(digest__in=list(digests)).values_list('digest', 'id')
+        )
+        for notification in batch:
+            notification.message_body_id = ids[pack_body(notification.message)[0]]
+        Notification.objects.bulk_update(batch, ['message_body'])
+    
+    batch = []
+    for notification in Notification.objects.exclude(message='').only(
+        'id', 'message'
+    ).iterator(chunk_size=2000):
+        batch.append(notification)
+        if len(batch) >= 2000:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+
+def restore_bodies(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    batch = []
+    for notification in Notification.objects.filter(
+        message_body__isnull=False
+    ).select_related('message_body').iterator(chunk_size=2000):
+        body = notification.message_body
+        data = bytes(body.data)
+        notification.message = (zlib.decompress(data) if body.compressed else data).decode('utf-8')
+        batch.append(notification)
+        if len(batch) >= 2000:
+            Notification.objects.bulk_update(batch, ['message'])
+            batch = []
+    if batch:
+        Notification.objects.bulk_update(batch, ['message'])
+
+
+class Migration(migrations.Migration):
+    
+    dependencies = [
+        ('notifications', '0010_notificationtemplate'),
+    ]
+    
+    operations = [
+        migrations.CreateModel(
+            name='MessageBody',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(help_text='SHA-256 do corpo da mensagem', max_length=64, unique=True, verbose_name='Hash')),
+                ('data', models.BinaryField(help_text='Corpo da mensagem em UTF-8, comprimido com zlib se compressed', verbose_name='Conteúdo')),
+                ('compressed', models.BooleanField(default=False, verbose_name='Comprimido')),
+                ('size', models.PositiveIntegerField(help_text='Tamanho do corpo sem compressão, em bytes', verbose_name='Tamanho')),
+            ],
+            options={
+                'verbose_name': 'Corpo de Mensagem',
+                'verbose_name_plural': 'Corpos de Mensagem',
+            },
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='message_body',
+            field=models.ForeignKey(blank=True, help_text='Corpo da mensagem do email (vazio quando gerado por um template)', null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='notifications', to='notifications.messagebody', verbose_name='Mensagem'),
+        ),
+        migrations.RunPython(move_bodies, restore_bodies),
+        migrations.RemoveField(
+            model_name='notification',
+            name='message',
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.25 on 2026-10-17 22:00
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_updated_at(apps, schema_editor):
+    # A última alteração conhecida das notificações existentes é o envio
+    # ou, se não foram enviadas, a criação
+    Notification = apps.get_model('notifications', 'Notification')
+    Notification.objects.update(updated_at=Coalesce('sent_at', 'created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0011_messagebody'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='Última alteração; base do ETag e do Last-Modified da API', verbose_name='Data de Atualização'),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['-updated_at'], name='notif_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['status', '-updated_at'], name='notif_status_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.25 on 2026-10-17 23:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def snapshot_templates(apps, schema_editor):
+    # O histórico anterior não existe: a versão atual de cada template passa
+    # a ser a versão das notificações que já o usam
+    NotificationTemplate = apps.get_model('notifications', 'NotificationTemplate')
+    NotificationTemplateVersion = apps.get_model('notifications', 'NotificationTemplateVersion')
+    Notification = apps.get_model('notifications', 'Notification')
+    
+    for template in NotificationTemplate.objects.all():
+        NotificationTemplateVersion.objects.create(
+            template=template, version=template.version, subject=template.subject, body=template.body
+        )
+        Notification.objects.filter(template=template).update(template_version=template.version)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0012_notification_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='template_version',
+            field=models.PositiveIntegerField(blank=True, editable=False, help_text='Versão do template usada no corpo; edições posteriores do template não o alteram', null=True, verbose_name='Versão do Template'),
+        ),
+        migrations.CreateModel(
+            name='NotificationTemplateVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField(verbose_name='Versão')),
+                ('subject', models.CharField(max_length=200, verbose_name='Assunto')),
+                ('body', models.TextField(verbose_name='Corpo')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Data de Criação')),
+                ('template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='versions', to='notifications.notificationtemplate', verbose_name='Template')),
+            ],
+            options={
+                'verbose_name': 'Versão de Template',
+                'verbose_name_plural': 'Versões de Template',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='notificationtemplateversion',
+            constraint=models.UniqueConstraint(fields=('template', 'version'), name='notif_template_version_uniq'),
+        ),
+        migrations.RunPython(snapshot_templates, migrations.RunPython.noop),
+    ]
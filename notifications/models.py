@@ -1,4 +1,171 @@
-from django.db import models
+import hashlib
+import operator
+import zlib
+from collections import Counter
+from functools import reduce
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, transaction
+from django.db.models import BigIntegerField, Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import TruncDay, TruncHour
+from django.template import TemplateSyntaxError
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .caching import invalidate_responses
+from .templating import ENGINE, render_template, template_cache
+
+
+class NotificationManager(models.Manager):
+    """
+    Manager com as operações em conjunto sobre notificações, feitas em
+    blocos de NOTIFICATIONS_BULK_CHUNK_SIZE linhas, cada um em uma transação
+    curta, sem carregar as notificações em memória.
+    """
+    
+    def _chunks(self, queryset, fields, chunk_size=None):
+        """
+        Percorre o queryset em blocos ordenados por id (paginação por
+        posição), retornando em cada bloco as tuplas de `fields`.
+        """
+        chunk_size = chunk_size or settings.NOTIFICATIONS_BULK_CHUNK_SIZE
+        queryset = queryset.order_by('pk').values_list('pk', *fields)
+        last_pk = 0
+        while True:
+            rows = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+            if not rows:
+                return
+            yield rows
+            if len(rows) < chunk_size:
+                return
+            last_pk = rows[-1][0]
+    
+    def delete_rows(self, rows):
+        """
+        Remove as notificações de `rows` em uma transação que começa pelo
+        DELETE, ajustando os contadores e removendo os corpos de mensagem
+        que deixaram de ser usados. Notificações cujo status mudou desde a
+        leitura são mantidas.
+        
+        Args:
+            rows (list): tuplas (id, created_at, status, message_body_id)
+        
+        Returns:
+            int: quantidade de notificações removidas
+        """
+        by_status = {}
+        for row in rows:
+            by_status.setdefault(row[2], []).append(row)
+        
+        deleted_rows = []
+        with transaction.atomic():
+            for status, group in by_status.items():
+                ids = [row[0] for row in group]
+                # Sem relações nem sinais, o delete() é um único DELETE, sem
+                # carregar as notificações
+                deleted = self.filter(id__in=ids, status=status).delete()[0]
+                if deleted < len(group):
+                    kept = set(self.filter(id__in=ids).values_list('id', flat=True))
+                    group = [row for row in group if row[0] not in kept]
+                deleted_rows.extend(group)
+            
+            NotificationCounter.objects.record_transitions(
+                (created_at, status, None) for _, created_at, status, _ in deleted_rows
+            )
+            if deleted_rows:
+                invalidate_responses()
+            body_ids = {body_id for *_, body_id in deleted_rows if body_id is not None}
+            if body_ids:
+                MessageBody.objects.delete_unreferenced(body_ids)
+        return len(deleted_rows)
+    
+    def bulk_delete(self, queryset, chunk_size=None):
+        """
+        Remove todas as notificações do queryset, em blocos.
+        
+        Returns:
+            int: quantidade de notificações removidas
+        """
+        fields = ['created_at', 'status', 'message_body_id']
+        return sum(
+            self.delete_rows(rows) for rows in self._chunks(queryset, fields, chunk_size)
+        )
+    
+    def bulk_requeue(self, queryset, chunk_size=None):
+        """
+        Devolve à fila de entrega as notificações com falha do queryset, com
+        as tentativas zeradas, em blocos.
+        
+        Uma notificação não é reenfileirada se já houver outra pendente ou
+        enviada com o mesmo conteúdo (ver CLAIMED_STATUSES); entre falhas
+        repetidas do mesmo conteúdo, apenas a primeira volta para a fila.
+        
+        Returns:
+            tuple: (reenfileiradas, ignoradas)
+        """
+        requeued = skipped = 0
+        fields = ['created_at', 'content_hash']
+        for rows in self._chunks(queryset.filter(status='failed'), fields, chunk_size):
+            claimed = set(
+                self.filter(
+                    content_hash__in={row[2] for row in rows},
+                    status__in=Notification.CLAIMED_STATUSES
+                ).values_list('content_hash', flat=True)
+            )
+            selected = []
+            for row in rows:
+                if row[2] not in claimed:
+                    claimed.add(row[2])
+                    selected.append(row)
+            skipped += len(rows) - len(selected)
+            if not selected:
+                continue
+            
+            ids = [row[0] for row in selected]
+            now = timezone.now()
+            try:
+                with transaction.atomic():
+                    updated = self.filter(id__in=ids, status='failed').update(
+                        status='pending', attempts=0, error_message=None, next_attempt_at=now,
+                        updated_at=now
+                    )
+                    if updated < len(selected):
+                        # Dentro da transação, as linhas atualizadas aqui
+                        # são as pendentes com este next_attempt_at
+                        changed = set(self.filter(
+                            id__in=ids, status='pending', next_attempt_at=now
+                        ).values_list('id', flat=True))
+                        selected = [row for row in selected if row[0] in changed]
+                    NotificationCounter.objects.record_transitions(
+                        (created_at, 'failed', 'pending') for _, created_at, _ in selected
+                    )
+                    invalidate_responses()
+            except IntegrityError:
+                # Um envio concorrente reservou um dos conteúdos; o bloco é
+                # mantido como estava
+                skipped += len(selected)
+                continue
+            requeued += len(selected)
+            skipped += len(ids) - len(selected)
+        return requeued, skipped
+    
+    def intern_bodies(self, notifications):
+        """
+        Grava de uma vez os corpos atribuídos a `message` em notificações
+        ainda não salvas e preenche o message_body de cada uma, como save()
+        faz para uma notificação. Usado antes de um bulk_create, que não
+        passa por save(); cada corpo distinto é gravado uma única vez.
+        """
+        notifications = [
+            notification for notification in notifications if '_message' in notification.__dict__
+        ]
+        bodies = MessageBody.objects.intern_many(
+            notification.message for notification in notifications if notification.message
+        )
+        for notification in notifications:
+            message = notification.__dict__.pop('_message')
+            notification.message_body = bodies[message] if message else None
 
 
 class Notification(models.Model):
@@ -11,6 +178,21 @@ class Notification(models.Model):
         ('failed', 'Falhou'),
     ]
     
+    # Faixas da fila de entrega, da mais para a menos prioritária
+    PRIORITY_CHOICES = [
+        ('high', 'Alta'),
+        ('normal', 'Normal'),
+        ('low', 'Baixa'),
+    ]
+    PRIORITY_LANES = [lane for lane, _ in PRIORITY_CHOICES]
+    
+    # Status que "reservam" o conteúdo: enquanto existir uma notificação
+    # pendente ou enviada com o mesmo hash, nenhuma outra pode ser criada.
+    CLAIMED_STATUSES = ['pending', 'sent']
+    
+    # Colunas das quais o content_hash é calculado
+    CONTENT_FIELDS = ['recipient_email', 'subject', 'message_body_id', 'template_id', 'context']
+    
     recipient_email = models.EmailField(
         verbose_name='Email do Destinatário',
         help_text='Email para o qual a notificação será enviada'
@@ -20,9 +202,38 @@ class Notification(models.Model):
         verbose_name='Assunto',
         help_text='Assunto do email'
     )
-    message = models.TextField(
+    # DO_NOTHING: a restrição da chave estrangeira no banco já impede remover
+    # corpos em uso, e permite remover os não usados com um único DELETE
+    message_body = models.ForeignKey(
+        'MessageBody',
+        on_delete=models.DO_NOTHING,
+        null=True,
+        blank=True,
+        related_name='notifications',
         verbose_name='Mensagem',
-        help_text='Corpo da mensagem do email'
+        help_text='Corpo da mensagem do email (vazio quando gerado por um template)'
+    )
+    template = models.ForeignKey(
+        'NotificationTemplate',
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name='notifications',
+        verbose_name='Template',
+        help_text='Template usado para gerar o corpo da mensagem'
+    )
+    template_version = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Versão do Template',
+        help_text='Versão do template usada no corpo; edições posteriores do template não o alteram'
+    )
+    context = models.JSONField(
+        null=True,
+        blank=True,
+        verbose_name='Contexto',
+        help_text='Variáveis usadas para renderizar o template'
     )
     status = models.CharField(
         max_length=10,
@@ -30,6 +241,13 @@ class Notification(models.Model):
         default='pending',
         verbose_name='Status'
     )
+    priority = models.CharField(
+        max_length=10,
+        choices=PRIORITY_CHOICES,
+        default='normal',
+        verbose_name='Prioridade',
+        help_text='Faixa da fila de entrega; as de maior prioridade são entregues primeiro'
+    )
     error_message = models.TextField(
         blank=True,
         null=True,
@@ -45,15 +263,735 @@ class Notification(models.Model):
         blank=True,
         verbose_name='Data de Envio'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Data de Atualização',
+        help_text='Última alteração; base do ETag e do Last-Modified da API'
+    )
+    attempts = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Tentativas',
+        help_text='Quantidade de tentativas de envio já realizadas'
+    )
+    next_attempt_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Próxima Tentativa',
+        help_text=(
+            'Quando uma notificação pendente pode ser entregue por um worker. '
+            'Fica no futuro enquanto um envio está em andamento ou uma nova '
+            'tentativa está agendada.'
+        )
+    )
+    content_hash = models.CharField(
+        max_length=64,
+        editable=False,
+        verbose_name='Hash do Conteúdo',
+        help_text='SHA-256 do destinatário, assunto e mensagem normalizados'
+    )
+    
+    objects = NotificationManager()
     
     class Meta:
         verbose_name = 'Notificação'
         verbose_name_plural = 'Notificações'
         ordering = ['-created_at']
         indexes = [
-            models.Index(fields=['recipient_email', 'subject', 'message', 'status'], 
-                        name='notif_dup_check_idx')
+            models.Index(fields=['-created_at', '-id'], name='notif_created_id_idx'),
+            # Listagem filtrada por status e ordenada pelas mais recentes
+            models.Index(fields=['status', '-created_at', '-id'], name='notif_status_created_idx'),
+            # Histórico de um destinatário (filtro da API e busca do admin)
+            models.Index(fields=['recipient_email', '-created_at', '-id'], name='notif_recipient_created_idx'),
+            # Filtro por data de envio do admin
+            models.Index(fields=['-sent_at'], name='notif_sent_at_idx'),
+            # Validação das requisições condicionais da listagem: última
+            # alteração de todas as notificações e das de um status
+            models.Index(fields=['-updated_at'], name='notif_updated_idx'),
+            models.Index(fields=['status', '-updated_at'], name='notif_status_updated_idx'),
+            # Busca de duplicatas pelo hash entre as pendentes e enviadas. A
+            # restrição única parcial abaixo não serve a essa consulta no
+            # SQLite: com o IN parametrizado, ele não consegue provar a
+            # condição do índice e percorre a tabela inteira. O custo é uma
+            # entrada a mais por INSERT, contra uma varredura por envio.
+            models.Index(fields=['content_hash'], name='notif_content_hash_idx'),
+            # Fila de entrega: pendentes de cada faixa de prioridade cuja
+            # próxima tentativa já venceu. Parcial, porque as enviadas e com
+            # falha, quase todas as linhas, nunca são lidas pela fila; o
+            # SQLite o usa mesmo com o status parametrizado, por ser uma
+            # igualdade com a condição do índice.
+            models.Index(
+                fields=['priority', 'next_attempt_at'],
+                condition=models.Q(status='pending'),
+                name='notif_pending_lane_due_idx'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['content_hash'],
+                condition=models.Q(status__in=['pending', 'sent']),
+                name='notif_claimed_content_hash_uniq'
+            )
         ]
     
     def __str__(self):
         return f"{self.subject} - {self.recipient_email} ({self.status})"
+    
+    @property
+    def message(self):
+        """
+        Corpo da mensagem gravado, guardado uma única vez em MessageBody
+        para todas as notificações com o mesmo conteúdo.
+        
+        Pode ser atribuído (inclusive como argumento do construtor); o
+        MessageBody correspondente é obtido ou criado em save().
+        """
+        if '_message' in self.__dict__:
+            return self._message
+        if self.message_body_id is None:
+            return ''
+        return self.message_body.text
+    
+    @message.setter
+    def message(self, value):
+        self._message = value or ''
+        self.__dict__.pop('body', None)
+    
+    @cached_property
+    def body(self):
+        """
+        Corpo do email: a mensagem gravada ou, para notificações geradas
+        por template, a versão do template usada na criação renderizada com
+        o contexto gravado.
+        
+        O resultado fica guardado na instância; quem já tem o corpo
+        renderizado (por exemplo, da validação do envio) pode atribuí-lo
+        diretamente.
+        """
+        if self.template_id is None:
+            return self.message
+        return render_template(self.template, self.context, self.template_version)[1]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guarda o status lido do banco para que save() saiba quais
+        # contadores ajustar quando ele mudar
+        if 'status' in field_names:
+            instance._loaded_status = instance.status
+        # e o conteúdo lido, para que recalcule o content_hash quando ele mudar
+        if all(field in field_names for field in cls.CONTENT_FIELDS):
+            instance._loaded_content = instance.content_key()
+        return instance
+    
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        if fields is None or 'status' in fields:
+            self._loaded_status = self.status
+        if fields is None or {'message_body', 'template', 'context'} & set(fields):
+            self.__dict__.pop('_message', None)
+            self.__dict__.pop('body', None)
+        if fields is None:
+            self._loaded_content = self.content_key()
+    
+    def content_key(self):
+        """
+        Retorna os valores das colunas que determinam o conteúdo.
+        """
+        return tuple(getattr(self, field) for field in self.CONTENT_FIELDS)
+    
+    def content_changed(self):
+        """
+        Indica se o destinatário, o assunto ou o corpo mudaram desde que a
+        notificação foi lida do banco ou gravada. Sem o conteúdo lido (por
+        exemplo, lida com parte das colunas), considera que mudaram.
+        """
+        loaded = getattr(self, '_loaded_content', None)
+        return loaded is None or loaded != self.content_key()
+    
+    def clean(self):
+        super().clean()
+        if self.status not in self.CLAIMED_STATUSES:
+            return
+        content_hash = self.compute_content_hash(self.recipient_email, self.subject, self.body)
+        duplicate = Notification.objects.filter(
+            content_hash=content_hash, status__in=self.CLAIMED_STATUSES
+        ).exclude(pk=self.pk).values_list('pk', flat=True).first()
+        if duplicate is not None:
+            raise ValidationError(
+                f'Já existe uma notificação pendente ou enviada com o mesmo conteúdo (id {duplicate}).'
+            )
+    
+    def save(self, *args, **kwargs):
+        if '_message' in self.__dict__:
+            message = self.__dict__.pop('_message')
+            self.message_body = MessageBody.objects.intern(message) if message else None
+        
+        # A notificação guarda a versão do template com que foi gerada, para
+        # que o corpo não mude quando o template for editado depois
+        if self.template_id is None:
+            self.template_version = None
+        elif self.template_version is None:
+            self.template_version = self.template.version
+        
+        # O hash acompanha o conteúdo: edições do destinatário, do assunto
+        # ou do corpo (pela API ou pelo admin) mudam a chave de deduplicação
+        if not self.content_hash or (not self._state.adding and self.content_changed()):
+            if hasattr(self, '_loaded_content'):
+                # O corpo guardado na instância pode ser o do conteúdo antigo,
+                # e o novo é gerado pela versão atual do template
+                self.__dict__.pop('body', None)
+                if self.template_id is not None:
+                    self.template_version = self.template.version
+            self.content_hash = self.compute_content_hash(
+                self.recipient_email, self.subject, self.body
+            )
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'content_hash', 'template_version'}
+        
+        adding = self._state.adding
+        if adding and self.status == 'pending' and self.next_attempt_at is None:
+            # Notificações pendentes entram na fila já disponíveis para envio
+            self.next_attempt_at = timezone.now()
+        
+        if adding:
+            previous_status = None
+        elif hasattr(self, '_loaded_status'):
+            previous_status = self._loaded_status
+        else:
+            previous_status = Notification.objects.filter(pk=self.pk).values_list(
+                'status', flat=True
+            ).first()
+        
+        # A notificação e os contadores são gravados na mesma transação, sem
+        # savepoint próprio: quem precisa se recuperar de um erro no meio de
+        # uma transação maior (ex.: IntegrityError) usa o seu
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            if previous_status != self.status:
+                NotificationCounter.objects.record_transitions(
+                    [(self.created_at, previous_status, self.status)]
+                )
+            invalidate_responses()
+        self._loaded_status = self.status
+        self._loaded_content = self.content_key()
+    
+    def delete(self, *args, **kwargs):
+        status = getattr(self, '_loaded_status', self.status)
+        message_body_id = self.message_body_id
+        with transaction.atomic(savepoint=False):
+            result = super().delete(*args, **kwargs)
+            NotificationCounter.objects.record_transitions(
+                [(self.created_at, status, None)]
+            )
+            invalidate_responses()
+            if message_body_id is not None:
+                MessageBody.objects.delete_unreferenced([message_body_id])
+        return result
+    
+    @staticmethod
+    def compute_content_hash(recipient_email, subject, message):
+        """
+        Calcula a chave de deduplicação de uma notificação.
+        
+        Os campos são normalizados da mesma forma que o
+        SendNotificationSerializer (email em minúsculas, espaços das bordas
+        removidos) e separados por um caractere nulo, de modo que o hash tem
+        tamanho fixo independentemente do tamanho da mensagem.
+        """
+        normalized = '\x00'.join([
+            (recipient_email or '').strip().lower(),
+            (subject or '').strip(),
+            (message or '').strip(),
+        ])
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def truncate_to_hour(value):
+    """
+    Trunca um datetime para o início da hora no fuso horário atual, da mesma
+    forma que TruncHour faz no banco.
+    """
+    return timezone.localtime(value).replace(minute=0, second=0, microsecond=0)
+
+
+def truncate_to_day(value):
+    """
+    Trunca um datetime para o início do dia no fuso horário atual, da mesma
+    forma que TruncDay faz no banco.
+    """
+    return truncate_to_hour(value).replace(hour=0)
+
+
+class NotificationCounterManager(models.Manager):
+    """
+    Manager com as operações de manutenção dos contadores de notificações.
+    """
+    
+    TRUNC_FUNCTIONS = {
+        'day': TruncDay,
+        'hour': TruncHour,
+    }
+    
+    def bucket_keys(self, created_at):
+        """
+        Retorna os pares (período, bucket) afetados por uma notificação
+        criada em `created_at`.
+        """
+        return [
+            ('day', truncate_to_day(created_at)),
+            ('hour', truncate_to_hour(created_at)),
+        ]
+    
+    def record_transitions(self, transitions):
+        """
+        Ajusta os contadores para uma sequência de mudanças de status.
+        
+        Args:
+            transitions (iterable): tuplas (created_at, status_anterior,
+                novo_status); None como status anterior indica criação e
+                None como novo status indica remoção
+        """
+        deltas = Counter()
+        for created_at, previous_status, new_status in transitions:
+            for period, bucket in self.bucket_keys(created_at):
+                if previous_status is not None:
+                    deltas[(period, bucket, previous_status)] -= 1
+                if new_status is not None:
+                    deltas[(period, bucket, new_status)] += 1
+        self.apply_deltas(deltas)
+    
+    def apply_deltas(self, deltas):
+        """
+        Soma os deltas aos contadores com um único UPDATE para cada grupo de
+        buckets que recebe os mesmos deltas (em geral, o dia e a hora de uma
+        mudança de status), criando as linhas que ainda não existem. Os
+        grupos são atualizados sempre na mesma ordem para evitar deadlocks
+        entre transações concorrentes.
+        """
+        by_bucket = {}
+        for (period, bucket, status), delta in deltas.items():
+            if delta:
+                by_bucket.setdefault((period, bucket), {})[status] = delta
+        groups = {}
+        for key, status_deltas in by_bucket.items():
+            groups.setdefault(tuple(sorted(status_deltas.items())), []).append(key)
+        
+        with transaction.atomic(savepoint=False):
+            for status_deltas, keys in sorted(groups.items(), key=lambda group: min(group[1])):
+                counters = self.filter(
+                    reduce(operator.or_, (Q(period=period, bucket=bucket) for period, bucket in keys)),
+                    status__in=[status for status, _ in status_deltas]
+                )
+                if counters.update(count=self._delta_expression(status_deltas)) == len(keys) * len(status_deltas):
+                    continue
+                # Algum bucket ainda não tem as linhas: desfaz o UPDATE
+                # parcial, cria as linhas de todos os status zeradas (as
+                # criadas ao mesmo tempo por outra transação são mantidas) e
+                # aplica os deltas de novo
+                counters.update(count=self._delta_expression(status_deltas, sign=-1))
+                self.bulk_create(
+                    [
+                        self.model(period=period, bucket=bucket, status=status, count=0)
+                        for period, bucket in sorted(keys)
+                        for status, _ in Notification.STATUS_CHOICES
+                    ],
+                    ignore_conflicts=True
+                )
+                counters.update(count=self._delta_expression(status_deltas))
+    
+    def _delta_expression(self, status_deltas, sign=1):
+        return F('count') + Case(
+            *[When(status=status, then=Value(sign * delta)) for status, delta in status_deltas],
+            default=Value(0),
+            output_field=BigIntegerField()
+        )
+    
+    def totals(self, queryset=None):
+        """
+        Soma os contadores por status. Sem `queryset`, soma os contadores
+        diários, o que dá o total de todo o histórico.
+        
+        Returns:
+            dict: contagens de 'total', 'sent', 'failed' e 'pending'
+        """
+        if queryset is None:
+            queryset = self.filter(period='day')
+        counts = dict(
+            queryset.order_by().values('status').annotate(total=Sum('count')).values_list('status', 'total')
+        )
+        return self._format(counts)
+    
+    def series(self, period, queryset=None):
+        """
+        Retorna as contagens por status de cada bucket do período, em ordem
+        cronológica.
+        """
+        if queryset is None:
+            queryset = self.all()
+        rows = (
+            queryset.filter(period=period)
+            .order_by('bucket')
+            .values('bucket', 'status')
+            .annotate(total=Sum('count'))
+        )
+        buckets = {}
+        for row in rows:
+            buckets.setdefault(row['bucket'], {})[row['status']] = row['total']
+        return [
+            {'bucket': bucket, **self._format(counts)}
+            for bucket, counts in buckets.items()
+        ]
+    
+    def _format(self, counts):
+        result = {
+            status: counts.get(status) or 0
+            for status, _ in Notification.STATUS_CHOICES
+        }
+        result['total'] = sum(result.values())
+        return result
+    
+    def recount(self):
+        """
+        Recalcula todos os contadores a partir da tabela de notificações.
+        
+        Returns:
+            dict: {(período, bucket, status): contagem}
+        """
+        expected = {}
+        notifications = Notification.objects.order_by()
+        for period, trunc in self.TRUNC_FUNCTIONS.items():
+            rows = (
+                notifications.annotate(bucket=trunc('created_at'))
+                .values('bucket', 'status')
+                .annotate(total=Count('id'))
+            )
+            for row in rows:
+                expected[(period, row['bucket'], row['status'])] = row['total']
+        return expected
+    
+    def rebuild(self):
+        """
+        Apaga e recria todos os contadores a partir de uma recontagem
+        completa.
+        
+        Returns:
+            int: número de linhas de contador criadas
+        """
+        expected = self.recount()
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(
+                [
+                    self.model(period=period, bucket=bucket, status=status, count=count)
+                    for (period, bucket, status), count in expected.items()
+                ],
+                batch_size=1000
+            )
+        return len(expected)
+    
+    def check_consistency(self):
+        """
+        Compara os contadores mantidos com uma recontagem completa.
+        
+        Returns:
+            list: tuplas (período, bucket, status, esperado, atual) para
+                cada contador divergente
+        """
+        expected = self.recount()
+        actual = {
+            (counter.period, counter.bucket, counter.status): counter.count
+            for counter in self.all()
+        }
+        mismatches = []
+        for key in sorted(set(expected) | set(actual)):
+            if expected.get(key, 0) != actual.get(key, 0):
+                mismatches.append((*key, expected.get(key, 0), actual.get(key, 0)))
+        return mismatches
+
+
+class NotificationCounter(models.Model):
+    """
+    Contadores de notificações por status, mantidos a cada criação, mudança
+    de status ou remoção de uma notificação. Permitem calcular as
+    estatísticas lendo poucas linhas, independentemente do tamanho da
+    tabela de notificações.
+    """
+    PERIOD_CHOICES = [
+        ('day', 'Dia'),
+        ('hour', 'Hora'),
+    ]
+    
+    period = models.CharField(
+        max_length=4,
+        choices=PERIOD_CHOICES,
+        verbose_name='Período'
+    )
+    bucket = models.DateTimeField(
+        verbose_name='Início do Período',
+        help_text='Início do dia ou da hora de criação das notificações contadas'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=Notification.STATUS_CHOICES,
+        verbose_name='Status'
+    )
+    count = models.BigIntegerField(
+        default=0,
+        verbose_name='Quantidade'
+    )
+    
+    objects = NotificationCounterManager()
+    
+    class Meta:
+        verbose_name = 'Contador de Notificações'
+        verbose_name_plural = 'Contadores de Notificações'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['period', 'bucket', 'status'],
+                name='notif_counter_bucket_uniq'
+            )
+        ]
+    
+    def __str__(self):
+        return f"{self.period} {self.bucket:%Y-%m-%d %H:%M} {self.status}: {self.count}"
+
+
+class NotificationTemplate(models.Model):
+    """
+    Template de notificação: assunto e corpo na linguagem de templates do
+    Django, renderizados com o contexto enviado em cada notificação.
+    """
+    name = models.SlugField(
+        max_length=100,
+        unique=True,
+        verbose_name='Nome',
+        help_text='Identificador do template (ex.: password-reset)'
+    )
+    subject = models.CharField(
+        max_length=200,
+        verbose_name='Assunto',
+        help_text='Template do assunto do email'
+    )
+    body = models.TextField(
+        verbose_name='Corpo',
+        help_text='Template do corpo do email'
+    )
+    version = models.PositiveIntegerField(
+        default=1,
+        editable=False,
+        verbose_name='Versão',
+        help_text='Incrementada a cada edição; cada versão é guardada em NotificationTemplateVersion'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Data de Criação'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Data de Atualização'
+    )
+    
+    class Meta:
+        verbose_name = 'Template de Notificação'
+        verbose_name_plural = 'Templates de Notificação'
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+    
+    def clean(self):
+        errors = {}
+        for field in ('subject', 'body'):
+            try:
+                ENGINE.from_string(getattr(self, field))
+            except TemplateSyntaxError as e:
+                errors[field] = f'Template inválido: {e}'
+        if errors:
+            raise ValidationError(errors)
+    
+    def save(self, *args, **kwargs):
+        editing = not self._state.adding
+        with transaction.atomic():
+            if editing:
+                # Incremento atômico, para que edições simultâneas não gerem a
+                # mesma versão com conteúdos diferentes
+                self.version = F('version') + 1
+            super().save(*args, **kwargs)
+            if editing:
+                self.refresh_from_db(fields=['version'])
+            # Cada versão é guardada: as notificações já geradas continuam
+            # renderizando o corpo da versão que usaram
+            NotificationTemplateVersion.objects.create(
+                template=self, version=self.version, subject=self.subject, body=self.body
+            )
+        template_cache.invalidate(self.pk)
+    
+    def delete(self, *args, **kwargs):
+        template_id = self.pk
+        result = super().delete(*args, **kwargs)
+        template_cache.invalidate(template_id)
+        return result
+
+
+class NotificationTemplateVersion(models.Model):
+    """
+    Conteúdo de uma versão de um NotificationTemplate, gravado a cada
+    criação ou edição do template. O corpo das notificações geradas por
+    uma versão anterior é renderizado a partir daqui.
+    """
+    template = models.ForeignKey(
+        NotificationTemplate,
+        on_delete=models.CASCADE,
+        related_name='versions',
+        verbose_name='Template'
+    )
+    version = models.PositiveIntegerField(
+        verbose_name='Versão'
+    )
+    subject = models.CharField(
+        max_length=200,
+        verbose_name='Assunto'
+    )
+    body = models.TextField(
+        verbose_name='Corpo'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Data de Criação'
+    )
+    
+    class Meta:
+        verbose_name = 'Versão de Template'
+        verbose_name_plural = 'Versões de Template'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['template', 'version'],
+                name='notif_template_version_uniq'
+            )
+        ]
+    
+    def __str__(self):
+        return f"{self.template_id} v{self.version}"
+
+
+class MessageBodyManager(models.Manager):
+    """
+    Manager com as operações de armazenamento endereçado por conteúdo dos
+    corpos de mensagem.
+    """
+    
+    def prepare(self, text):
+        """
+        Monta (sem gravar) o MessageBody de um texto, comprimindo-o com zlib
+        se ele tiver pelo menos NOTIFICATIONS_BODY_COMPRESSION_THRESHOLD
+        bytes e a compressão reduzir o tamanho.
+        """
+        raw = text.encode('utf-8')
+        data, compressed = raw, False
+        threshold = settings.NOTIFICATIONS_BODY_COMPRESSION_THRESHOLD
+        if threshold and len(raw) >= threshold:
+            packed = zlib.compress(raw)
+            if len(packed) < len(raw):
+                data, compressed = packed, True
+        
+        body = self.model(
+            digest=hashlib.sha256(raw).hexdigest(),
+            data=data,
+            compressed=compressed,
+            size=len(raw)
+        )
+        body.__dict__['text'] = text
+        return body
+    
+    def intern(self, text):
+        """
+        Retorna o MessageBody do texto, criando-o se ainda não existir.
+        """
+        return self.intern_many([text])[text]
+    
+    def intern_many(self, texts):
+        """
+        Obtém ou cria os MessageBody de vários textos com uma consulta e um
+        bulk_create, independentemente da quantidade de repetições.
+        
+        Returns:
+            dict: texto -> MessageBody
+        """
+        prepared = {}
+        for text in texts:
+            if text not in prepared:
+                prepared[text] = self.prepare(text)
+        by_digest = {body.digest: body for body in prepared.values()}
+        
+        existing = self.in_bulk(list(by_digest), field_name='digest')
+        missing = [body for digest, body in by_digest.items() if digest not in existing]
+        if missing:
+            # ignore_conflicts: outra transação pode ter gravado o mesmo
+            # conteúdo entre a consulta e a inserção
+            self.bulk_create(missing, ignore_conflicts=True)
+            existing.update(self.in_bulk([body.digest for body in missing], field_name='digest'))
+        
+        result = {}
+        for text, body in prepared.items():
+            stored = existing[body.digest]
+            stored.__dict__['text'] = text
+            result[text] = stored
+        return result
+    
+    def delete_unreferenced(self, ids=None):
+        """
+        Remove os corpos que não são mais usados por nenhuma notificação
+        (opcionalmente, apenas entre os ids informados).
+        
+        Returns:
+            int: quantidade de corpos removidos
+        """
+        queryset = self.filter(notifications__isnull=True)
+        if ids is not None:
+            queryset = queryset.filter(pk__in=ids)
+        return queryset.delete()[0]
+
+
+class MessageBody(models.Model):
+    """
+    Corpo de mensagem armazenado uma única vez por conteúdo e referenciado
+    por todas as notificações que o usam, de modo que o espaço ocupado
+    cresce com a quantidade de mensagens distintas e não com o volume de
+    envios.
+    """
+    digest = models.CharField(
+        max_length=64,
+        unique=True,
+        verbose_name='Hash',
+        help_text='SHA-256 do corpo da mensagem'
+    )
+    data = models.BinaryField(
+        verbose_name='Conteúdo',
+        help_text='Corpo da mensagem em UTF-8, comprimido com zlib se compressed'
+    )
+    compressed = models.BooleanField(
+        default=False,
+        verbose_name='Comprimido'
+    )
+    size = models.PositiveIntegerField(
+        verbose_name='Tamanho',
+        help_text='Tamanho do corpo sem compressão, em bytes'
+    )
+    
+    objects = MessageBodyManager()
+    
+    class Meta:
+        verbose_name = 'Corpo de Mensagem'
+        verbose_name_plural = 'Corpos de Mensagem'
+    
+    def __str__(self):
+        return f"{self.digest[:12]} ({self.size} bytes)"
+    
+    @cached_property
+    def text(self):
+        data = bytes(self.data)
+        if self.compressed:
+            data = zlib.decompress(data)
+        return data.decode('utf-8')
@@ -0,0 +1,134 @@
+from datetime import datetime
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, PageNumberPagination
+
+
+class NotificationPageNumberPagination(PageNumberPagination):
+    """
+    Paginação por número de página (padrão). Permite escolher o tamanho da
+    página com `?page_size=`, limitado por NOTIFICATIONS_MAX_PAGE_SIZE.
+    """
+    page_size_query_param = 'page_size'
+    
+    @property
+    def max_page_size(self):
+        return settings.NOTIFICATIONS_MAX_PAGE_SIZE
+
+
+class NotificationCursorPagination(CursorPagination):
+    """
+    Paginação por cursor (keyset) sobre (created_at, id).
+    
+    O cursor guarda o created_at e o id da última notificação da página (ou
+    da primeira, para a página anterior), e a página seguinte é buscada com
+    `(created_at, id) < (cursor)` pelo índice notif_created_id_idx, sem
+    OFFSET nem COUNT(*): a página N custa o mesmo que a primeira, mesmo com
+    muitas notificações criadas no mesmo instante. A contagem total só é
+    calculada quando solicitada com `?count=true`.
+    
+    Diferente da CursorPagination do DRF, que guarda apenas o created_at e
+    usa OFFSET para desempatar os registros com o mesmo valor.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    
+    @property
+    def max_page_size(self):
+        return settings.NOTIFICATIONS_MAX_PAGE_SIZE
+    
+    @staticmethod
+    def keyset_filter(created_at, pk, reverse=False):
+        """
+        Filtro das notificações depois de (created_at, pk) na ordem da
+        listagem, ou antes dela se `reverse`. A condição só em created_at
+        delimita a faixa do índice; a segunda desempata pelo id.
+        """
+        if reverse:
+            return Q(created_at__gte=created_at) & (Q(created_at__gt=created_at) | Q(id__gt=pk))
+        return Q(created_at__lte=created_at) & (Q(created_at__lt=created_at) | Q(id__lt=pk))
+    
+    def encode_position(self, notification):
+        return f'{notification.created_at.isoformat()}|{notification.pk}'
+    
+    def decode_position(self, position):
+        try:
+            created_at, pk = position.split('|')
+            return datetime.fromisoformat(created_at), int(pk)
+        except (AttributeError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        self.include_count = request.query_params.get('count', '').lower() in ('1', 'true')
+        if self.include_count:
+            self.count = queryset.order_by().count()
+        
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.request = request
+        self.cursor = self.decode_cursor(request)
+        
+        reverse = self.cursor is not None and self.cursor.reverse
+        if self.cursor is not None:
+            queryset = queryset.filter(
+                self.keyset_filter(*self.decode_position(self.cursor.position), reverse=reverse)
+            )
+        ordering = [field.lstrip('-') for field in self.ordering] if reverse else self.ordering
+        results = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+        
+        # Quem chegou por um cursor tem notificações do outro lado dele
+        self.has_next = self.cursor is not None if reverse else has_more
+        self.has_previous = has_more if reverse else self.cursor is not None
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+    
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self.encode_position(self.page[-1])))
+    
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self.encode_position(self.page[0])))
+    
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.include_count:
+            response.data = {'count': self.count, **response.data}
+        return response
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator do admin que evita o COUNT(*) sobre a tabela inteira.
+    
+    A contagem vem de `estimate` (uma função que retorna a contagem ou
+    None) quando disponível; caso contrário, é contado no máximo
+    `max_count` linhas, e as páginas além desse limite não são listadas.
+    """
+    
+    def __init__(self, object_list, per_page, orphans=0, allow_empty_first_page=True,
+                 estimate=None, max_count=10000):
+        super().__init__(object_list, per_page, orphans, allow_empty_first_page)
+        self.estimate = estimate
+        self.max_count = max_count
+    
+    @cached_property
+    def count(self):
+        if self.estimate is not None:
+            estimate = self.estimate()
+            if estimate is not None:
+                return estimate
+        return self.object_list.order_by()[:self.max_count].count()
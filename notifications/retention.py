@@ -0,0 +1,80 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Notification
+from .serializers import NotificationSerializer
+
+
+# Status sujeitos à retenção; notificações pendentes nunca são removidas
+RETENTION_STATUSES = ['sent', 'failed']
+
+
+def retention_cutoffs(days=None, now=None):
+    """
+    Calcula, para cada status, a data de criação abaixo da qual as
+    notificações podem ser removidas.
+    
+    Args:
+        days (dict): dias de retenção por status; os ausentes vêm de
+            NOTIFICATIONS_RETENTION_SENT_DAYS e
+            NOTIFICATIONS_RETENTION_FAILED_DAYS
+        now (datetime): referência (por padrão, o momento atual)
+    
+    Returns:
+        dict: status -> datetime, apenas para os status com retenção
+            ativa (dias maior que 0)
+    """
+    now = now or timezone.now()
+    days = {
+        'sent': settings.NOTIFICATIONS_RETENTION_SENT_DAYS,
+        'failed': settings.NOTIFICATIONS_RETENTION_FAILED_DAYS,
+        **{status: value for status, value in (days or {}).items() if value is not None},
+    }
+    return {
+        status: now - timedelta(days=days[status])
+        for status in RETENTION_STATUSES
+        if days.get(status)
+    }
+
+
+def purge_batch(status, before, batch_size=1000, archive=None):
+    """
+    Remove um lote das notificações mais antigas com o status informado
+    criadas antes de `before`.
+    
+    Os ids são lidos pelo índice notif_status_created_idx e removidos em
+    uma transação curta (ver NotificationManager.delete_rows). Notificações
+    que mudaram de status entre a leitura e a remoção (por exemplo,
+    reenfileiradas) são mantidas.
+    
+    Args:
+        status (str): 'sent' ou 'failed'
+        before (datetime): data de criação limite
+        batch_size (int): tamanho máximo do lote
+        archive: arquivo de texto aberto; se informado, cada notificação do
+            lote é gravada nele como uma linha JSON antes da remoção
+    
+    Returns:
+        tuple: (selecionadas, removidas). Menos selecionadas que batch_size
+            indica que não há mais notificações a remover.
+    """
+    rows = list(
+        Notification.objects.filter(status=status, created_at__lt=before)
+        .order_by('created_at', 'id')
+        .values_list('id', 'created_at', 'status', 'message_body_id')[:batch_size]
+    )
+    if not rows:
+        return 0, 0
+    
+    if archive is not None:
+        notifications = Notification.objects.filter(id__in=[row[0] for row in rows]).select_related(
+            'template', 'message_body'
+        ).order_by('created_at', 'id')
+        for notification in notifications:
+            archive.write(json.dumps(NotificationSerializer(notification).data, ensure_ascii=False))
+            archive.write('\n')
+    
+    return len(rows), Notification.objects.delete_rows(rows)
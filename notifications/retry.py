@@ -0,0 +1,62 @@
+import random
+import smtplib
+from datetime import timedelta
+
+from django.conf import settings
+
+try:
+    import aiosmtplib
+except ImportError:  # dependência opcional, usada pelo envio assíncrono
+    aiosmtplib = None
+
+
+def is_transient_error(error):
+    """
+    Indica se um erro de envio é temporário e vale uma nova tentativa.
+    
+    São temporários as respostas SMTP 4xx (ex.: 421 serviço indisponível,
+    451 greylisting), falhas de conexão, desconexões e timeouts. Respostas
+    5xx (ex.: 550 destinatário inexistente, 535 autenticação recusada) e
+    erros desconhecidos são permanentes. Entende tanto as exceções do
+    smtplib quanto as do aiosmtplib.
+    """
+    if aiosmtplib is not None:
+        if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+            codes = [recipient.code for recipient in error.recipients]
+            return bool(codes) and all(400 <= code < 500 for code in codes)
+        if isinstance(error, aiosmtplib.SMTPResponseException):
+            return 400 <= error.code < 500
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in error.recipients.values()]
+        return bool(codes) and all(400 <= code < 500 for code in codes)
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    # ConnectionError e TimeoutError também são subclasses de OSError
+    return isinstance(error, OSError)
+
+
+def backoff_delay(attempts):
+    """
+    Calcula a espera antes da próxima tentativa, dobrando a cada tentativa
+    a partir de NOTIFICATIONS_RETRY_BASE_DELAY até
+    NOTIFICATIONS_RETRY_MAX_DELAY segundos.
+    
+    Metade da espera é aleatória, para que as notificações que falharam
+    juntas (por exemplo, durante uma queda do servidor SMTP) não voltem
+    todas ao mesmo tempo.
+    
+    Args:
+        attempts (int): número de tentativas já realizadas (a partir de 1)
+    
+    Returns:
+        timedelta: espera até a próxima tentativa
+    """
+    delay = min(
+        settings.NOTIFICATIONS_RETRY_MAX_DELAY,
+        settings.NOTIFICATIONS_RETRY_BASE_DELAY * 2 ** (attempts - 1)
+    )
+    return timedelta(seconds=delay / 2 + random.uniform(0, delay / 2))
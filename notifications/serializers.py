@@ -1,13 +1,45 @@
+from collections.abc import Mapping
+
+from django.template import TemplateSyntaxError
 from rest_framework import serializers
-from .models import Notification
+from .models import Notification, NotificationTemplate
+from .templating import ENGINE, render_template
 
 
 class NotificationSerializer(serializers.ModelSerializer):
     """
     Serializer para o modelo Notification.
     Usado para envio e listagem de notificações.
+    
+    Aceita o argumento opcional `fields` para serializar apenas um
+    subconjunto dos campos (usado pela listagem resumida).
     """
     
+    # Campos da listagem resumida: apenas metadados, sem os campos de texto
+    # longos (message e error_message)
+    LIST_FIELDS = ['id', 'recipient_email', 'subject', 'status', 'priority', 'created_at', 'sent_at']
+    
+    # O corpo é gravado em MessageBody (ver Notification.message); na
+    # leitura, as notificações geradas por template trazem o corpo renderizado
+    message = serializers.CharField(
+        source='body',
+        allow_blank=True,
+        required=False,
+        style={'base_template': 'textarea.html'}
+    )
+    
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+    
+    def to_internal_value(self, data):
+        attrs = super().to_internal_value(data)
+        if 'body' in attrs:
+            attrs['message'] = attrs.pop('body')
+        return attrs
+    
     class Meta:
         model = Notification
         fields = [
@@ -16,17 +48,68 @@ class NotificationSerializer(serializers.ModelSerializer):
             'subject',
             'message',
             'status',
+            'priority',
+            'template',
+            'template_version',
+            'context',
             'error_message',
             'created_at',
-            'sent_at'
+            'sent_at',
+            'updated_at'
+        ]
+        read_only_fields = [
+            'id', 'status', 'template_version', 'error_message', 'created_at', 'sent_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'status', 'error_message', 'created_at', 'sent_at']
+
+
+class NotificationTemplateSerializer(serializers.ModelSerializer):
+    """
+    Serializer para o modelo NotificationTemplate. Valida a sintaxe dos
+    templates do assunto e do corpo.
+    """
+    
+    class Meta:
+        model = NotificationTemplate
+        fields = ['id', 'name', 'subject', 'body', 'version', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'version', 'created_at', 'updated_at']
+    
+    def validate_template_source(self, value):
+        try:
+            ENGINE.from_string(value)
+        except TemplateSyntaxError as e:
+            raise serializers.ValidationError(f"Template inválido: {e}")
+        return value
+    
+    def validate_subject(self, value):
+        return self.validate_template_source(value)
+    
+    def validate_body(self, value):
+        return self.validate_template_source(value)
+
+
+class TemplateIdField(serializers.PrimaryKeyRelatedField):
+    """
+    Referência a um NotificationTemplate pelo id. Cada template é buscado uma
+    única vez por requisição, mesmo quando vários itens de um lote o usam.
+    """
+    
+    def to_internal_value(self, data):
+        if not isinstance(data, (str, int)):
+            return super().to_internal_value(data)
+        templates = self.context.setdefault('templates', {})
+        if data not in templates:
+            templates[data] = super().to_internal_value(data)
+        return templates[data]
 
 
 class SendNotificationSerializer(serializers.Serializer):
     """
     Serializer específico para o endpoint de envio de notificações.
     Valida os dados de entrada antes do envio.
+    
+    O conteúdo vem de `subject` e `message` ou de um template (`template_id`
+    e `context`); neste caso o template é renderizado na validação e
+    `subject`/`message` passam a conter o resultado.
     """
     recipient_email = serializers.EmailField(
         help_text='Email do destinatário',
@@ -35,11 +118,26 @@ class SendNotificationSerializer(serializers.Serializer):
     subject = serializers.CharField(
         max_length=200,
         help_text='Assunto do email',
-        required=True
+        required=False
     )
     message = serializers.CharField(
         help_text='Corpo da mensagem do email',
-        required=True
+        required=False
+    )
+    template_id = TemplateIdField(
+        queryset=NotificationTemplate.objects.all(),
+        source='template',
+        required=False,
+        help_text='Template usado no lugar de subject e message'
+    )
+    context = serializers.DictField(
+        required=False,
+        help_text='Variáveis para renderizar o template'
+    )
+    priority = serializers.ChoiceField(
+        choices=Notification.PRIORITY_CHOICES,
+        default='normal',
+        help_text='Faixa da fila de entrega: high, normal ou low'
     )
     
     def validate_recipient_email(self, value):
@@ -65,3 +163,123 @@ class SendNotificationSerializer(serializers.Serializer):
         if not value.strip():
             raise serializers.ValidationError("A mensagem não pode estar vazia.")
         return value.strip()
+    
+    def to_internal_value(self, data):
+        # subject e message só são obrigatórios sem template; os erros de
+        # ausência são reportados junto com os dos demais campos
+        missing = {}
+        if isinstance(data, Mapping) and data.get('template_id') in (None, ''):
+            missing = {
+                name: [self.fields[name].error_messages['required']]
+                for name in ('subject', 'message') if name not in data
+            }
+        try:
+            attrs = super().to_internal_value(data)
+        except serializers.ValidationError as exc:
+            raise serializers.ValidationError({**missing, **exc.detail})
+        if missing:
+            raise serializers.ValidationError(missing)
+        return attrs
+    
+    def validate(self, attrs):
+        """
+        Renderiza o template, quando informado, no lugar de subject/message.
+        """
+        template = attrs.get('template')
+        if template is None:
+            attrs.pop('context', None)
+            return attrs
+        
+        if 'subject' in attrs or 'message' in attrs:
+            raise serializers.ValidationError({
+                'template_id': ['Informe template_id ou subject/message, não ambos.']
+            })
+        
+        try:
+            subject, message = render_template(template, attrs.get('context'))
+        except TemplateSyntaxError as e:
+            raise serializers.ValidationError({'template_id': [f"Template inválido: {e}"]})
+        
+        errors = {}
+        if not subject:
+            errors['subject'] = ['O assunto renderizado está vazio.']
+        elif len(subject) > 200:
+            errors['subject'] = ['O assunto renderizado excede 200 caracteres.']
+        if not message:
+            errors['message'] = ['A mensagem renderizada está vazia.']
+        if errors:
+            raise serializers.ValidationError(errors)
+        
+        attrs.update(subject=subject, message=message, context=attrs.get('context') or {})
+        return attrs
+
+
+class BulkActionSerializer(serializers.Serializer):
+    """
+    Serializer das ações em conjunto (bulk-delete e bulk-requeue): seleciona
+    as notificações por uma lista de ids e/ou pelos filtros informados.
+    Ao menos um critério é obrigatório, para que uma requisição vazia não
+    alcance a tabela inteira.
+    """
+    MAX_IDS = 10000
+    
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_IDS,
+        required=False,
+        help_text='Ids das notificações'
+    )
+    status = serializers.ChoiceField(
+        choices=Notification.STATUS_CHOICES,
+        required=False,
+        help_text='Apenas notificações com este status'
+    )
+    recipient_email = serializers.EmailField(
+        required=False,
+        help_text='Apenas notificações deste destinatário'
+    )
+    since = serializers.DateTimeField(
+        input_formats=['iso-8601', '%Y-%m-%d'],
+        required=False,
+        help_text='Apenas notificações criadas a partir desta data'
+    )
+    until = serializers.DateTimeField(
+        input_formats=['iso-8601', '%Y-%m-%d'],
+        required=False,
+        help_text='Apenas notificações criadas antes desta data'
+    )
+    
+    LOOKUPS = {
+        'ids': 'id__in',
+        'status': 'status',
+        'recipient_email': 'recipient_email',
+        'since': 'created_at__gte',
+        'until': 'created_at__lt',
+    }
+    
+    def validate_recipient_email(self, value):
+        return value.lower()
+    
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError(
+                f"Informe ao menos um critério: {', '.join(self.fields)}."
+            )
+        return attrs
+    
+    def filter_queryset(self, queryset):
+        """
+        Aplica os critérios validados ao queryset.
+        """
+        return queryset.filter(**{
+            self.LOOKUPS[name]: value for name, value in self.validated_data.items()
+        })
+
+
+class BulkRequeueSerializer(BulkActionSerializer):
+    """
+    Serializer do bulk-requeue: apenas notificações com falha são
+    reenfileiradas, então o filtro por status não se aplica.
+    """
+    status = None
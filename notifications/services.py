@@ -1,7 +1,20 @@
-from django.core.mail import send_mail
+from asgiref.sync import sync_to_async
+from django.core.mail import EmailMessage
 from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Q
 from django.utils import timezone
-from .models import Notification
+from .async_smtp import asend_message
+from .caching import invalidate_responses
+from .events import get_broker, notification_event, publish_notifications
+from .metrics import record_outcome, timed
+from .models import MessageBody, Notification, NotificationCounter
+from .retry import backoff_delay, is_transient_error
+from .smtp_pool import get_pool
+from .throttling import DomainThrottled, get_throttle, recipient_domain
+from collections import Counter
+from contextlib import nullcontext
+from datetime import timedelta
 import logging
 
 logger = logging.getLogger(__name__)
@@ -12,68 +25,705 @@ class EmailService:
     Serviço responsável pelo envio de emails.
     """
     
+    # Número de tentativas de reservar o conteúdo antes de desistir. Só é
+    # necessário repetir quando a notificação concorrente que causou o
+    # conflito deixou de estar reservada (por exemplo, falhou) entre o
+    # INSERT e a releitura.
+    CLAIM_ATTEMPTS = 3
+    
     @staticmethod
-    def send_notification(recipient_email, subject, message):
+    def claim_notification(recipient_email, subject, message, lock=False, priority='normal',
+                           template=None, context=None):
         """
-        Envia uma notificação por email e registra no banco de dados.
-        Verifica se já existe uma notificação idêntica enviada com sucesso
-        para evitar duplicatas.
+        Reserva de forma atômica o envio de um conteúdo.
+        
+        A reserva é o próprio INSERT da notificação pendente: a restrição
+        única parcial notif_claimed_content_hash_uniq impede que duas
+        notificações pendentes/enviadas com o mesmo conteúdo coexistam.
+        Quem perde a corrida recebe a notificação já existente, sem que os
+        envios de conteúdos diferentes precisem ser serializados.
         
         Args:
             recipient_email (str): Email do destinatário
             subject (str): Assunto do email
             message (str): Corpo da mensagem
+            lock (bool): Se True, a notificação criada já nasce reservada
+                para o chamador, e os workers de entrega só a consideram
+                depois de NOTIFICATIONS_DELIVERY_LEASE_SECONDS
+            priority (str): faixa da fila de entrega ('high', 'normal' ou 'low')
+            template (NotificationTemplate): template que gerou subject e
+                message; nesse caso a notificação guarda o template e o
+                contexto em vez do corpo renderizado
+            context (dict): contexto usado para renderizar o template
+        
+        Returns:
+            tuple: (notification_instance, created)
+        """
+        content_hash = Notification.compute_content_hash(recipient_email, subject, message)
+        message_body = None
+        
+        for _ in range(EmailService.CLAIM_ATTEMPTS):
+            # Caminho rápido: busca pontual pelo hash no índice único parcial
+            with timed('dedup'):
+                existing_notification = Notification.objects.filter(
+                    content_hash=content_hash,
+                    status__in=Notification.CLAIMED_STATUSES
+                ).select_related('message_body').first()
+            
+            if existing_notification:
+                return existing_notification, False
             
+            if message_body is None and message and not template:
+                # Fora da transação do INSERT: no SQLite, uma transação que
+                # começa com leitura não consegue passar a escrever se outra
+                # estiver gravando ao mesmo tempo
+                with timed('body'):
+                    message_body = MessageBody.objects.intern(message)
+            
+            try:
+                with timed('insert'), transaction.atomic():
+                    notification = Notification.objects.create(
+                        recipient_email=recipient_email,
+                        subject=subject,
+                        message_body=message_body,
+                        template=template,
+                        context=context,
+                        content_hash=content_hash,
+                        status='pending',
+                        priority=priority,
+                        next_attempt_at=EmailService.lease_until() if lock else timezone.now()
+                    )
+                # Corpo já renderizado, evita renderizar o template de novo
+                notification.body = message
+                return notification, True
+            except IntegrityError:
+                # Outro processo reservou o mesmo conteúdo entre a busca e o
+                # INSERT; a próxima iteração retorna a notificação vencedora.
+                # O corpo é obtido de novo, caso tenha sido removido por uma
+                # limpeza do histórico nesse intervalo.
+                message_body = None
+                continue
+        
+        raise IntegrityError(
+            f"Não foi possível reservar a notificação para {recipient_email}"
+        )
+    
+    @staticmethod
+    async def aclaim_notification(recipient_email, subject, message, lock=False, priority='normal',
+                                  template=None, context=None):
+        """
+        Versão assíncrona de claim_notification, com o ORM assíncrono.
+        
         Returns:
-            tuple: (success, notification_instance, error_message)
+            tuple: (notification_instance, created)
         """
-        # Verifica se já existe uma notificação idêntica enviada com sucesso
-        existing_notification = Notification.objects.filter(
-            recipient_email=recipient_email,
-            subject=subject,
-            message=message,
-            status='sent'
-        ).first()
+        content_hash = Notification.compute_content_hash(recipient_email, subject, message)
+        message_body = None
         
-        if existing_notification:
+        for _ in range(EmailService.CLAIM_ATTEMPTS):
+            with timed('dedup'):
+                existing_notification = await Notification.objects.filter(
+                    content_hash=content_hash,
+                    status__in=Notification.CLAIMED_STATUSES
+                ).select_related('message_body').afirst()
+            
+            if existing_notification:
+                return existing_notification, False
+            
+            if message_body is None and message and not template:
+                with timed('body'):
+                    message_body = await sync_to_async(MessageBody.objects.intern)(message)
+            
+            try:
+                # save() grava a notificação e os contadores em uma transação
+                with timed('insert'):
+                    notification = await Notification.objects.acreate(
+                        recipient_email=recipient_email,
+                        subject=subject,
+                        message_body=message_body,
+                        template=template,
+                        context=context,
+                        content_hash=content_hash,
+                        status='pending',
+                        priority=priority,
+                        next_attempt_at=EmailService.lease_until() if lock else timezone.now()
+                    )
+                notification.body = message
+                return notification, True
+            except IntegrityError:
+                message_body = None
+                continue
+        
+        raise IntegrityError(
+            f"Não foi possível reservar a notificação para {recipient_email}"
+        )
+    
+    @staticmethod
+    def enqueue_notification(recipient_email, subject, message, priority='normal',
+                             template=None, context=None):
+        """
+        Registra uma notificação pendente para ser entregue pelos workers
+        de `manage.py deliver_notifications`, sem contatar o servidor SMTP.
+        
+        Returns:
+            tuple: (notification_instance, created)
+        """
+        notification, created = EmailService.claim_notification(
+            recipient_email, subject, message, priority=priority,
+            template=template, context=context
+        )
+        
+        if created:
+            record_outcome(recipient_email, 'queued')
+            logger.info(f"Notificação {notification.id} enfileirada para {recipient_email}")
+        else:
+            record_outcome(recipient_email, 'duplicate')
             logger.info(
                 f"Notificação duplicada detectada para {recipient_email}. "
-                f"Retornando notificação existente (ID: {existing_notification.id})"
+                f"Retornando notificação existente (ID: {notification.id})"
             )
-            return True, existing_notification, None
-        
-        # Cria o registro da notificação no banco
-        notification = Notification.objects.create(
-            recipient_email=recipient_email,
-            subject=subject,
-            message=message,
-            status='pending'
+        return notification, created
+    
+    @staticmethod
+    def lease_until(now=None):
+        """
+        Retorna até quando uma notificação reservada agora fica fora da
+        fila. Se o envio não terminar nesse prazo (por exemplo, porque o
+        worker morreu), a notificação volta a ser entregue.
+        """
+        now = now or timezone.now()
+        return now + timedelta(seconds=settings.NOTIFICATIONS_DELIVERY_LEASE_SECONDS)
+    
+    @staticmethod
+    def available_pending(now, priority):
+        """
+        Retorna as notificações pendentes da faixa `priority` cuja próxima
+        tentativa já venceu: novas, com nova tentativa agendada para antes de
+        `now` ou com a reserva de um worker expirada.
+        """
+        return Notification.objects.filter(
+            status='pending', priority=priority, next_attempt_at__lte=now
         )
+    
+    @staticmethod
+    def lane_quotas(batch_size):
+        """
+        Divide `batch_size` entre as faixas de prioridade conforme
+        NOTIFICATIONS_PRIORITY_WEIGHTS. Toda faixa com peso positivo recebe
+        ao menos uma vaga por lote.
+        """
+        weights = {
+            lane: settings.NOTIFICATIONS_PRIORITY_WEIGHTS.get(lane, 0)
+            for lane in Notification.PRIORITY_LANES
+        }
+        total = sum(weights.values()) or 1
+        return {
+            lane: max(1, round(batch_size * weight / total)) if weight > 0 else 0
+            for lane, weight in weights.items()
+        }
+    
+    @staticmethod
+    def claim_lanes(now, lease_until, limits):
+        """
+        Reserva, com um único UPDATE, até `limits[lane]` notificações
+        disponíveis de cada faixa, adiando next_attempt_at para
+        `lease_until`.
         
-        try:
-            # Tenta enviar o email
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[recipient_email],
-                fail_silently=False,
-            )
+        Cada faixa entra no WHERE como um id IN (subconsulta) com a sua
+        cota. A condição de disponibilidade fica só nas subconsultas, que
+        fazem parte do mesmo comando: no SQLite, que serializa as escritas,
+        nenhuma outra reserva acontece entre elas e o UPDATE; nos bancos com
+        SELECT ... FOR UPDATE SKIP LOCKED (PostgreSQL, Oracle), elas pulam as
+        linhas que outro worker está reservando e reavaliam a condição das
+        que ele acabou de reservar. Repetir a condição no UPDATE levaria o
+        SQLite a percorrer todas as pendentes em vez de buscar as
+        candidatas pela chave primária. Nesses bancos deve ser chamado
+        dentro de uma transação, como em claim_pending.
+        
+        Returns:
+            int: número de notificações reservadas
+        """
+        skip_locked = connection.features.has_select_for_update_skip_locked
+        condition = Q()
+        for lane, limit in limits.items():
+            if limit <= 0:
+                continue
+            candidates = EmailService.available_pending(now, lane).order_by('next_attempt_at').values('id')
+            if skip_locked:
+                candidates = candidates.select_for_update(skip_locked=True)
+            condition |= Q(id__in=candidates[:limit])
+        if not condition:
+            return 0
+        return Notification.objects.filter(condition).update(next_attempt_at=lease_until)
+    
+    @staticmethod
+    def claim_pending(batch_size):
+        """
+        Reserva até `batch_size` notificações pendentes para um worker.
+        
+        Cada faixa de prioridade tem uma cota do lote proporcional ao seu
+        peso (ver lane_quotas), de modo que uma campanha volumosa em uma
+        faixa baixa não atrasa as notificações urgentes e, ao mesmo tempo,
+        as faixas baixas continuam andando enquanto houver urgentes. A
+        capacidade não usada por uma faixa vai para as demais, da mais para
+        a menos prioritária.
+        
+        As cotas de todas as faixas são reservadas de uma vez (ver
+        claim_lanes) e as notificações reservadas são relidas pelo prazo da
+        reserva, como em bulk_requeue: com a fila cheia, o lote custa um
+        UPDATE e um SELECT. Só quando alguma faixa não preencheu a sua cota
+        as que preencheram são consultadas de novo, uma a uma, para ocupar
+        o restante do lote.
+        
+        Returns:
+            list: notificações reservadas, da faixa mais prioritária para a
+                menos prioritária e, em cada faixa, em ordem de criação
+        """
+        now = timezone.now()
+        lease_until = EmailService.lease_until(now)
+        quotas = EmailService.lane_quotas(batch_size)
+        # Com a lista de faixas e sem ordenação, a releitura usa o índice da fila
+        claimed = Notification.objects.filter(
+            status='pending', priority__in=Notification.PRIORITY_LANES, next_attempt_at=lease_until
+        ).order_by().select_related('template', 'message_body')
+        
+        limits = {}
+        for lane in Notification.PRIORITY_LANES:
+            limits[lane] = min(quotas[lane], batch_size - sum(limits.values()))
+        
+        # FOR UPDATE exige uma transação
+        skip_locked = connection.features.has_select_for_update_skip_locked
+        with transaction.atomic() if skip_locked else nullcontext():
+            EmailService.claim_lanes(now, lease_until, limits)
+            notifications = list(claimed.all())
             
-            # Atualiza o status da notificação para 'sent'
+            # Faixas que preencheram a cota podem ter mais notificações
+            # disponíveis para o restante do lote
+            counts = Counter(notification.priority for notification in notifications)
+            remaining = batch_size - len(notifications)
+            refill = [lane for lane in Notification.PRIORITY_LANES if counts[lane] >= limits[lane]]
+            if remaining > 0 and refill:
+                for lane in refill:
+                    if remaining > 0:
+                        remaining -= EmailService.claim_lanes(now, lease_until, {lane: remaining})
+                if remaining < batch_size - len(notifications):
+                    notifications = list(claimed.all())
+        
+        rank = {lane: index for index, lane in enumerate(Notification.PRIORITY_LANES)}
+        return sorted(
+            notifications,
+            key=lambda notification: (rank[notification.priority], notification.created_at)
+        )
+    
+    @staticmethod
+    def record_attempt(notification, error=None, now=None, retry=True):
+        """
+        Atualiza (sem salvar) a notificação com o resultado de uma tentativa.
+        
+        Em caso de sucesso a notificação passa para 'sent'. Em caso de erro
+        temporário, e enquanto não atingir NOTIFICATIONS_MAX_ATTEMPTS, ela
+        continua 'pending' com uma nova tentativa agendada com backoff
+        exponencial; caso contrário, passa para 'failed'. Com retry=False
+        (ver workers_available), todo erro resulta em 'failed'.
+        """
+        now = now or timezone.now()
+        notification.attempts += 1
+        notification.updated_at = now
+        
+        if error is None:
             notification.status = 'sent'
-            notification.sent_at = timezone.now()
+            notification.sent_at = now
+            notification.next_attempt_at = None
+            return
+        
+        notification.error_message = str(error)
+        if retry and is_transient_error(error) and notification.attempts < settings.NOTIFICATIONS_MAX_ATTEMPTS:
+            notification.next_attempt_at = now + backoff_delay(notification.attempts)
+        else:
+            notification.status = 'failed'
+            notification.next_attempt_at = None
+    
+    @staticmethod
+    def workers_available():
+        """
+        Indica se há workers de deliver_notifications para repetir os envios
+        síncronos adiados (NOTIFICATIONS_DELIVERY_WORKERS).
+        
+        Sem eles, uma notificação com nova tentativa agendada ficaria
+        pendente para sempre, reservando o conteúdo: os envios idênticos
+        seguintes seriam tratados como duplicatas. Por isso, nos envios
+        síncronos sem workers, erros temporários e o limite do domínio
+        resultam em 'failed', e o cliente pode enviar de novo.
+        """
+        return settings.NOTIFICATIONS_DELIVERY_WORKERS
+    
+    @staticmethod
+    def defer(notification, retry_after, now=None):
+        """
+        Adia (sem salvar) o envio de uma notificação que excedeu o limite do
+        domínio do destinatário. Não conta como tentativa.
+        """
+        now = now or timezone.now()
+        notification.next_attempt_at = now + timedelta(seconds=retry_after)
+        notification.updated_at = now
+    
+    @staticmethod
+    def build_message(notification):
+        """
+        Monta a EmailMessage de uma notificação.
+        """
+        return EmailMessage(
+            subject=notification.subject,
+            body=notification.body,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[notification.recipient_email],
+        )
+    
+    @staticmethod
+    def finish_delivery(notification, error=None, retry=True):
+        """
+        Atualiza (sem salvar) a notificação com o resultado de um envio de
+        deliver/adeliver e registra o log correspondente. Com retry=False,
+        a notificação não fica pendente (ver record_attempt).
+        
+        Returns:
+            tuple: (success, error_message)
+        """
+        if error is None:
+            # Atualiza o status da notificação para 'sent'
+            EmailService.record_attempt(notification)
+            record_outcome(notification.recipient_email, 'sent')
+            logger.info(f"Email enviado com sucesso para {notification.recipient_email}")
+            return True, None
+        
+        if isinstance(error, DomainThrottled) and retry:
+            # Acima do limite do domínio: adia sem contar como tentativa
+            EmailService.defer(notification, error.retry_after)
+            record_outcome(notification.recipient_email, 'deferred')
+            logger.info(f"Envio da notificação {notification.id} adiado: {error}")
+            return False, str(error)
+        
+        # Em caso de erro, agenda nova tentativa ou marca como 'failed'
+        EmailService.record_attempt(notification, error, retry=retry)
+        error_message = notification.error_message
+        record_outcome(notification.recipient_email, 'retry' if notification.status == 'pending' else 'failed')
+        if notification.status == 'pending':
+            logger.warning(
+                f"Erro temporário ao enviar email para {notification.recipient_email} "
+                f"(tentativa {notification.attempts}): {error_message}. "
+                f"Nova tentativa em {notification.next_attempt_at.isoformat()}"
+            )
+        else:
+            logger.error(f"Erro ao enviar email para {notification.recipient_email}: {error_message}")
+        return False, error_message
+    
+    @staticmethod
+    def deliver(notification, retry=True):
+        """
+        Envia o email de uma notificação pendente já reservada e atualiza
+        seu status para 'sent' ou 'failed', ou agenda uma nova tentativa se
+        o erro for temporário. O envio usa o pool de conexões SMTP do
+        processo, evitando um novo handshake a cada mensagem.
+        
+        Se o domínio do destinatário estiver acima do limite de taxa ou de
+        conexões simultâneas (ver notifications/throttling.py), a
+        notificação continua pendente e é adiada, sem contar como tentativa.
+        
+        Os clientes que aguardam a notificação (ver notifications/events.py)
+        recebem o novo estado após o commit.
+        
+        Args:
+            notification (Notification): notificação pendente reservada
+            retry (bool): se False, erros temporários e o limite do domínio
+                resultam em 'failed' (ver workers_available)
+        
+        Returns:
+            tuple: (success, error_message)
+        """
+        error = None
+        try:
+            # Tenta enviar o email por uma conexão reutilizada do pool
+            with get_throttle().slot(notification.recipient_email):
+                get_pool().send(EmailService.build_message(notification))
+        except Exception as e:
+            error = e
+        
+        result = EmailService.finish_delivery(notification, error, retry)
+        with timed('update'):
             notification.save()
+        publish_notifications([notification])
+        return result
+    
+    @staticmethod
+    async def adeliver(notification, retry=True):
+        """
+        Versão assíncrona de deliver: o envio usa o cliente SMTP não
+        bloqueante (ver notifications/async_smtp.py) e a notificação é salva
+        com o ORM assíncrono.
+        
+        Returns:
+            tuple: (success, error_message)
+        """
+        error = None
+        try:
+            with get_throttle().slot(notification.recipient_email):
+                await asend_message(EmailService.build_message(notification))
+        except Exception as e:
+            error = e
+        
+        result = EmailService.finish_delivery(notification, error, retry)
+        with timed('update'):
+            await notification.asave()
+        broker = get_broker()
+        if broker.has_subscribers():
+            broker.publish([notification_event(notification)])
+        return result
+    
+    @staticmethod
+    def send_batch(items, deliver=True):
+        """
+        Registra e envia um lote de notificações com operações em conjunto.
+        
+        A deduplicação é feita com uma única consulta pelos hashes do lote
+        (inclusive entre itens repetidos dentro do próprio lote), as novas
+        notificações são inseridas com um único bulk_create e os emails são
+        enviados por uma mesma conexão do pool. Se o bulk_create conflitar
+        com um envio concorrente, o lote volta para a reserva item a item.
+        As mensagens para domínios acima do limite de envio são adiadas.
+        
+        Args:
+            items (list): dicionários com recipient_email, subject, message e,
+                opcionalmente, priority, template e context (ver
+                claim_notification)
+            deliver (bool): se False, apenas enfileira as novas notificações
+                para os workers de entrega
+        
+        Returns:
+            list: para cada item, um dicionário com 'notification',
+                'duplicate' (bool) e 'error' (str ou None)
+        """
+        hashes = [
+            Notification.compute_content_hash(
+                item['recipient_email'], item['subject'], item['message']
+            )
+            for item in items
+        ]
+        
+        with timed('dedup'):
+            claimed = {
+                notification.content_hash: notification
+                for notification in Notification.objects.filter(
+                    content_hash__in=set(hashes),
+                    status__in=Notification.CLAIMED_STATUSES
+                )
+            }
+        
+        now = timezone.now()
+        new_notifications = {}
+        for item, content_hash in zip(items, hashes):
+            if content_hash not in claimed and content_hash not in new_notifications:
+                new_notifications[content_hash] = notification = Notification(
+                    recipient_email=item['recipient_email'],
+                    subject=item['subject'],
+                    message='' if item.get('template') else item['message'],
+                    template=item.get('template'),
+                    # bulk_create não passa por save(), que preenche a versão
+                    template_version=item['template'].version if item.get('template') else None,
+                    context=item.get('context'),
+                    content_hash=content_hash,
+                    status='pending',
+                    priority=item.get('priority', 'normal'),
+                    next_attempt_at=EmailService.lease_until(now) if deliver else now
+                )
+                notification.body = item['message']
+        
+        created = []
+        if new_notifications:
+            try:
+                # Cada corpo distinto do lote é gravado uma única vez, fora
+                # da transação do INSERT (ver claim_notification)
+                with timed('body'):
+                    Notification.objects.intern_bodies(new_notifications.values())
+                with timed('insert'), transaction.atomic():
+                    created = Notification.objects.bulk_create(new_notifications.values())
+                    NotificationCounter.objects.record_transitions(
+                        (notification.created_at, None, 'pending') for notification in created
+                    )
+                    invalidate_responses()
+                if any(notification.pk is None for notification in created):
+                    # Bancos sem suporte a RETURNING no INSERT em lote
+                    created = list(Notification.objects.filter(
+                        content_hash__in=new_notifications.keys(), status='pending'
+                    ).select_related('template', 'message_body'))
+            except IntegrityError:
+                created = []
+                for content_hash, notification in new_notifications.items():
+                    notification, was_created = EmailService.claim_notification(
+                        notification.recipient_email,
+                        notification.subject,
+                        notification.body,
+                        lock=deliver,
+                        priority=notification.priority,
+                        template=notification.template,
+                        context=notification.context
+                    )
+                    if was_created:
+                        created.append(notification)
+                    else:
+                        claimed[content_hash] = notification
+        
+        created_ids = {notification.pk for notification in created}
+        claimed.update((notification.content_hash, notification) for notification in created)
+        
+        errors = {}
+        if deliver and created:
+            # O lote ocupa uma conexão por domínio e consome uma ficha por
+            # mensagem; esgotadas as fichas, o restante do domínio é adiado.
+            throttle = get_throttle()
+            acquired = set()
+            throttled = {}
+            sendable = []
+            deferred = []
+            for notification in created:
+                domain = recipient_domain(notification.recipient_email)
+                if domain not in throttled:
+                    retry_after = throttle.take(domain) if domain in acquired else throttle.acquire(domain)
+                    if retry_after:
+                        throttled[domain] = DomainThrottled(domain, retry_after)
+                    else:
+                        acquired.add(domain)
+                        sendable.append(notification)
+                        continue
+                deferred.append((notification, throttled[domain]))
             
-            logger.info(f"Email enviado com sucesso para {recipient_email}")
-            return True, notification, None
+            try:
+                send_errors = get_pool().send_each([
+                    EmailService.build_message(notification) for notification in sendable
+                ])
+            except Exception as e:
+                # Como em deliver(), qualquer falha conta como tentativa de
+                # cada mensagem do lote, em vez de deixá-las reservadas
+                send_errors = [e] * len(sendable)
+            finally:
+                for domain in acquired:
+                    throttle.release(domain)
             
-        except Exception as e:
-            # Em caso de erro, atualiza o status para 'failed'
-            error_message = str(e)
-            notification.status = 'failed'
-            notification.error_message = error_message
-            notification.save()
+            attempted_at = timezone.now()
+            retry = EmailService.workers_available()
+            for notification, error in zip(sendable, send_errors):
+                EmailService.record_attempt(notification, error, attempted_at, retry)
+                if error is not None:
+                    errors[notification.pk] = notification.error_message
+                    record_outcome(
+                        notification.recipient_email, 'retry' if notification.status == 'pending' else 'failed'
+                    )
+                else:
+                    record_outcome(notification.recipient_email, 'sent')
+            for notification, throttled_error in deferred:
+                if retry:
+                    EmailService.defer(notification, throttled_error.retry_after, attempted_at)
+                    record_outcome(notification.recipient_email, 'deferred')
+                else:
+                    EmailService.record_attempt(notification, throttled_error, attempted_at, retry)
+                    record_outcome(notification.recipient_email, 'failed')
+                errors[notification.pk] = str(throttled_error)
             
-            logger.error(f"Erro ao enviar email para {recipient_email}: {error_message}")
-            return False, notification, error_message
+            with timed('update'), transaction.atomic():
+                Notification.objects.bulk_update(
+                    created,
+                    ['status', 'sent_at', 'error_message', 'attempts', 'next_attempt_at', 'updated_at']
+                )
+                NotificationCounter.objects.record_transitions(
+                    (notification.created_at, 'pending', notification.status)
+                    for notification in created
+                )
+                invalidate_responses()
+            publish_notifications(created)
+            postponed = sum(1 for notification in created if notification.status == 'pending')
+            logger.info(
+                f"Lote enviado: {len(created) - len(errors)} email(s) enviado(s), "
+                f"{len(errors) - postponed} falha(s), {postponed} adiado(s)"
+            )
+        
+        results = []
+        seen = set()
+        for content_hash in hashes:
+            notification = claimed[content_hash]
+            duplicate = notification.pk not in created_ids or notification.pk in seen
+            if duplicate:
+                record_outcome(notification.recipient_email, 'duplicate')
+            elif not deliver:
+                record_outcome(notification.recipient_email, 'queued')
+            results.append({
+                'notification': notification,
+                'duplicate': duplicate,
+                'error': errors.get(notification.pk) if notification.pk not in seen else None,
+            })
+            seen.add(notification.pk)
+        return results
+    
+    @staticmethod
+    def send_notification(recipient_email, subject, message, priority='normal',
+                          template=None, context=None):
+        """
+        Envia uma notificação por email e registra no banco de dados.
+        Verifica se já existe uma notificação idêntica enviada com sucesso
+        ou em envio para evitar duplicatas.
+        
+        Args:
+            recipient_email (str): Email do destinatário
+            subject (str): Assunto do email
+            message (str): Corpo da mensagem
+            priority (str): faixa da fila usada se o envio precisar ser
+                repetido pelos workers
+            template (NotificationTemplate): template que gerou subject e
+                message (ver claim_notification)
+            context (dict): contexto usado para renderizar o template
+        
+        Returns:
+            tuple: (success, notification_instance, error_message). Para uma
+                duplicata, success indica se ela já foi enviada.
+        """
+        notification, created = EmailService.claim_notification(
+            recipient_email, subject, message, lock=True, priority=priority,
+            template=template, context=context
+        )
+        
+        if not created:
+            record_outcome(recipient_email, 'duplicate')
+            logger.info(
+                f"Notificação duplicada detectada para {recipient_email}. "
+                f"Retornando notificação existente (ID: {notification.id})"
+            )
+            # Uma duplicata ainda pendente não foi enviada
+            return notification.status == 'sent', notification, None
+        
+        success, error_message = EmailService.deliver(notification, EmailService.workers_available())
+        return success, notification, error_message
+    
+    @staticmethod
+    async def asend_notification(recipient_email, subject, message, priority='normal',
+                                 template=None, context=None):
+        """
+        Versão assíncrona de send_notification, para views ASGI: enquanto a
+        conversa SMTP acontece, o event loop continua atendendo outras
+        requisições, em vez de uma thread ficar bloqueada por envio.
+        
+        Returns:
+            tuple: (success, notification_instance, error_message)
+        """
+        notification, created = await EmailService.aclaim_notification(
+            recipient_email, subject, message, lock=True, priority=priority,
+            template=template, context=context
+        )
+        
+        if not created:
+            record_outcome(recipient_email, 'duplicate')
+            logger.info(
+                f"Notificação duplicada detectada para {recipient_email}. "
+                f"Retornando notificação existente (ID: {notification.id})"
+            )
+            return notification.status == 'sent', notification, None
+        
+        success, error_message = await EmailService.adeliver(notification, EmailService.workers_available())
+        return success, notification, error_message
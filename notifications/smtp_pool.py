@@ -0,0 +1,255 @@
+import logging
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .metrics import timed
+
+logger = logging.getLogger(__name__)
+
+
+# Erros que indicam que a conexão caiu durante o envio. A conexão é
+# descartada e a mensagem é enviada de novo em uma conexão nova, uma única
+# vez. O reenvio pode duplicar a entrega: o servidor pode ter aceitado o
+# DATA antes de a conexão cair, sem que a resposta chegasse ao cliente.
+RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError)
+
+
+class PooledConnection:
+    """
+    Conexão de email mantida aberta pelo pool, com os dados necessários para
+    decidir quando ela deve ser reciclada.
+    """
+    
+    def __init__(self, backend):
+        self.backend = backend
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+    
+    def idle_for(self):
+        return time.monotonic() - self.last_used
+
+
+class SMTPConnectionPool:
+    """
+    Pool de conexões SMTP autenticadas reutilizadas entre envios.
+    
+    Cada conexão é aberta uma única vez (conexão TCP, STARTTLS e
+    autenticação) e devolvida ao pool após o envio, até atingir
+    `max_messages` mensagens ou ficar ociosa por mais de `idle_timeout`
+    segundos. No máximo `size` conexões ficam abertas ao mesmo tempo;
+    threads adicionais aguardam uma conexão ser liberada.
+    
+    As conexões são criadas por `connection_factory`, que por padrão usa
+    `django.core.mail.get_connection()` e, portanto, respeita EMAIL_BACKEND.
+    """
+    
+    def __init__(self, size=4, idle_timeout=60, max_messages=100, connection_factory=None):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.max_messages = max_messages
+        self.connection_factory = connection_factory or (
+            lambda: get_connection(fail_silently=False)
+        )
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self.connections_opened = 0
+    
+    def _open(self):
+        backend = self.connection_factory()
+        # open() do backend SMTP do Django faz a conexão, o STARTTLS e a
+        # autenticação
+        with timed('smtp_connect'):
+            backend.open()
+        with self._lock:
+            self.connections_opened += 1
+        return PooledConnection(backend)
+    
+    def _discard(self, pooled):
+        try:
+            pooled.backend.close()
+        except Exception as e:
+            logger.warning(f"Erro ao fechar conexão SMTP descartada: {e}")
+    
+    def _checkout(self):
+        self._slots.acquire()
+        try:
+            while True:
+                with self._lock:
+                    pooled = self._idle.pop() if self._idle else None
+                if pooled is None:
+                    return self._open()
+                if pooled.idle_for() <= self.idle_timeout:
+                    return pooled
+                # Conexão ociosa demais: o servidor provavelmente já a fechou
+                self._discard(pooled)
+        except BaseException:
+            self._slots.release()
+            raise
+    
+    def _checkin(self, pooled, reusable=True):
+        try:
+            if reusable and pooled.messages_sent < self.max_messages:
+                pooled.last_used = time.monotonic()
+                with self._lock:
+                    self._idle.append(pooled)
+            else:
+                self._discard(pooled)
+        finally:
+            self._slots.release()
+    
+    @contextmanager
+    def connection(self):
+        """
+        Empresta uma conexão aberta do pool. A conexão é descartada se o
+        bloco levantar uma exceção.
+        """
+        pooled = self._checkout()
+        try:
+            yield pooled
+        except BaseException:
+            self._checkin(pooled, reusable=False)
+            raise
+        else:
+            self._checkin(pooled)
+    
+    def send_messages(self, messages):
+        """
+        Envia as mensagens usando uma única conexão do pool.
+        
+        Se a conexão tiver caído (por exemplo, fechada pelo servidor por
+        inatividade), ela é substituída por uma nova e o envio é repetido uma
+        vez.
+        
+        Returns:
+            int: número de mensagens enviadas
+        """
+        for attempt in range(2):
+            try:
+                with self.connection() as pooled:
+                    with timed('smtp_data'):
+                        sent = pooled.backend.send_messages(messages)
+                    pooled.messages_sent += len(messages)
+                    return sent
+            except RECONNECT_ERRORS as e:
+                if attempt:
+                    raise
+                logger.warning(f"Conexão SMTP perdida ({e}); reconectando")
+    
+    def send(self, message):
+        """
+        Envia uma única EmailMessage usando uma conexão do pool.
+        """
+        return self.send_messages([message])
+    
+    def send_each(self, messages):
+        """
+        Envia as mensagens uma a uma pela mesma conexão do pool, registrando
+        o resultado de cada uma. Um erro em uma mensagem (por exemplo,
+        destinatário recusado) não interrompe as demais; se a conexão cair,
+        ela é substituída e a mensagem em andamento é tentada mais uma vez.
+        Se não for possível abrir uma conexão (servidor fora do ar, timeout,
+        DNS, autenticação recusada), o erro é atribuído a todas as mensagens
+        ainda não enviadas, sem levantar a exceção.
+        
+        Returns:
+            list: para cada mensagem, None se enviada ou a exceção do envio
+        """
+        errors = [None] * len(messages)
+        index = 0
+        retried = False
+        
+        while index < len(messages):
+            try:
+                pooled = self._checkout()
+            except Exception as e:
+                logger.warning(f"Não foi possível abrir conexão SMTP: {e}")
+                errors[index:] = [e] * (len(messages) - index)
+                break
+            
+            try:
+                while index < len(messages) and pooled.messages_sent < self.max_messages:
+                    try:
+                        with timed('smtp_data'):
+                            pooled.backend.send_messages([messages[index]])
+                    except RECONNECT_ERRORS:
+                        raise
+                    except Exception as e:
+                        errors[index] = e
+                    pooled.messages_sent += 1
+                    index += 1
+                    retried = False
+            except RECONNECT_ERRORS as e:
+                self._checkin(pooled, reusable=False)
+                logger.warning(f"Conexão SMTP perdida ({e}); reconectando")
+                if retried:
+                    errors[index] = e
+                    index += 1
+                retried = not retried
+            except BaseException:
+                self._checkin(pooled, reusable=False)
+                raise
+            else:
+                self._checkin(pooled)
+        
+        return errors
+    
+    def idle_connections(self):
+        with self._lock:
+            return len(self._idle)
+    
+    def close(self):
+        """
+        Fecha todas as conexões ociosas do pool.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for pooled in idle:
+            self._discard(pooled)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """
+    Retorna o pool de conexões SMTP do processo, criando-o na primeira
+    chamada a partir das configurações NOTIFICATIONS_SMTP_POOL_*.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SMTPConnectionPool(
+                    size=settings.NOTIFICATIONS_SMTP_POOL_SIZE,
+                    idle_timeout=settings.NOTIFICATIONS_SMTP_POOL_IDLE_TIMEOUT,
+                    max_messages=settings.NOTIFICATIONS_SMTP_POOL_MAX_MESSAGES,
+                )
+    return _pool
+
+
+def reset_pool():
+    """
+    Fecha e descarta o pool do processo. O próximo get_pool() cria um novo,
+    o que é útil quando as configurações de email mudam (por exemplo, em
+    testes).
+    """
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.close()
+
+
+@receiver(setting_changed)
+def _reset_pool_on_setting_change(setting, **kwargs):
+    if setting.startswith('EMAIL_') or setting.startswith('NOTIFICATIONS_SMTP_POOL_'):
+        reset_pool()
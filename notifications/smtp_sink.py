@@ -0,0 +1,99 @@
+import socketserver
+import threading
+import time
+
+
+class _SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """
+    Implementação mínima do lado servidor do SMTP: aceita qualquer
+    remetente/destinatário e descarta as mensagens, apenas contando-as.
+    """
+    
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode('ascii'))
+    
+    def handle(self):
+        sink = self.server.sink
+        sink._record('connections')
+        # Simula o custo de estabelecer a sessão (TLS, autenticação, latência
+        # de rede), que é o que o pool de conexões evita.
+        if sink.handshake_latency:
+            time.sleep(sink.handshake_latency)
+        self.reply('220 localhost SMTP sink')
+        
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip().upper()
+            
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 localhost')
+            elif command.startswith(('MAIL', 'RCPT', 'RSET', 'NOOP')):
+                self.reply('250 OK')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b'.\n', b''):
+                    pass
+                # Simula o tempo de resposta do servidor a cada mensagem
+                if sink.message_latency:
+                    time.sleep(sink.message_latency)
+                sink._record('messages')
+                self.reply('250 OK: queued')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+
+class _ThreadingSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class LocalSMTPSink:
+    """
+    Servidor SMTP local que descarta as mensagens recebidas, usado para
+    benchmarks sem depender de um servidor de email real.
+    
+    Uso:
+        with LocalSMTPSink(handshake_latency=0.05, message_latency=0.01) as sink:
+            ...  # EMAIL_HOST=sink.host, EMAIL_PORT=sink.port
+            print(sink.connections, sink.messages)
+    """
+    
+    def __init__(self, host='127.0.0.1', port=0, handshake_latency=0.0, message_latency=0.0):
+        self.handshake_latency = handshake_latency
+        self.message_latency = message_latency
+        self.connections = 0
+        self.messages = 0
+        self._lock = threading.Lock()
+        self._server = _ThreadingSMTPServer((host, port), _SMTPSinkHandler)
+        self._server.sink = self
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = None
+    
+    def _record(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+    
+    def reset(self):
+        with self._lock:
+            self.connections = 0
+            self.messages = 0
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,97 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.template import Context, Engine
+
+
+# Engine próprio para os templates de notificação: os emails são texto
+# puro, então não há escape de HTML, e os templates vêm do banco, não de
+# arquivos
+ENGINE = Engine(autoescape=False)
+
+
+class CompiledTemplateCache:
+    """
+    Cache LRU, por processo, dos templates de notificação já compilados.
+
+    As entradas são indexadas pelo id do NotificationTemplate e pela
+    versão. NotificationTemplate.save() incrementa a versão, e os processos
+    passam a usar a nova entrada porque a versão lida do banco muda; as
+    entradas das versões anteriores continuam válidas para as notificações
+    geradas por elas.
+    """
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, template, version=None):
+        """
+        Retorna os templates compilados (assunto, corpo) de um
+        NotificationTemplate, compilando-os se não estiverem no cache.
+
+        Args:
+            template (NotificationTemplate): template
+            version (int): versão desejada; por padrão, a versão atual. As
+                versões anteriores são lidas de NotificationTemplateVersion.
+
+        Raises:
+            TemplateSyntaxError: se o template for inválido
+        """
+        if version is None:
+            version = template.version
+        key = (template.pk, version)
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+
+        sources = None
+        if version != template.version:
+            sources = template.versions.filter(version=version).values_list('subject', 'body').first()
+        if sources is None:
+            sources = (template.subject, template.body)
+        compiled = tuple(ENGINE.from_string(source) for source in sources)
+
+        with self._lock:
+            self._entries[key] = compiled
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return compiled
+
+    def invalidate(self, template_id):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == template_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+template_cache = CompiledTemplateCache(settings.NOTIFICATIONS_TEMPLATE_CACHE_SIZE)
+
+
+def render_template(template, context, version=None):
+    """
+    Renderiza um NotificationTemplate com o contexto informado, na versão
+    atual ou em `version` (ver CompiledTemplateCache.get).
+
+    Returns:
+        tuple: (subject, message). As quebras de linha do assunto são
+            removidas, já que não são permitidas no cabeçalho do email.
+    """
+    subject_template, body_template = template_cache.get(template, version)
+    subject = ' '.join(subject_template.render(Context(context or {})).split())
+    message = body_template.render(Context(context or {})).strip()
+    return subject, message
@@ -1,10 +1,21 @@
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.core.management import CommandError, call_command
 from django.core import mail
+from django.db import IntegrityError, transaction
 from rest_framework.test import APITestCase
 from rest_framework import status
-from notifications.models import Notification
+from notifications.models import MessageBody, Notification, NotificationCounter, NotificationTemplate
+from notifications.serializers import NotificationSerializer
 from notifications.services import EmailService
+from notifications.smtp_pool import SMTPConnectionPool
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 import json
+import smtplib
+import socket
+import threading
 
 
 class NotificationModelTest(TestCase):
@@ -27,6 +38,71 @@ class NotificationModelTest(TestCase):
         """Testa a representação em string"""
         expected = 'Teste - teste@example.com (pending)'
         self.assertEqual(str(self.notification), expected)
+    
+    def test_content_hash_is_populated_and_normalized(self):
+        """Testa que o hash de conteúdo tem tamanho fixo e ignora caixa/espaços"""
+        self.assertEqual(len(self.notification.content_hash), 64)
+        self.assertEqual(
+            self.notification.content_hash,
+            Notification.compute_content_hash(' TESTE@example.com', 'Teste ', 'Mensagem de teste')
+        )
+        self.assertNotEqual(
+            self.notification.content_hash,
+            Notification.compute_content_hash('teste@example.com', 'Teste', 'Outra mensagem')
+        )
+    
+    def test_unique_sent_content_hash(self):
+        """Testa que não podem existir duas notificações enviadas idênticas"""
+        data = {
+            'recipient_email': 'unico@example.com',
+            'subject': 'Único',
+            'message': 'Mensagem única',
+        }
+        Notification.objects.create(status='sent', **data)
+        # Notificações com falha não participam da restrição
+        Notification.objects.create(status='failed', **data)
+        
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                Notification.objects.create(status='sent', **data)
+    
+    def test_content_hash_follows_edits(self):
+        """Testa que o hash é recalculado quando o conteúdo é editado"""
+        from django.core.exceptions import ValidationError
+        from rest_framework.test import APIClient
+        
+        client = APIClient()
+        url = f'/api/notifications/{self.notification.id}/'
+        response = client.put(url, {
+            'recipient_email': 'teste@example.com', 'subject': 'Novo assunto', 'message': 'Mensagem de teste'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.notification.refresh_from_db()
+        self.assertEqual(
+            self.notification.content_hash,
+            Notification.compute_content_hash('teste@example.com', 'Novo assunto', 'Mensagem de teste')
+        )
+        
+        client.patch(url, {'message': 'Outra mensagem'}, format='json')
+        self.notification.refresh_from_db()
+        self.assertEqual(
+            self.notification.content_hash,
+            Notification.compute_content_hash('teste@example.com', 'Novo assunto', 'Outra mensagem')
+        )
+        
+        # Editar para o conteúdo de outra notificação pendente é recusado
+        other = Notification.objects.create(recipient_email='outro@example.com', subject='S', message='M')
+        response = client.patch(url, {'recipient_email': 'outro@example.com', 'subject': 'S', 'message': 'M'},
+                                format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.notification.refresh_from_db()
+        self.assertEqual(self.notification.subject, 'Novo assunto')
+        
+        # e, no admin, barrado pela validação do modelo
+        self.notification.recipient_email, self.notification.subject = other.recipient_email, 'S'
+        self.notification.message = 'M'
+        with self.assertRaises(ValidationError):
+            self.notification.full_clean()
 
 
 class EmailServiceTest(TestCase):
@@ -278,6 +354,32 @@ class NotificationAPITest(APITestCase):
         
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertEqual(Notification.objects.count(), 0)
+    
+    def test_create_duplicate_returns_existing(self):
+        """Testa que a criação direta de uma duplicata retorna a notificação existente"""
+        data = {'recipient_email': 'teste@example.com', 'subject': 'Teste', 'message': 'Mensagem'}
+        
+        first = self.client.post('/api/notifications/', data, format='json')
+        second = self.client.post('/api/notifications/', data, format='json')
+        
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(first.data['status'], 'pending')
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data['id'], first.data['id'])
+        self.assertEqual(Notification.objects.count(), 1)
+    
+    def test_send_pending_duplicate_is_accepted(self):
+        """Testa que a duplicata de uma notificação ainda pendente responde 202"""
+        data = {'recipient_email': 'teste@example.com', 'subject': 'Teste', 'message': 'Mensagem'}
+        pending, _ = EmailService.enqueue_notification(**data)
+        
+        response = self.client.post('/api/notifications/send/', data, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertFalse(response.data['success'])
+        self.assertEqual(response.data['notification']['id'], pending.id)
+        self.assertEqual(response.data['notification']['status'], 'pending')
+        self.assertEqual(len(mail.outbox), 0)
 
 
 class NotificationIntegrationTest(APITestCase):
@@ -442,3 +544,2165 @@ class NotificationIntegrationTest(APITestCase):
         
         # Apenas 1 email enviado
         self.assertEqual(len(mail.outbox), 1)
+
+
+class ConcurrentSendTest(TransactionTestCase):
+    """Testa a deduplicação sob envios concorrentes idênticos"""
+    
+    WORKERS = 8
+    
+    def test_parallel_identical_sends_deliver_once(self):
+        """Testa que N envios paralelos idênticos geram exatamente uma entrega"""
+        from django.core.mail.backends.locmem import EmailBackend
+        from django.db import connection
+        from rest_framework.test import APIClient
+        
+        data = {
+            'recipient_email': 'concorrente@example.com',
+            'subject': 'Envio concorrente',
+            'message': 'Apenas uma entrega deve acontecer'
+        }
+        barrier = threading.Barrier(self.WORKERS)
+        deliveries = []
+        original_send_messages = EmailBackend.send_messages
+        
+        def counting_send_messages(backend, messages):
+            deliveries.extend(messages)
+            return original_send_messages(backend, messages)
+        
+        def post():
+            try:
+                barrier.wait()
+                return APIClient().post('/api/notifications/send/', data, format='json')
+            finally:
+                connection.close()
+        
+        with mock.patch.object(EmailBackend, 'send_messages', counting_send_messages):
+            with ThreadPoolExecutor(max_workers=self.WORKERS) as executor:
+                responses = list(executor.map(lambda _: post(), range(self.WORKERS)))
+        
+        # Quem encontra a notificação vencedora ainda em envio recebe 202
+        self.assertTrue(all(
+            r.status_code in (status.HTTP_201_CREATED, status.HTTP_202_ACCEPTED) for r in responses
+        ))
+        self.assertEqual(len({r.data['notification']['id'] for r in responses}), 1)
+        self.assertEqual(len(deliveries), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(Notification.objects.count(), 1)
+
+
+class DeliveryQueueTest(TransactionTestCase):
+    """Testes para o modo de envio enfileirado e os workers de entrega"""
+    
+    def test_queue_mode_returns_accepted_without_sending(self):
+        """Testa que o modo queue apenas registra a notificação pendente"""
+        data = {
+            'recipient_email': 'fila@example.com',
+            'subject': 'Enfileirada',
+            'message': 'Mensagem enfileirada'
+        }
+        
+        response = self.client.post('/api/notifications/send/?mode=queue', data, content_type='application/json')
+        
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.json()['notification']['status'], 'pending')
+        self.assertEqual(len(mail.outbox), 0)
+        
+        # Um envio idêntico enquanto pendente não cria outra notificação
+        response = self.client.post('/api/notifications/send/?mode=queue', data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(Notification.objects.count(), 1)
+    
+    @override_settings(NOTIFICATIONS_SEND_MODE='queue')
+    def test_workers_drain_pending_notifications(self):
+        """Testa que os workers entregam todas as notificações pendentes uma única vez"""
+        for i in range(10):
+            response = self.client.post('/api/notifications/send/', {
+                'recipient_email': f'user{i}@example.com',
+                'subject': f'Fila {i}',
+                'message': f'Mensagem {i}'
+            }, content_type='application/json')
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        
+        out = StringIO()
+        call_command('deliver_notifications', workers=3, batch_size=2, once=True, stdout=out)
+        
+        self.assertEqual(Notification.objects.filter(status='sent').count(), 10)
+        self.assertEqual(len(mail.outbox), 10)
+        self.assertIn('10 enviada(s)', out.getvalue())
+    
+    def test_claim_pending_skips_locked_and_reclaims_stale(self):
+        """Testa que reservas ativas são respeitadas e reservas vencidas retomadas"""
+        from django.utils import timezone
+        
+        locked = Notification.objects.create(
+            recipient_email='a@example.com', subject='A', message='A',
+            next_attempt_at=EmailService.lease_until()
+        )
+        stale = Notification.objects.create(
+            recipient_email='b@example.com', subject='B', message='B',
+            next_attempt_at=timezone.now() - timedelta(seconds=1)
+        )
+        
+        claimed = EmailService.claim_pending(10)
+        
+        self.assertEqual([n.id for n in claimed], [stale.id])
+        self.assertEqual(EmailService.claim_pending(10), [])
+        locked.refresh_from_db()
+        self.assertGreater(locked.next_attempt_at, timezone.now())
+    
+    def test_invalid_mode(self):
+        """Testa que um modo de envio desconhecido é rejeitado"""
+        response = self.client.post('/api/notifications/send/?mode=foo', {
+            'recipient_email': 'a@example.com', 'subject': 'A', 'message': 'A'
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FakeEmailBackend:
+    """Backend de email falso que registra aberturas e envios"""
+    
+    def __init__(self, failures=0):
+        self.opened = 0
+        self.closed = False
+        self.sent = []
+        self.failures = failures
+    
+    def open(self):
+        self.opened += 1
+    
+    def close(self):
+        self.closed = True
+    
+    def send_messages(self, messages):
+        if self.failures:
+            self.failures -= 1
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        self.sent.extend(messages)
+        return len(messages)
+
+
+class SMTPConnectionPoolTest(TestCase):
+    """Testes para o pool de conexões SMTP"""
+    
+    def make_pool(self, backends, **kwargs):
+        created = []
+        
+        def factory():
+            backend = backends.pop(0) if backends else FakeEmailBackend()
+            created.append(backend)
+            return backend
+        
+        return SMTPConnectionPool(connection_factory=factory, **kwargs), created
+    
+    def test_reuses_connection(self):
+        """Testa que várias mensagens usam a mesma conexão aberta"""
+        pool, created = self.make_pool([], size=2)
+        for i in range(5):
+            pool.send(f'mensagem {i}')
+        
+        self.assertEqual(len(created), 1)
+        self.assertEqual(len(created[0].sent), 5)
+        self.assertEqual(pool.connections_opened, 1)
+    
+    def test_recycles_after_max_messages(self):
+        """Testa que a conexão é fechada após max_messages envios"""
+        pool, created = self.make_pool([], max_messages=2)
+        for i in range(5):
+            pool.send(f'mensagem {i}')
+        
+        self.assertEqual(len(created), 3)
+        self.assertTrue(created[0].closed)
+        self.assertTrue(created[1].closed)
+        self.assertFalse(created[2].closed)
+    
+    def test_discards_idle_connections(self):
+        """Testa que conexões ociosas além do limite não são reutilizadas"""
+        pool, created = self.make_pool([], idle_timeout=0)
+        pool.send('primeira')
+        with mock.patch('notifications.smtp_pool.time.monotonic', return_value=10 ** 9):
+            pool.send('segunda')
+        
+        self.assertEqual(len(created), 2)
+        self.assertTrue(created[0].closed)
+    
+    def test_reconnects_on_disconnect(self):
+        """Testa que uma conexão derrubada pelo servidor é substituída"""
+        pool, created = self.make_pool([FakeEmailBackend(failures=1)])
+        
+        self.assertEqual(pool.send('mensagem'), 1)
+        self.assertEqual(len(created), 2)
+        self.assertTrue(created[0].closed)
+        self.assertEqual(created[1].sent, ['mensagem'])
+    
+    def test_send_each_reports_connect_failure(self):
+        """Testa que uma falha ao abrir a conexão vira o erro de cada mensagem"""
+        backend = FakeEmailBackend()
+        backend.open = mock.Mock(side_effect=TimeoutError('timed out'))
+        pool, created = self.make_pool([backend], size=1)
+        
+        errors = pool.send_each(['primeira', 'segunda'])
+        
+        self.assertEqual([type(error) for error in errors], [TimeoutError, TimeoutError])
+        # A vaga da conexão que falhou é devolvida ao pool
+        self.assertEqual(pool.send_each(['terceira']), [None])
+        self.assertEqual(created[1].sent, ['terceira'])
+
+
+class SendBatchAPITest(APITestCase):
+    """Testes para o endpoint de envio em lote"""
+    
+    def test_send_batch_with_duplicates(self):
+        """Testa lote com itens repetidos e itens já enviados anteriormente"""
+        Notification.objects.create(
+            recipient_email='antigo@example.com',
+            subject='Antigo',
+            message='Já enviado',
+            status='sent'
+        )
+        payload = [
+            {'recipient_email': 'a@example.com', 'subject': 'Lote', 'message': 'Mensagem A'},
+            {'recipient_email': 'b@example.com', 'subject': 'Lote', 'message': 'Mensagem B'},
+            {'recipient_email': 'A@example.com', 'subject': 'Lote', 'message': 'Mensagem A'},
+            {'recipient_email': 'antigo@example.com', 'subject': 'Antigo', 'message': 'Já enviado'},
+        ]
+        
+        response = self.client.post('/api/notifications/send-batch/', payload, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['success'])
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['duplicates'], 2)
+        results = response.data['results']
+        self.assertEqual(results[0]['id'], results[2]['id'])
+        self.assertEqual([r['duplicate'] for r in results], [False, False, True, True])
+        self.assertTrue(all(r['status'] == 'sent' for r in results))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(Notification.objects.count(), 3)
+    
+    def test_send_batch_query_count_is_constant(self):
+        """Testa que o número de consultas não cresce com o tamanho do lote"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        def post_batch(size, prefix):
+            payload = [
+                {'recipient_email': f'{prefix}{i}@example.com', 'subject': 'Lote', 'message': 'Mensagem'}
+                for i in range(size)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/notifications/send-batch/', payload, format='json')
+            self.assertEqual(response.data['created'], size)
+            return len(queries)
+        
+        # O primeiro lote cria as linhas de contador da hora atual
+        post_batch(1, 'aquecimento')
+        
+        self.assertEqual(post_batch(5, 'pequeno'), post_batch(50, 'grande'))
+        self.assertEqual(len(mail.outbox), 56)
+    
+    def test_send_batch_reports_item_failures(self):
+        """Testa que a falha de um item não impede o envio dos demais"""
+        from django.core.mail.backends.locmem import EmailBackend
+        original_send_messages = EmailBackend.send_messages
+        
+        def send_messages(backend, messages):
+            if messages[0].to == ['recusado@example.com']:
+                raise smtplib.SMTPRecipientsRefused({'recusado@example.com': (550, b'User unknown')})
+            return original_send_messages(backend, messages)
+        
+        payload = [
+            {'recipient_email': 'recusado@example.com', 'subject': 'Lote', 'message': 'Mensagem'},
+            {'recipient_email': 'aceito@example.com', 'subject': 'Lote', 'message': 'Mensagem'},
+        ]
+        with mock.patch.object(EmailBackend, 'send_messages', send_messages):
+            response = self.client.post('/api/notifications/send-batch/', payload, format='json')
+        
+        self.assertFalse(response.data['success'])
+        self.assertEqual(response.data['failed'], 1)
+        self.assertEqual(response.data['results'][0]['status'], 'failed')
+        self.assertIsNotNone(response.data['results'][0]['error'])
+        self.assertEqual(response.data['results'][1]['status'], 'sent')
+        self.assertEqual(len(mail.outbox), 1)
+    
+    def test_send_batch_connect_failure_records_attempts(self):
+        """Testa que a falha ao conectar ao SMTP é registrada em cada item do lote"""
+        from django.core.mail.backends.locmem import EmailBackend
+        from notifications.smtp_pool import reset_pool
+        # Descarta as conexões já abertas por outros testes
+        reset_pool()
+        payload = [
+            {'recipient_email': f'conexao{i}@example.com', 'subject': 'Lote', 'message': 'Mensagem'}
+            for i in range(2)
+        ]
+        
+        with mock.patch.object(EmailBackend, 'open', side_effect=socket.gaierror('Name or service not known'), create=True):
+            response = self.client.post('/api/notifications/send-batch/', payload, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['failed'], 2)
+        for notification in Notification.objects.all():
+            self.assertEqual(notification.status, 'failed')
+            self.assertEqual(notification.attempts, 1)
+            self.assertIn('Name or service not known', notification.error_message)
+    
+    def test_send_batch_queue_mode(self):
+        """Testa que no modo queue o lote é apenas enfileirado"""
+        payload = [
+            {'recipient_email': 'fila@example.com', 'subject': 'Lote', 'message': 'Mensagem'},
+        ]
+        
+        response = self.client.post('/api/notifications/send-batch/?mode=queue', payload, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['results'][0]['status'], 'pending')
+        self.assertEqual(len(mail.outbox), 0)
+    
+    def test_send_batch_invalid_items(self):
+        """Testa que erros de validação são reportados por item"""
+        payload = [
+            {'recipient_email': 'ok@example.com', 'subject': 'Lote', 'message': 'Mensagem'},
+            {'recipient_email': 'email-invalido', 'subject': 'Lote', 'message': 'Mensagem'},
+        ]
+        
+        response = self.client.post('/api/notifications/send-batch/', payload, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['errors'][0], {})
+        self.assertIn('recipient_email', response.data['errors'][1])
+        self.assertEqual(Notification.objects.count(), 0)
+    
+    def test_send_batch_empty(self):
+        """Testa que lotes vazios são rejeitados"""
+        response = self.client.post('/api/notifications/send-batch/', [], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class StatisticsAPITest(APITestCase):
+    """Testes para os filtros e a série temporal das estatísticas"""
+    
+    def setUp(self):
+        from django.utils import timezone
+        
+        now = timezone.now()
+        rows = [
+            ('sent', now - timedelta(days=2)),
+            ('sent', now - timedelta(days=2)),
+            ('failed', now - timedelta(days=1)),
+            ('pending', now),
+        ]
+        for i, (notification_status, created_at) in enumerate(rows):
+            notification = Notification.objects.create(
+                recipient_email=f'user{i}@example.com',
+                subject=f'Teste {i}',
+                message=f'Mensagem {i}',
+                status=notification_status
+            )
+            Notification.objects.filter(pk=notification.pk).update(created_at=created_at)
+        # update() não passa pelos contadores; recalcula após mover as datas
+        NotificationCounter.objects.rebuild()
+        self.now = now
+    
+    def test_statistics_single_query(self):
+        """Testa que os totais são calculados em uma única consulta"""
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/notifications/statistics/')
+        
+        self.assertEqual(response.data['total'], 4)
+        self.assertEqual(response.data['sent'], 2)
+        self.assertEqual(response.data['success_rate'], 50.0)
+    
+    def test_statistics_period(self):
+        """Testa o filtro por período"""
+        since = (self.now - timedelta(hours=36)).isoformat()
+        response = self.client.get('/api/notifications/statistics/', {'since': since})
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['total'], 2)
+        self.assertEqual(response.data['sent'], 0)
+        self.assertEqual(response.data['failed'], 1)
+    
+    def test_statistics_series_by_day(self):
+        """Testa a série temporal agrupada por dia"""
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/notifications/statistics/', {'group_by': 'day'})
+        
+        series = response.data['series']
+        self.assertEqual(len(series), 3)
+        self.assertEqual([b['total'] for b in series], [2, 1, 1])
+        self.assertEqual(series[0]['sent'], 2)
+    
+    def test_statistics_invalid_params(self):
+        """Testa a validação dos parâmetros"""
+        response = self.client.get('/api/notifications/statistics/', {'since': 'ontem', 'group_by': 'week'})
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('since', response.data['errors'])
+        self.assertIn('group_by', response.data['errors'])
+
+
+class NotificationCounterTest(TestCase):
+    """Testes para os contadores materializados das estatísticas"""
+    
+    def test_counters_follow_notification_lifecycle(self):
+        """Testa que criação, mudança de status e remoção mantêm os contadores"""
+        from django.core.mail.backends.locmem import EmailBackend
+        
+        EmailService.send_notification('a@example.com', 'A', 'Mensagem A')
+        with mock.patch.object(EmailBackend, 'send_messages', side_effect=smtplib.SMTPException('falha')):
+            EmailService.send_notification('b@example.com', 'B', 'Mensagem B')
+        EmailService.send_batch([
+            {'recipient_email': 'c@example.com', 'subject': 'C', 'message': 'Mensagem C'},
+            {'recipient_email': 'd@example.com', 'subject': 'D', 'message': 'Mensagem D'},
+        ])
+        EmailService.enqueue_notification('e@example.com', 'E', 'Mensagem E')
+        Notification.objects.get(recipient_email='c@example.com').delete()
+        
+        self.assertEqual(
+            NotificationCounter.objects.totals(),
+            {'total': 4, 'sent': 2, 'failed': 1, 'pending': 1}
+        )
+        self.assertEqual(NotificationCounter.objects.check_consistency(), [])
+    
+    def test_status_change_updates_counters_in_one_query(self):
+        """Testa que uma mudança de status ajusta o dia e a hora com um único UPDATE"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        notification = Notification.objects.create(recipient_email='a@example.com', subject='A', message='A')
+        notification.status = 'sent'
+        with CaptureQueriesContext(connection) as queries:
+            notification.save()
+        
+        counter_queries = [
+            query['sql'] for query in queries.captured_queries
+            if 'notificationcounter' in query['sql']
+        ]
+        self.assertEqual(len(counter_queries), 1)
+        self.assertFalse(NotificationCounter.objects.filter(period='all').exists())
+        self.assertEqual(NotificationCounter.objects.check_consistency(), [])
+    
+    def test_statistics_reads_counters(self):
+        """Testa que as estatísticas não consultam a tabela de notificações"""
+        EmailService.send_notification('a@example.com', 'A', 'Mensagem A')
+        
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/notifications/statistics/')
+        
+        self.assertEqual(response.data['total'], 1)
+        self.assertEqual(response.data['sent'], 1)
+    
+    def test_rebuild_counters_command(self):
+        """Testa a verificação e a reconstrução dos contadores"""
+        Notification.objects.create(recipient_email='a@example.com', subject='A', message='A')
+        # Alteração que não passa pelo modelo deixa os contadores divergentes
+        Notification.objects.update(status='sent')
+        
+        with self.assertRaises(CommandError):
+            call_command('rebuild_counters', check=True, stdout=StringIO())
+        
+        call_command('rebuild_counters', stdout=StringIO())
+        call_command('rebuild_counters', check=True, stdout=StringIO())
+        self.assertEqual(NotificationCounter.objects.totals()['sent'], 1)
+
+
+class CursorPaginationTest(APITestCase):
+    """Testes para a paginação por cursor da listagem"""
+    
+    def setUp(self):
+        notifications = [
+            Notification.objects.create(
+                recipient_email=f'user{i}@example.com',
+                subject=f'Teste {i}',
+                message=f'Mensagem {i}'
+            )
+            for i in range(25)
+        ]
+        # Vários registros no mesmo instante exercitam o desempate por id
+        Notification.objects.filter(pk__in=[n.pk for n in notifications[:10]]).update(
+            created_at=notifications[0].created_at
+        )
+    
+    def test_cursor_pagination_walks_all_rows_once(self):
+        """Testa que percorrer as páginas retorna cada notificação uma vez, em ordem"""
+        ids = []
+        url = '/api/notifications/?pagination=cursor&page_size=4'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+        
+        expected = list(
+            Notification.objects.order_by('-created_at', '-id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+    
+    def test_cursor_pagination_is_keyset(self):
+        """Testa que as páginas usam a posição (created_at, id), sem OFFSET, nos dois sentidos"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        first = self.client.get('/api/notifications/?pagination=cursor&page_size=4')
+        second = self.client.get(first.data['next'])
+        with CaptureQueriesContext(connection) as queries:
+            third = self.client.get(second.data['next'])
+        self.assertFalse(any('OFFSET' in q['sql'].upper() for q in queries.captured_queries))
+        
+        # Os empates de created_at ficam entre as páginas e são resolvidos pelo id
+        previous = self.client.get(third.data['previous'])
+        self.assertEqual(
+            [item['id'] for item in previous.data['results']],
+            [item['id'] for item in second.data['results']]
+        )
+        previous = self.client.get(previous.data['previous'])
+        self.assertEqual(
+            [item['id'] for item in previous.data['results']],
+            [item['id'] for item in first.data['results']]
+        )
+        self.assertIsNone(previous.data['previous'])
+        
+        response = self.client.get('/api/notifications/?pagination=cursor&cursor=invalido')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_cursor_pagination_without_count_query(self):
+        """Testa que a paginação por cursor não executa COUNT(*) por padrão"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/notifications/?pagination=cursor')
+        
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertFalse(any('COUNT(' in q['sql'].upper() for q in queries.captured_queries))
+        
+        response = self.client.get('/api/notifications/?pagination=cursor&count=true')
+        self.assertEqual(response.data['count'], 25)
+    
+    def test_max_page_size(self):
+        """Testa que o tamanho de página é limitado por NOTIFICATIONS_MAX_PAGE_SIZE"""
+        with override_settings(NOTIFICATIONS_MAX_PAGE_SIZE=5):
+            response = self.client.get('/api/notifications/?page_size=50')
+            self.assertEqual(len(response.data['results']), 5)
+            response = self.client.get('/api/notifications/?pagination=cursor&page_size=50')
+            self.assertEqual(len(response.data['results']), 5)
+
+
+class QueryPlanTest(TestCase):
+    """
+    Verifica via EXPLAIN que as consultas principais usam índices em vez de
+    varrer a tabela inteira.
+    """
+    
+    def assertUsesIndex(self, queryset, allow_sort=False, allow_index_scan=False):
+        """
+        allow_sort aceita uma ordenação em memória das linhas encontradas;
+        allow_index_scan aceita percorrer um índice inteiro em ordem, o que
+        só é adequado para consultas sem filtro com LIMIT.
+        """
+        from django.db import connection
+        
+        if connection.vendor == 'postgresql':
+            # Em tabelas pequenas o PostgreSQL prefere a varredura sequencial;
+            # desabilitá-la revela se existe um índice aplicável
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+                plan = queryset.explain()
+            self.assertNotIn('Seq Scan', plan, plan)
+        elif connection.vendor == 'sqlite':
+            plan = queryset.explain()
+            for line in plan.splitlines():
+                if ' SCAN ' in f' {line} ':
+                    self.assertTrue(allow_index_scan, plan)
+                    self.assertIn('USING', line, plan)
+            if not allow_sort:
+                self.assertNotIn('TEMP B-TREE', plan, plan)
+        else:
+            self.skipTest(f'EXPLAIN não verificado para {connection.vendor}')
+    
+    def list_queryset(self, **params):
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+        from notifications.views import NotificationViewSet
+        
+        request = Request(APIRequestFactory().get('/api/notifications/', params))
+        view = NotificationViewSet(request=request, action='list', format_kwarg=None)
+        return view.get_queryset()[:10]
+    
+    def test_list_queries_use_index(self):
+        """Testa a listagem sem filtro e com filtros de status e destinatário"""
+        self.assertUsesIndex(self.list_queryset(), allow_index_scan=True)
+        self.assertUsesIndex(self.list_queryset(status='sent'))
+        self.assertUsesIndex(self.list_queryset(recipient_email='a@example.com'))
+    
+    def test_cursor_page_uses_index(self):
+        """Testa a consulta de uma página intermediária da paginação por cursor"""
+        from django.utils import timezone
+        from notifications.pagination import NotificationCursorPagination
+        
+        queryset = Notification.objects.filter(
+            NotificationCursorPagination.keyset_filter(timezone.now(), 100), status='sent'
+        ).order_by('-created_at', '-id')[:10]
+        self.assertUsesIndex(queryset)
+    
+    def test_duplicate_lookup_uses_index(self):
+        """Testa a busca de duplicatas pelo hash do conteúdo"""
+        queryset = Notification.objects.filter(
+            content_hash=Notification.compute_content_hash('a@example.com', 'A', 'A'),
+            status__in=Notification.CLAIMED_STATUSES
+        )
+        # Ordenar as poucas linhas com o mesmo hash é aceitável
+        self.assertUsesIndex(queryset, allow_sort=True)
+    
+    def test_delivery_queue_uses_index(self):
+        """Testa a consulta de notificações pendentes dos workers"""
+        from django.utils import timezone
+        
+        queryset = EmailService.available_pending(timezone.now(), 'high').order_by('next_attempt_at')[:50]
+        self.assertUsesIndex(queryset)
+    
+    def test_statistics_queries_use_index(self):
+        """Testa as consultas de totais e da série temporal das estatísticas"""
+        from django.db.models import Sum
+        from django.utils import timezone
+        
+        totals = NotificationCounter.objects.filter(period='day').order_by().values('status').annotate(
+            total=Sum('count')
+        )
+        series = NotificationCounter.objects.filter(
+            period='hour', bucket__gte=timezone.now() - timedelta(days=1)
+        ).order_by('bucket').values('bucket', 'status').annotate(total=Sum('count'))
+        self.assertUsesIndex(totals, allow_sort=True)
+        self.assertUsesIndex(series, allow_sort=True)
+
+
+class RetryTest(APITestCase):
+    """Testes para as novas tentativas após erros temporários de envio"""
+    
+    data = {
+        'recipient_email': 'retry@example.com',
+        'subject': 'Nova tentativa',
+        'message': 'Mensagem'
+    }
+    
+    def send_with_error(self, error):
+        from django.core.mail.backends.locmem import EmailBackend
+        
+        with mock.patch.object(EmailBackend, 'send_messages', side_effect=error):
+            return self.client.post('/api/notifications/send/', self.data, format='json')
+    
+    @override_settings(NOTIFICATIONS_DELIVERY_WORKERS=True)
+    def test_transient_error_schedules_retry(self):
+        """Testa que uma resposta 4xx mantém a notificação pendente com nova tentativa"""
+        from django.utils import timezone
+        
+        response = self.send_with_error(smtplib.SMTPDataError(451, b'Try again later'))
+        
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        notification = Notification.objects.get()
+        self.assertEqual(notification.status, 'pending')
+        self.assertEqual(notification.attempts, 1)
+        self.assertIn('451', notification.error_message)
+        self.assertGreater(notification.next_attempt_at, timezone.now())
+        # Ainda não venceu: os workers não a pegam antes do backoff
+        self.assertEqual(EmailService.claim_pending(10), [])
+        
+        Notification.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        claimed = EmailService.claim_pending(10)
+        self.assertEqual([n.id for n in claimed], [notification.id])
+        
+        success, error = EmailService.deliver(claimed[0])
+        self.assertTrue(success)
+        notification.refresh_from_db()
+        self.assertEqual(notification.status, 'sent')
+        self.assertEqual(notification.attempts, 2)
+        self.assertIsNone(notification.next_attempt_at)
+    
+    @override_settings(NOTIFICATIONS_DELIVERY_WORKERS=False)
+    def test_transient_error_without_workers_fails(self):
+        """Testa que, sem workers, o erro temporário libera o conteúdo para um novo envio"""
+        response = self.send_with_error(smtplib.SMTPDataError(451, b'Try again later'))
+        
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        failed = Notification.objects.get()
+        self.assertEqual(failed.status, 'failed')
+        self.assertIsNone(failed.next_attempt_at)
+        
+        response = self.client.post('/api/notifications/send/', self.data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotEqual(response.data['notification']['id'], failed.id)
+        self.assertEqual(len(mail.outbox), 1)
+    
+    def test_permanent_error_fails(self):
+        """Testa que uma resposta 5xx marca a notificação como falha"""
+        response = self.send_with_error(smtplib.SMTPRecipientsRefused({
+            'retry@example.com': (550, b'No such user')
+        }))
+        
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        notification = Notification.objects.get()
+        self.assertEqual(notification.status, 'failed')
+        self.assertEqual(notification.attempts, 1)
+        self.assertIsNone(notification.next_attempt_at)
+    
+    @override_settings(NOTIFICATIONS_MAX_ATTEMPTS=2)
+    def test_gives_up_after_max_attempts(self):
+        """Testa que o erro temporário vira falha ao atingir o limite de tentativas"""
+        error = smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+        notification = Notification.objects.create(**self.data)
+        
+        EmailService.record_attempt(notification, error)
+        self.assertEqual(notification.status, 'pending')
+        EmailService.record_attempt(notification, error)
+        self.assertEqual(notification.status, 'failed')
+        self.assertEqual(notification.attempts, 2)
+    
+    @override_settings(NOTIFICATIONS_RETRY_BASE_DELAY=10, NOTIFICATIONS_RETRY_MAX_DELAY=60)
+    def test_backoff_delay(self):
+        """Testa o crescimento exponencial e o limite da espera entre tentativas"""
+        from notifications.retry import backoff_delay
+        
+        for attempts, delay in [(1, 10), (2, 20), (3, 40), (4, 60), (10, 60)]:
+            for _ in range(20):
+                seconds = backoff_delay(attempts).total_seconds()
+                self.assertGreaterEqual(seconds, delay / 2)
+                self.assertLessEqual(seconds, delay)
+    
+    def test_is_transient_error(self):
+        """Testa a classificação dos erros de envio"""
+        from notifications.retry import is_transient_error
+        
+        self.assertTrue(is_transient_error(smtplib.SMTPResponseException(421, b'Busy')))
+        self.assertTrue(is_transient_error(TimeoutError()))
+        self.assertTrue(is_transient_error(ConnectionRefusedError()))
+        self.assertFalse(is_transient_error(smtplib.SMTPAuthenticationError(535, b'Denied')))
+        self.assertFalse(is_transient_error(smtplib.SMTPException('falha')))
+        self.assertFalse(is_transient_error(ValueError()))
+
+
+class DomainThrottleTest(APITestCase):
+    """Testes para os limites de envio por domínio do destinatário"""
+    
+    def test_token_bucket(self):
+        """Testa o consumo e a reposição das fichas"""
+        from notifications.throttling import DomainThrottle
+        
+        now = [0.0]
+        throttle = DomainThrottle(default={'rate': 2, 'burst': 2}, clock=lambda: now[0])
+        
+        self.assertEqual(throttle.take('example.com'), 0)
+        self.assertEqual(throttle.take('example.com'), 0)
+        self.assertAlmostEqual(throttle.take('example.com'), 0.5)
+        # Cada domínio tem suas próprias fichas
+        self.assertEqual(throttle.take('example.org'), 0)
+        
+        now[0] += 0.5
+        self.assertEqual(throttle.take('example.com'), 0)
+    
+    def test_concurrency_cap(self):
+        """Testa o limite de envios simultâneos e os limites por domínio"""
+        from notifications.throttling import DomainThrottle, DomainThrottled
+        
+        throttle = DomainThrottle(limits={'Gmail.com': {'concurrency': 1}})
+        
+        with throttle.slot('a@gmail.com'):
+            with self.assertRaises(DomainThrottled):
+                with throttle.slot('b@GMAIL.com'):
+                    pass
+            # Domínios sem limite específico não são afetados
+            with throttle.slot('c@example.com'):
+                pass
+        
+        with throttle.slot('b@gmail.com'):
+            pass
+    
+    @override_settings(
+        NOTIFICATIONS_DOMAIN_LIMITS={'example.com': {'rate': 1, 'burst': 1}},
+        NOTIFICATIONS_DELIVERY_WORKERS=True
+    )
+    def test_send_over_limit_is_deferred(self):
+        """Testa que o envio acima do limite é adiado, e não marcado como falha"""
+        from django.utils import timezone
+        
+        responses = [
+            self.client.post('/api/notifications/send/', {
+                'recipient_email': f'user{i}@example.com',
+                'subject': 'Limite',
+                'message': f'Mensagem {i}'
+            }, format='json')
+            for i in range(2)
+        ]
+        
+        self.assertEqual(responses[0].status_code, status.HTTP_201_CREATED)
+        self.assertEqual(responses[1].status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(len(mail.outbox), 1)
+        
+        deferred = Notification.objects.get(id=responses[1].data['notification']['id'])
+        self.assertEqual(deferred.status, 'pending')
+        self.assertEqual(deferred.attempts, 0)
+        self.assertGreater(deferred.next_attempt_at, timezone.now())
+    
+    @override_settings(
+        NOTIFICATIONS_DOMAIN_LIMITS={'example.com': {'rate': 1, 'burst': 2}},
+        NOTIFICATIONS_DELIVERY_WORKERS=True
+    )
+    def test_batch_over_limit_is_deferred(self):
+        """Testa que o lote envia até o limite de cada domínio e adia o restante"""
+        items = [
+            {'recipient_email': f'user{i}@example.com', 'subject': 'Lote', 'message': 'Mensagem'}
+            for i in range(3)
+        ] + [{'recipient_email': 'user@example.org', 'subject': 'Lote', 'message': 'Mensagem'}]
+        
+        response = self.client.post('/api/notifications/send-batch/', items, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['failed'], 0)
+        self.assertEqual(response.data['deferred'], 1)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['sent', 'sent', 'pending', 'sent']
+        )
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(Notification.objects.get(recipient_email='user2@example.com').attempts, 0)
+
+
+class PriorityLaneTest(APITestCase):
+    """Testes para as faixas de prioridade da fila de entrega"""
+    
+    def create_pending(self, priority, count):
+        for i in range(count):
+            Notification.objects.create(
+                recipient_email=f'{priority}{i}@example.com',
+                subject=priority,
+                message=f'Mensagem {i}',
+                priority=priority
+            )
+    
+    @override_settings(NOTIFICATIONS_PRIORITY_WEIGHTS={'high': 6, 'normal': 3, 'low': 1})
+    def test_claim_pending_weights_lanes(self):
+        """Testa que o lote atende primeiro as urgentes sem parar as demais faixas"""
+        for priority in ('low', 'normal', 'high'):
+            self.create_pending(priority, 20)
+        
+        claimed = EmailService.claim_pending(10)
+        
+        self.assertEqual(
+            [n.priority for n in claimed],
+            ['high'] * 6 + ['normal'] * 3 + ['low']
+        )
+    
+    def test_claim_pending_fills_unused_capacity(self):
+        """Testa que a capacidade sem uso de uma faixa vai para as demais"""
+        self.create_pending('low', 20)
+        self.create_pending('high', 2)
+        
+        claimed = EmailService.claim_pending(10)
+        
+        self.assertEqual([n.priority for n in claimed], ['high'] * 2 + ['low'] * 8)
+    
+    def test_claim_pending_full_queue_queries(self):
+        """Testa que, com todas as faixas cheias, o lote custa um UPDATE e um SELECT"""
+        for priority in ('low', 'normal', 'high'):
+            self.create_pending(priority, 20)
+        
+        with self.assertNumQueries(2):
+            claimed = EmailService.claim_pending(10)
+        self.assertEqual(len(claimed), 10)
+        
+        # Sem urgentes, só as outras duas faixas, que preencheram a cota, são
+        # consultadas de novo: UPDATE e SELECT, um UPDATE por faixa e a releitura
+        Notification.objects.filter(priority='high').delete()
+        with self.assertNumQueries(5):
+            claimed = EmailService.claim_pending(20)
+        self.assertEqual([n.priority for n in claimed], ['normal'] * 17 + ['low'] * 3)
+    
+    def test_send_with_priority(self):
+        """Testa o envio com prioridade e a validação do valor"""
+        data = {
+            'recipient_email': 'urgente@example.com',
+            'subject': 'Redefinição de senha',
+            'message': 'Seu código é 123456',
+            'priority': 'high'
+        }
+        
+        response = self.client.post('/api/notifications/send/?mode=queue', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['notification']['priority'], 'high')
+        
+        data['priority'] = 'urgente'
+        response = self.client.post('/api/notifications/send/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('priority', response.data['errors'])
+    
+    def test_latency_per_lane(self):
+        """Testa a latência de envio calculada para cada faixa"""
+        from django.utils import timezone
+        
+        now = timezone.now()
+        for i, (priority, latency) in enumerate([('high', 0.2)] * 9 + [('high', 3)] + [('low', 600)] * 2):
+            notification = Notification.objects.create(
+                recipient_email=f'user{i}@example.com', subject='Latência', message='Mensagem',
+                priority=priority, status='sent', sent_at=now
+            )
+            Notification.objects.filter(pk=notification.pk).update(
+                created_at=now - timedelta(seconds=latency)
+            )
+        
+        response = self.client.get('/api/notifications/latency/')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lanes = response.data['lanes']
+        self.assertEqual(lanes['high']['count'], 10)
+        self.assertLessEqual(lanes['high']['p50'], 0.5)
+        self.assertGreater(lanes['high']['p99'], 2.5)
+        self.assertLessEqual(lanes['high']['p99'], 5)
+        self.assertEqual(lanes['high']['buckets'][-1], {'le': '+Inf', 'count': 10})
+        self.assertGreater(lanes['low']['p50'], 300)
+        self.assertEqual(lanes['normal'], {
+            'count': 0, 'p50': None, 'p95': None, 'p99': None,
+            'buckets': lanes['normal']['buckets']
+        })
+        
+        response = self.client.get('/api/notifications/latency/?since=ontem')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncSendTest(TransactionTestCase):
+    """Testes para o envio assíncrono (ASGI)"""
+    
+    data = {
+        'recipient_email': 'async@example.com',
+        'subject': 'Assíncrono',
+        'message': 'Mensagem assíncrona'
+    }
+    
+    async def test_send_async_view(self):
+        """Testa o envio pela view assíncrona e a deduplicação"""
+        first = await self.async_client.post(
+            '/api/notifications/send-async/', self.data, content_type='application/json'
+        )
+        second = await self.async_client.post(
+            '/api/notifications/send-async/', self.data, content_type='application/json'
+        )
+        
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(first.json()['notification']['status'], 'sent')
+        self.assertEqual(second.json()['notification']['id'], first.json()['notification']['id'])
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(await Notification.objects.acount(), 1)
+    
+    async def test_send_async_validation(self):
+        """Testa os erros de validação e de método da view assíncrona"""
+        response = await self.async_client.post(
+            '/api/notifications/send-async/', {'recipient_email': 'invalido'},
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('subject', response.json()['errors'])
+        
+        response = await self.async_client.post(
+            '/api/notifications/send-async/', 'não é json', content_type='application/json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        response = await self.async_client.get('/api/notifications/send-async/')
+        self.assertEqual(response.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+    
+    async def test_asend_notification_with_aiosmtplib(self):
+        """Testa envios simultâneos pelo cliente SMTP não bloqueante"""
+        import asyncio
+        from notifications import async_smtp
+        from notifications.smtp_sink import LocalSMTPSink
+        
+        if async_smtp.aiosmtplib is None:
+            self.skipTest('aiosmtplib não instalado')
+        
+        with LocalSMTPSink(handshake_latency=0.05) as sink:
+            with self.settings(
+                EMAIL_BACKEND=async_smtp.SMTP_BACKEND,
+                EMAIL_HOST=sink.host,
+                EMAIL_PORT=sink.port,
+                EMAIL_HOST_USER='',
+                EMAIL_HOST_PASSWORD='',
+                EMAIL_USE_TLS=False,
+            ):
+                results = await asyncio.gather(*[
+                    EmailService.asend_notification(f'user{i}@example.com', 'Async', f'Mensagem {i}')
+                    for i in range(20)
+                ])
+        
+        self.assertTrue(all(success for success, _, _ in results))
+        self.assertEqual(sink.messages, 20)
+        self.assertEqual(await Notification.objects.filter(status='sent').acount(), 20)
+    
+    async def test_aiosmtplib_connections_are_reused(self):
+        """Testa que os envios assíncronos reutilizam os clientes SMTP conectados"""
+        import asyncio
+        from notifications import async_smtp
+        from notifications.smtp_sink import LocalSMTPSink
+        
+        if async_smtp.aiosmtplib is None:
+            self.skipTest('aiosmtplib não instalado')
+        
+        with LocalSMTPSink() as sink:
+            with self.settings(
+                EMAIL_BACKEND=async_smtp.SMTP_BACKEND,
+                EMAIL_HOST=sink.host,
+                EMAIL_PORT=sink.port,
+                EMAIL_HOST_USER='',
+                EMAIL_HOST_PASSWORD='',
+                EMAIL_USE_TLS=False,
+                NOTIFICATIONS_ASYNC_SMTP_CONCURRENCY=3,
+            ):
+                for i in range(3):
+                    await EmailService.asend_notification(f'seq{i}@example.com', 'Async', 'Mensagem')
+                self.assertEqual(sink.connections, 1)
+                
+                await asyncio.gather(*[
+                    EmailService.asend_notification(f'par{i}@example.com', 'Async', 'Mensagem')
+                    for i in range(12)
+                ])
+        
+        self.assertEqual(sink.messages, 15)
+        self.assertLessEqual(sink.connections, 3)
+    
+    def test_transient_aiosmtplib_errors(self):
+        """Testa a classificação das exceções do aiosmtplib"""
+        from notifications.retry import aiosmtplib, is_transient_error
+        
+        if aiosmtplib is None:
+            self.skipTest('aiosmtplib não instalado')
+        
+        self.assertTrue(is_transient_error(aiosmtplib.SMTPResponseException(451, 'Try again')))
+        self.assertTrue(is_transient_error(aiosmtplib.SMTPServerDisconnected('closed')))
+        self.assertFalse(is_transient_error(aiosmtplib.SMTPRecipientsRefused([
+            aiosmtplib.SMTPRecipientRefused(550, 'No such user', 'a@example.com')
+        ])))
+
+
+@override_settings(NOTIFICATIONS_EVENTS_POLL_INTERVAL=0)
+class StatusEventsTest(TransactionTestCase):
+    """Testes para a espera (long-poll) e o stream SSE de status"""
+    
+    def setUp(self):
+        self.pending = Notification.objects.create(
+            recipient_email='espera@example.com', subject='Espera', message='Corpo'
+        )
+        self.sent = Notification.objects.create(
+            recipient_email='enviada@example.com', subject='Enviada', message='Corpo', status='sent'
+        )
+    
+    async def wait_for_subscribers(self):
+        import asyncio
+        from notifications.events import get_broker
+        
+        for _ in range(500):
+            if get_broker().has_subscribers():
+                return
+            await asyncio.sleep(0.01)
+        self.fail('Nenhum cliente inscrito no broker')
+    
+    async def test_wait_returns_when_delivered(self):
+        """Testa que a espera termina quando a notificação é enviada"""
+        import asyncio
+        from asgiref.sync import sync_to_async
+        
+        response = await self.async_client.get(f'/api/notifications/{self.sent.id}/wait/')
+        self.assertEqual(response.json()['status'], 'sent')
+        
+        waiting = asyncio.ensure_future(
+            self.async_client.get(f'/api/notifications/{self.pending.id}/wait/?timeout=10')
+        )
+        await self.wait_for_subscribers()
+        await sync_to_async(EmailService.deliver)(self.pending)
+        
+        response = await asyncio.wait_for(waiting, 5)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['status'], 'sent')
+        self.assertEqual(response.json()['message'], 'Corpo')
+    
+    async def test_wait_timeout_and_validation(self):
+        """Testa o fim da espera sem mudança de status e os erros"""
+        response = await self.async_client.get(f'/api/notifications/{self.pending.id}/wait/?timeout=0.05')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['status'], 'pending')
+        
+        for timeout in ('abc', '-1', '100000'):
+            response = await self.async_client.get(
+                f'/api/notifications/{self.pending.id}/wait/?timeout={timeout}'
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('timeout', response.json()['errors'])
+        
+        response = await self.async_client.get('/api/notifications/999999/wait/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+    
+    async def test_event_stream(self):
+        """Testa o stream SSE: estado inicial, transições e encerramento"""
+        from asgiref.sync import sync_to_async
+        
+        response = await self.async_client.get(
+            f'/api/notifications/events/?ids={self.pending.id},{self.sent.id}&timeout=10'
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        
+        stream = response.streaming_content
+        chunks = [await anext(stream), await anext(stream)]
+        await sync_to_async(EmailService.deliver)(self.pending)
+        async for chunk in stream:
+            chunks.append(chunk)
+        
+        events = [
+            (lines[0].split(': ', 1)[1], json.loads(lines[1].split(': ', 1)[1]))
+            for lines in (chunk.decode().strip().split('\n') for chunk in chunks)
+        ]
+        self.assertEqual([(name, data.get('id'), data.get('status')) for name, data in events], [
+            ('status', self.pending.id, 'pending'),
+            ('status', self.sent.id, 'sent'),
+            ('status', self.pending.id, 'sent'),
+            ('end', None, None),
+        ])
+        self.assertEqual(events[-1][1], {'pending': []})
+    
+    async def test_event_stream_validation(self):
+        """Testa os ids aceitos pelo stream SSE"""
+        for ids in ('', 'a,b', ','.join(str(i) for i in range(1, 200))):
+            response = await self.async_client.get(f'/api/notifications/events/?ids={ids}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('ids', response.json()['errors'])
+    
+    @override_settings(NOTIFICATIONS_EVENTS_POLL_INTERVAL=0.05)
+    async def test_wait_sees_changes_from_other_processes(self):
+        """Testa que a consulta periódica percebe transições sem publicação"""
+        import asyncio
+        from django.utils import timezone
+        
+        waiting = asyncio.ensure_future(
+            self.async_client.get(f'/api/notifications/{self.pending.id}/wait/?timeout=10')
+        )
+        await self.wait_for_subscribers()
+        # Como um worker de outro processo, que não publica no broker local
+        await Notification.objects.filter(pk=self.pending.pk).aupdate(
+            status='failed', error_message='Recusado', updated_at=timezone.now()
+        )
+        
+        response = await asyncio.wait_for(waiting, 5)
+        self.assertEqual(response.json()['status'], 'failed')
+    
+    @override_settings(NOTIFICATIONS_EVENTS_POLL_INTERVAL=0.05)
+    async def test_poll_survives_read_error(self):
+        """Testa que a consulta periódica continua após uma falha de leitura"""
+        import asyncio
+        from django.db import OperationalError
+        from django.utils import timezone
+        from notifications.events import read_events
+        
+        calls = []
+        
+        def flaky_read(ids):
+            calls.append(ids)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return read_events(ids)
+        
+        with mock.patch('notifications.events.read_events', side_effect=flaky_read):
+            with self.assertLogs('notifications.events', level='ERROR'):
+                waiting = asyncio.ensure_future(
+                    self.async_client.get(f'/api/notifications/{self.pending.id}/wait/?timeout=10')
+                )
+                await self.wait_for_subscribers()
+                for _ in range(500):
+                    if calls:
+                        break
+                    await asyncio.sleep(0.01)
+            await Notification.objects.filter(pk=self.pending.pk).aupdate(
+                status='failed', error_message='Recusado', updated_at=timezone.now()
+            )
+            
+            response = await asyncio.wait_for(waiting, 5)
+        self.assertEqual(response.json()['status'], 'failed')
+        self.assertGreater(len(calls), 1)
+
+
+@override_settings(NOTIFICATIONS_METRICS_ENABLED=True)
+class MetricsTest(APITestCase):
+    """Testes para a instrumentação e o endpoint /metrics"""
+    
+    def setUp(self):
+        from notifications.metrics import reset_registry
+        from notifications.smtp_pool import reset_pool
+        
+        reset_registry()
+        reset_pool()
+    
+    def scrape(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if line and not line.startswith('#'):
+                name, value = line.rsplit(' ', 1)
+                samples[name] = float(value)
+        return samples
+    
+    def test_send_records_stages_outcomes_and_queries(self):
+        """Testa as etapas, os resultados e as consultas de um envio"""
+        data = {'recipient_email': 'metricas@example.com', 'subject': 'Métricas', 'message': 'Corpo'}
+        self.client.post('/api/notifications/send/', data, format='json')
+        self.client.post('/api/notifications/send/', data, format='json')
+        
+        samples = self.scrape()
+        for stage in ('dedup', 'body', 'insert', 'smtp_connect', 'smtp_data', 'update'):
+            self.assertGreaterEqual(samples[f'notifications_stage_duration_seconds_count{{stage="{stage}"}}'], 1)
+        self.assertEqual(samples['notifications_deliveries_total{outcome="sent",domain="example.com"}'], 1)
+        self.assertEqual(samples['notifications_deliveries_total{outcome="duplicate",domain="example.com"}'], 1)
+        
+        labels = 'view="notification-send",method="POST"'
+        self.assertEqual(samples[f'notifications_http_request_db_queries_count{{{labels}}}'], 2)
+        self.assertGreater(samples[f'notifications_http_request_db_queries_sum{{{labels}}}'], 0)
+        self.assertEqual(samples[f'notifications_http_request_db_queries_bucket{{{labels},le="+Inf"}}'], 2)
+        self.assertEqual(samples['notifications_status{status="sent"}'], 1)
+    
+    def test_queue_depth(self):
+        """Testa a profundidade da fila por faixa de prioridade"""
+        from django.utils import timezone
+        
+        Notification.objects.create(recipient_email='a@example.com', subject='A', message='A', priority='high')
+        Notification.objects.create(
+            recipient_email='b@example.com', subject='B', message='B',
+            next_attempt_at=timezone.now() + timedelta(hours=1)
+        )
+        
+        samples = self.scrape()
+        self.assertEqual(samples['notifications_queue_depth{priority="high",state="due"}'], 1)
+        self.assertEqual(samples['notifications_queue_depth{priority="normal",state="scheduled"}'], 1)
+        self.assertEqual(samples['notifications_queue_depth{priority="low",state="due"}'], 0)
+    
+    @override_settings(NOTIFICATIONS_METRICS_MAX_DOMAINS=1)
+    def test_domain_series_are_capped(self):
+        """Testa que os domínios além do limite são agrupados em other"""
+        from notifications.metrics import record_outcome
+        
+        record_outcome('a@example.com', 'sent')
+        record_outcome('b@example.org', 'sent')
+        record_outcome('c@EXAMPLE.com', 'sent')
+        
+        samples = self.scrape()
+        self.assertEqual(samples['notifications_deliveries_total{outcome="sent",domain="example.com"}'], 2)
+        self.assertEqual(samples['notifications_deliveries_total{outcome="sent",domain="other"}'], 1)
+    
+    @override_settings(NOTIFICATIONS_METRICS_ENABLED=False)
+    def test_disabled(self):
+        """Testa que, desativadas, as métricas não são registradas nem expostas"""
+        from notifications.metrics import get_registry
+        
+        self.client.post('/api/notifications/send/', {
+            'recipient_email': 'off@example.com', 'subject': 'Off', 'message': 'Corpo'
+        }, format='json')
+        
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual([line for line in get_registry().render() if not line.startswith('#')], [])
+
+
+class NotificationTemplateTest(APITestCase):
+    """Testes para as notificações geradas por template"""
+    
+    def setUp(self):
+        from notifications.templating import template_cache
+        
+        template_cache.clear()
+        self.template = NotificationTemplate.objects.create(
+            name='password-reset',
+            subject='Redefinição de senha, {{ nome }}',
+            body='Olá, {{ nome }}!\n\nSeu código é {{ codigo }}.'
+        )
+    
+    def send(self, context, **extra):
+        return self.client.post('/api/notifications/send/', {
+            'recipient_email': 'ana@example.com',
+            'template_id': self.template.id,
+            'context': context,
+            **extra
+        }, format='json')
+    
+    def test_send_with_template(self):
+        """Testa o envio renderizado a partir do template e do contexto"""
+        response = self.send({'nome': 'Ana', 'codigo': '123456'})
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(mail.outbox[0].subject, 'Redefinição de senha, Ana')
+        self.assertEqual(mail.outbox[0].body, 'Olá, Ana!\n\nSeu código é 123456.')
+        
+        # A linha guarda a referência e o contexto, não o corpo renderizado
+        notification = Notification.objects.get()
+        self.assertEqual(notification.message, '')
+        self.assertEqual(notification.template, self.template)
+        self.assertEqual(notification.context, {'nome': 'Ana', 'codigo': '123456'})
+        
+        response = self.client.get(f'/api/notifications/{notification.id}/')
+        self.assertEqual(response.data['message'], 'Olá, Ana!\n\nSeu código é 123456.')
+    
+    def test_duplicate_detection_uses_rendered_content(self):
+        """Testa a deduplicação pelo conteúdo renderizado"""
+        first = self.send({'nome': 'Ana', 'codigo': '1'})
+        second = self.send({'codigo': '1', 'nome': 'Ana'})
+        other = self.send({'nome': 'Ana', 'codigo': '2'})
+        
+        self.assertEqual(first.data['notification']['id'], second.data['notification']['id'])
+        self.assertNotEqual(first.data['notification']['id'], other.data['notification']['id'])
+        self.assertEqual(len(mail.outbox), 2)
+    
+    def test_validation(self):
+        """Testa as combinações inválidas de template e conteúdo"""
+        response = self.send({'nome': 'Ana'}, subject='Assunto')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('template_id', response.data['errors'])
+        
+        response = self.client.post('/api/notifications/send/', {
+            'recipient_email': 'ana@example.com', 'template_id': 999
+        }, format='json')
+        self.assertIn('template_id', response.data['errors'])
+        
+        response = self.client.post('/api/notifications/send/', {
+            'recipient_email': 'ana@example.com'
+        }, format='json')
+        self.assertEqual(set(response.data['errors']), {'subject', 'message'})
+        
+        response = self.client.post('/api/templates/', {
+            'name': 'quebrado', 'subject': 'Oi', 'body': '{% if %}'
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('body', response.data)
+    
+    def test_compiled_template_cache(self):
+        """Testa que o template é compilado uma vez e recompilado após edição"""
+        from notifications.templating import template_cache
+        
+        for code in range(3):
+            self.send({'nome': 'Ana', 'codigo': code})
+        self.assertEqual((template_cache.misses, template_cache.hits), (1, 2))
+        
+        response = self.client.patch(f'/api/templates/{self.template.id}/', {
+            'body': 'Oi, {{ nome }}. Código: {{ codigo }}'
+        }, format='json')
+        self.assertEqual(response.data['version'], 2)
+        
+        self.send({'nome': 'Ana', 'codigo': 'novo'})
+        self.assertEqual(mail.outbox[-1].body, 'Oi, Ana. Código: novo')
+        self.assertEqual(template_cache.misses, 2)
+    
+    def test_batch_and_queue_with_template(self):
+        """Testa o lote com templates e a entrega de notificações enfileiradas"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        items = [
+            {'recipient_email': f'user{i}@example.com', 'template_id': self.template.id,
+             'context': {'nome': f'Usuário {i}', 'codigo': i}}
+            for i in range(10)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/notifications/send-batch/?mode=queue', items, format='json')
+        
+        self.assertEqual(response.data['created'], 10)
+        template_queries = [q for q in queries.captured_queries if 'notificationtemplate' in q['sql']]
+        self.assertEqual(len(template_queries), 1)
+        
+        for notification in EmailService.claim_pending(10):
+            EmailService.deliver(notification)
+        self.assertEqual(
+            sorted(message.body for message in mail.outbox)[0],
+            'Olá, Usuário 0!\n\nSeu código é 0.'
+        )
+    
+    def test_template_edit_keeps_existing_bodies(self):
+        """Testa que editar o template não altera o corpo das notificações já geradas"""
+        from notifications.templating import template_cache
+        
+        sent = self.send({'nome': 'Ana', 'codigo': '1'}).data['notification']
+        queued = self.client.post('/api/notifications/send-batch/?mode=queue', [
+            {'recipient_email': 'fila@example.com', 'template_id': self.template.id, 'context': {'nome': 'Bia', 'codigo': '2'}}
+        ], format='json').data['results'][0]
+        self.client.patch(f'/api/templates/{self.template.id}/', {
+            'body': 'Oi, {{ nome }}. Código: {{ codigo }}'
+        }, format='json')
+        template_cache.clear()
+        
+        response = self.client.get(f"/api/notifications/{sent['id']}/")
+        self.assertEqual(response.data['message'], 'Olá, Ana!\n\nSeu código é 1.')
+        self.assertEqual(response.data['template_version'], 1)
+        
+        for notification in EmailService.claim_pending(10):
+            EmailService.deliver(notification)
+        self.assertEqual(mail.outbox[-1].body, 'Olá, Bia!\n\nSeu código é 2.')
+        self.assertEqual(Notification.objects.get(pk=queued['id']).template_version, 1)
+        
+        self.send({'nome': 'Ana', 'codigo': '3'})
+        self.assertEqual(mail.outbox[-1].body, 'Oi, Ana. Código: 3')
+        self.assertEqual(
+            list(self.template.versions.order_by('version').values_list('version', flat=True)), [1, 2]
+        )
+    
+    def test_template_in_use_cannot_be_deleted(self):
+        """Testa que templates referenciados por notificações são protegidos"""
+        self.send({'nome': 'Ana', 'codigo': '1'})
+        
+        response = self.client.delete(f'/api/templates/{self.template.id}/')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(NotificationTemplate.objects.exists())
+
+
+class MessageBodyTest(APITestCase):
+    """Testa o armazenamento dos corpos de mensagem por conteúdo"""
+    
+    BODY = '<html>' + 'Oferta da semana para você. ' * 200 + '</html>'
+    
+    def test_batch_stores_each_body_once(self):
+        """Testa que o mesmo corpo enviado a vários destinatários é gravado uma vez"""
+        payload = [
+            {'recipient_email': f'user{i}@example.com', 'subject': 'Campanha', 'message': self.BODY}
+            for i in range(20)
+        ]
+        
+        response = self.client.post('/api/notifications/send-batch/', payload, format='json')
+        self.client.post('/api/notifications/send/', {
+            'recipient_email': 'outro@example.com', 'subject': 'Campanha', 'message': self.BODY
+        }, format='json')
+        
+        self.assertEqual(response.data['created'], 20)
+        self.assertEqual(MessageBody.objects.count(), 1)
+        self.assertEqual(
+            Notification.objects.values('message_body').distinct().count(), 1
+        )
+        self.assertEqual({message.body for message in mail.outbox}, {self.BODY})
+    
+    def test_large_bodies_are_compressed(self):
+        """Testa a compressão dos corpos grandes e a leitura de volta"""
+        large = MessageBody.objects.intern(self.BODY)
+        small = MessageBody.objects.intern('Mensagem curta')
+        
+        large = MessageBody.objects.get(pk=large.pk)
+        self.assertTrue(large.compressed)
+        self.assertLess(len(bytes(large.data)), large.size)
+        self.assertEqual(large.text, self.BODY)
+        self.assertFalse(MessageBody.objects.get(pk=small.pk).compressed)
+        
+        with override_settings(NOTIFICATIONS_BODY_COMPRESSION_THRESHOLD=0):
+            body = MessageBody.objects.intern(self.BODY + '!')
+        self.assertFalse(body.compressed)
+    
+    def test_api_contract_is_unchanged(self):
+        """Testa que a API continua recebendo e devolvendo o campo message"""
+        response = self.client.post('/api/notifications/', {
+            'recipient_email': 'api@example.com', 'subject': 'API', 'message': self.BODY
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['message'], self.BODY)
+        
+        response = self.client.get(f"/api/notifications/{response.data['id']}/")
+        self.assertEqual(response.data['message'], self.BODY)
+        
+        response = self.client.get('/api/notifications/?fields=id,message')
+        self.assertEqual(response.data['results'][0]['message'], self.BODY)
+    
+    def test_intern_bodies_before_bulk_create(self):
+        """Testa que intern_bodies grava cada corpo uma vez e preenche message_body"""
+        notifications = [
+            Notification(recipient_email=f'user{i}@example.com', subject='Lote', message=message)
+            for i, message in enumerate([self.BODY, self.BODY, 'Outro corpo', ''])
+        ]
+        
+        with self.assertNumQueries(3):
+            Notification.objects.intern_bodies(notifications)
+        
+        self.assertEqual(MessageBody.objects.count(), 2)
+        self.assertEqual(notifications[0].message_body_id, notifications[1].message_body_id)
+        self.assertIsNone(notifications[3].message_body)
+        self.assertEqual([n.message for n in notifications], [self.BODY, self.BODY, 'Outro corpo', ''])
+    
+    def test_delete_removes_unreferenced_bodies(self):
+        """Testa que o corpo é removido junto com a última notificação que o usa"""
+        first = Notification.objects.create(recipient_email='a@example.com', subject='A', message='Corpo')
+        second = Notification.objects.create(recipient_email='b@example.com', subject='B', message='Corpo')
+        self.assertEqual(first.message_body_id, second.message_body_id)
+        
+        first.delete()
+        self.assertEqual(MessageBody.objects.count(), 1)
+        second.delete()
+        self.assertFalse(MessageBody.objects.exists())
+
+
+class RetentionTest(TestCase):
+    """Testa a remoção do histórico fora do período de retenção"""
+    
+    def setUp(self):
+        from django.utils import timezone
+        
+        now = timezone.now()
+        rows = [
+            ('sent', 100), ('sent', 95), ('sent', 10),
+            ('failed', 40), ('failed', 5),
+            ('pending', 200),
+        ]
+        for i, (notification_status, days) in enumerate(rows):
+            notification = Notification.objects.create(
+                recipient_email=f'user{i}@example.com',
+                subject=f'Retenção {i}',
+                message='Corpo compartilhado' if i < 2 else f'Mensagem {i}',
+                status=notification_status
+            )
+            Notification.objects.filter(pk=notification.pk).update(created_at=now - timedelta(days=days))
+        NotificationCounter.objects.rebuild()
+    
+    def test_purge_removes_expired_rows_in_batches(self):
+        """Testa a remoção em lotes, com contadores e corpos ajustados"""
+        out = StringIO()
+        call_command('purge_notifications', '--batch-size', '1', stdout=out)
+        
+        self.assertEqual(
+            sorted(Notification.objects.values_list('subject', flat=True)),
+            ['Retenção 2', 'Retenção 4', 'Retenção 5']
+        )
+        self.assertEqual(NotificationCounter.objects.check_consistency(), [])
+        self.assertFalse(MessageBody.objects.filter(notifications__isnull=True).exists())
+        self.assertIn('sent: 2 notificação(ões) removida(s)', out.getvalue())
+        self.assertIn('failed: 1 notificação(ões) removida(s)', out.getvalue())
+    
+    def test_purge_archives_rows_before_deleting(self):
+        """Testa o arquivamento em JSONL comprimido"""
+        import gzip
+        import os
+        import tempfile
+        
+        with tempfile.TemporaryDirectory() as directory:
+            call_command(
+                'purge_notifications', '--failed-days', '0', '--archive-dir', directory,
+                stdout=StringIO()
+            )
+            (filename,) = os.listdir(directory)
+            with gzip.open(os.path.join(directory, filename), 'rt', encoding='utf-8') as archive:
+                records = [json.loads(line) for line in archive]
+        
+        self.assertTrue(filename.startswith('notifications-sent-'))
+        self.assertEqual([record['subject'] for record in records], ['Retenção 0', 'Retenção 1'])
+        self.assertEqual(records[0]['message'], 'Corpo compartilhado')
+        self.assertEqual(Notification.objects.filter(status='failed').count(), 2)
+    
+    def test_dry_run_keeps_rows(self):
+        """Testa que --dry-run apenas conta as notificações"""
+        out = StringIO()
+        call_command('purge_notifications', '--dry-run', '--sent-days', '7', stdout=out)
+        
+        self.assertIn('sent: 3 notificação(ões)', out.getvalue())
+        self.assertEqual(Notification.objects.count(), 6)
+    
+    def test_purge_keeps_rows_whose_status_changed(self):
+        """Testa que notificações reenfileiradas durante a remoção são mantidas"""
+        from notifications.retention import purge_batch, retention_cutoffs
+        
+        before = retention_cutoffs()['failed']
+        original_filter = Notification.objects.filter
+        
+        def requeue_then_filter(*args, **kwargs):
+            if 'id__in' in kwargs:
+                Notification.objects.update(status='pending')
+            return original_filter(*args, **kwargs)
+        
+        with mock.patch.object(Notification.objects, 'filter', requeue_then_filter):
+            selected, deleted = purge_batch('failed', before)
+        
+        self.assertEqual((selected, deleted), (1, 0))
+        self.assertEqual(Notification.objects.count(), 6)
+
+
+class ExportTest(APITestCase):
+    """Testa a exportação do histórico de notificações"""
+    
+    def setUp(self):
+        self.template = NotificationTemplate.objects.create(
+            name='aviso', subject='Aviso', body='Olá, {{ nome }}!'
+        )
+        for i in range(5):
+            Notification.objects.create(
+                recipient_email=f'user{i}@example.com',
+                subject=f'Exportação {i}',
+                message='Corpo, com "aspas"\ne quebra de linha',
+                status='sent' if i % 2 else 'failed'
+            )
+        Notification.objects.create(
+            recipient_email='template@example.com', subject='Aviso',
+            template=self.template, context={'nome': 'Ana'}, status='sent'
+        )
+    
+    def export(self, query='', **extra):
+        response = self.client.get(f'/api/notifications/export/{query}', **extra)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+    
+    def test_export_jsonl(self):
+        """Testa a exportação em JSONL com os filtros da listagem"""
+        response, content = self.export('?format=jsonl&status=sent')
+        records = [json.loads(line) for line in content.decode('utf-8').splitlines()]
+        
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0]['message'], 'Olá, Ana!')
+        self.assertEqual(records[1]['message'], 'Corpo, com "aspas"\ne quebra de linha')
+        self.assertEqual(set(records[0]), set(NotificationSerializer.Meta.fields))
+    
+    def test_export_csv(self):
+        """Testa a exportação em CSV, com cabeçalho e campos escolhidos"""
+        import csv
+        
+        response, content = self.export('?format=csv&fields=recipient_email,message')
+        rows = list(csv.reader(StringIO(content.decode('utf-8'))))
+        
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="notifications.csv"')
+        self.assertEqual(rows[0], ['id', 'recipient_email', 'message'])
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[2][1:], ['user4@example.com', 'Corpo, com "aspas"\ne quebra de linha'])
+    
+    def test_export_gzip_and_period(self):
+        """Testa a compressão gzip e o filtro por período"""
+        import gzip
+        from django.utils import timezone
+        
+        old = Notification.objects.get(recipient_email='user0@example.com')
+        Notification.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=10))
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+        
+        response, content = self.export(f'?since={since}', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        lines = gzip.decompress(content).decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertNotIn('user0@example.com', ''.join(lines))
+    
+    @override_settings(NOTIFICATIONS_EXPORT_CHUNK_SIZE=2)
+    def test_export_reads_in_chunks(self):
+        """Testa que a exportação lê o banco em blocos, com os corpos pré-carregados"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as queries:
+            _, content = self.export()
+        
+        self.assertEqual(len(content.splitlines()), 6)
+        # Uma consulta de notificações, lida do cursor em 3 blocos, e uma
+        # consulta de corpos por bloco
+        self.assertEqual(len(queries), 4)
+    
+    def test_export_invalid_parameters(self):
+        """Testa os erros de formato e de período"""
+        response = self.client.get('/api/notifications/export/?since=ontem')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('since', json.loads(response.content)['errors'])
+        
+        response = self.client.get('/api/notifications/export/?format=xml')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BulkActionTest(APITestCase):
+    """Testa as ações em conjunto da API e do admin"""
+    
+    def setUp(self):
+        rows = [
+            ('a@example.com', 'Repetida', 'failed'),
+            ('a@example.com', 'Repetida', 'failed'),
+            ('b@example.com', 'Já reenviada', 'failed'),
+            ('b@example.com', 'Já reenviada', 'sent'),
+            ('c@example.com', 'Única', 'failed'),
+            ('d@example.com', 'Enviada', 'sent'),
+        ]
+        self.notifications = [
+            Notification.objects.create(
+                recipient_email=email, subject=subject, message=f'Corpo {subject}',
+                status=notification_status, error_message='Erro' if notification_status == 'failed' else None
+            )
+            for email, subject, notification_status in rows
+        ]
+    
+    @override_settings(NOTIFICATIONS_BULK_CHUNK_SIZE=2)
+    def test_bulk_delete_by_filter(self):
+        """Testa a remoção em conjunto por filtro, em blocos"""
+        response = self.client.post('/api/notifications/bulk-delete/', {'status': 'failed'}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['deleted'], 4)
+        self.assertFalse(Notification.objects.filter(status='failed').exists())
+        self.assertEqual(NotificationCounter.objects.check_consistency(), [])
+        self.assertEqual(MessageBody.objects.count(), 2)
+    
+    def test_bulk_delete_by_ids(self):
+        """Testa a remoção em conjunto por lista de ids combinada com filtro"""
+        ids = [notification.id for notification in self.notifications[2:]]
+        
+        # Leitura do bloco, um DELETE por status, um UPDATE dos contadores
+        # do dia e da hora, um DELETE dos corpos não usados e o savepoint
+        with self.assertNumQueries(7):
+            response = self.client.post(
+                '/api/notifications/bulk-delete/', {'ids': ids, 'recipient_email': 'B@example.com'},
+                format='json'
+            )
+        
+        self.assertEqual(response.data['deleted'], 2)
+        self.assertEqual(Notification.objects.count(), 4)
+    
+    def test_bulk_action_requires_criteria(self):
+        """Testa que uma requisição sem critérios é rejeitada"""
+        response = self.client.post('/api/notifications/bulk-delete/', {}, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(response.data['success'])
+        self.assertEqual(Notification.objects.count(), 6)
+    
+    def test_bulk_requeue(self):
+        """Testa o reenfileiramento, ignorando conteúdos já reservados"""
+        response = self.client.post(
+            '/api/notifications/bulk-requeue/', {'since': '2000-01-01'}, format='json'
+        )
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['requeued'], response.data['skipped']), (2, 2))
+        pending = Notification.objects.filter(status='pending').order_by('id')
+        self.assertEqual(
+            [n.id for n in pending], [self.notifications[0].id, self.notifications[4].id]
+        )
+        self.assertTrue(all(n.attempts == 0 and n.error_message is None for n in pending))
+        self.assertEqual(NotificationCounter.objects.check_consistency(), [])
+        
+        for notification in EmailService.claim_pending(10):
+            EmailService.deliver(notification)
+        self.assertEqual(len(mail.outbox), 2)
+    
+    def test_admin_actions(self):
+        """Testa as ações do admin, que substituem a remoção padrão"""
+        from django.contrib.auth.models import User
+        
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'senha'))
+        url = '/admin/notifications/notification/'
+        
+        response = self.client.get(url)
+        actions = [name for name, _ in response.context['action_form'].fields['action'].choices]
+        self.assertIn('delete_notifications', actions)
+        self.assertNotIn('delete_selected', actions)
+        
+        selected = [self.notifications[4].id]
+        self.client.post(url, {'action': 'requeue_notifications', '_selected_action': selected})
+        self.assertEqual(Notification.objects.get(id=selected[0]).status, 'pending')
+        
+        selected = [n.id for n in self.notifications[:2]]
+        self.client.post(url, {'action': 'delete_notifications', '_selected_action': selected})
+        self.assertEqual(Notification.objects.count(), 4)
+        self.assertEqual(NotificationCounter.objects.check_consistency(), [])
+
+
+class AdminChangelistTest(TestCase):
+    """Testa a listagem de notificações do admin em tabelas grandes"""
+    
+    URL = '/admin/notifications/notification/'
+    
+    def setUp(self):
+        from django.contrib.auth.models import User
+        
+        for i in range(5):
+            Notification.objects.create(
+                recipient_email=f'user{i}@example.com', subject=f'Admin {i}', message=f'Corpo {i}',
+                status='sent' if i < 3 else 'failed', priority='high' if i == 0 else 'normal',
+                error_message='x' * 1000
+            )
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'senha'))
+    
+    def changelist(self, params=None):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.URL, params or {})
+        self.assertEqual(response.status_code, 200)
+        notification_queries = [
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "notifications_notification"' in query['sql']
+        ]
+        return response, notification_queries
+    
+    def test_count_comes_from_counters(self):
+        """Testa que a listagem sem filtros ou por status não conta a tabela"""
+        response, queries = self.changelist()
+        self.assertEqual(response.context['cl'].result_count, 5)
+        self.assertFalse([sql for sql in queries if 'COUNT(' in sql])
+        
+        response, queries = self.changelist({'status__exact': 'failed'})
+        self.assertEqual(response.context['cl'].result_count, 2)
+        self.assertFalse([sql for sql in queries if 'COUNT(' in sql])
+    
+    def test_other_filters_use_bounded_count(self):
+        """Testa a contagem limitada dos demais filtros"""
+        response, queries = self.changelist({'priority__exact': 'high'})
+        
+        self.assertEqual(response.context['cl'].result_count, 1)
+        (count_sql,) = [sql for sql in queries if 'COUNT(' in sql]
+        self.assertIn('LIMIT 10000', count_sql)
+    
+    def test_changelist_defers_long_fields(self):
+        """Testa que a listagem não lê os campos de texto longos"""
+        _, queries = self.changelist()
+        
+        (select_sql,) = [sql for sql in queries if sql.startswith('SELECT "notifications_notification"."id"')]
+        self.assertNotIn('error_message', select_sql)
+        self.assertNotIn('"context"', select_sql)
+        self.assertIn('ORDER BY "notifications_notification"."created_at" DESC', select_sql)
+    
+    def test_search_is_exact(self):
+        """Testa a busca exata por email ou id"""
+        response, _ = self.changelist({'q': 'USER1@example.com'})
+        self.assertEqual([n.subject for n in response.context['cl'].result_list], ['Admin 1'])
+        
+        notification = Notification.objects.get(subject='Admin 3')
+        response, _ = self.changelist({'q': str(notification.pk)})
+        self.assertEqual(list(response.context['cl'].result_list), [notification])
+        
+        response, _ = self.changelist({'q': 'user'})
+        self.assertEqual(len(response.context['cl'].result_list), 0)
+
+
+@override_settings(NOTIFICATIONS_RESPONSE_CACHE_TIMEOUT=60)
+class ResponseCacheTest(APITestCase):
+    """Testa o cache das respostas de leitura e sua invalidação"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        
+        cache.clear()
+        self.notification = Notification.objects.create(
+            recipient_email='cache@example.com', subject='Cache', message='Corpo', status='sent'
+        )
+    
+    def test_repeated_reads_hit_the_cache(self):
+        """Testa que leituras repetidas não consultam o banco"""
+        for url in ('/api/notifications/', f'/api/notifications/{self.notification.id}/',
+                    '/api/notifications/statistics/'):
+            first = self.client.get(url)
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(second.data, first.data)
+            self.assertEqual(second['ETag'], first['ETag'])
+    
+    def test_if_none_match_returns_304(self):
+        """Testa a resposta 304 para um ETag ainda válido"""
+        etag = self.client.get('/api/notifications/').headers['ETag']
+        
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag)
+        
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+    
+    def test_key_covers_filters_and_page(self):
+        """Testa que filtros e página diferentes têm entradas diferentes"""
+        sent = self.client.get('/api/notifications/?status=sent')
+        failed = self.client.get('/api/notifications/?status=failed')
+        page = self.client.get('/api/notifications/?status=sent&page_size=1')
+        
+        self.assertEqual(sent.data['count'], 1)
+        self.assertEqual(failed.data['count'], 0)
+        self.assertEqual(len({sent['ETag'], failed['ETag'], page['ETag']}), 3)
+    
+    def test_writes_invalidate_cached_responses(self):
+        """Testa a invalidação por envios e remoções"""
+        etag = self.client.get('/api/notifications/statistics/').headers['ETag']
+        
+        self.client.post('/api/notifications/send/', {
+            'recipient_email': 'novo@example.com', 'subject': 'Novo', 'message': 'Corpo novo'
+        }, format='json')
+        response = self.client.get('/api/notifications/statistics/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['sent'], 2)
+        
+        self.client.delete(f'/api/notifications/{self.notification.id}/')
+        self.assertEqual(self.client.get('/api/notifications/statistics/').data['total'], 1)
+        
+        self.client.post('/api/notifications/bulk-delete/', {'status': 'sent'}, format='json')
+        self.assertEqual(self.client.get('/api/notifications/').data['count'], 0)
+    
+    @override_settings(NOTIFICATIONS_RESPONSE_CACHE_TIMEOUT=0)
+    def test_cache_can_be_disabled(self):
+        """Testa que o cache de respostas pode ser desativado"""
+        response = self.client.get('/api/notifications/statistics/')
+        
+        self.assertNotIn('ETag', response)
+        # Validadores (updated_at e contadores), COUNT(*) e a página
+        with self.assertNumQueries(4):
+            self.client.get('/api/notifications/')
+
+
+@override_settings(NOTIFICATIONS_RESPONSE_CACHE_TIMEOUT=0)
+class ConditionalGetTest(APITestCase):
+    """Testa as requisições condicionais (ETag e Last-Modified)"""
+    
+    def setUp(self):
+        self.notification = Notification.objects.create(
+            recipient_email='condicional@example.com', subject='Condicional', message='Corpo', status='sent'
+        )
+        self.url = f'/api/notifications/{self.notification.id}/'
+    
+    def test_updated_at_changes_on_save(self):
+        """Testa que updated_at acompanha as alterações da notificação"""
+        updated_at = self.notification.updated_at
+        self.notification.status = 'failed'
+        self.notification.save()
+        
+        self.assertGreater(self.notification.updated_at, updated_at)
+        self.assertIn('updated_at', self.client.get(self.url).data)
+    
+    def test_detail_not_modified_without_serializing(self):
+        """Testa o 304 dos detalhes com uma única consulta e sem serializar"""
+        from django.utils import timezone
+        
+        Notification.objects.filter(pk=self.notification.pk).update(
+            updated_at=timezone.now() - timedelta(minutes=1)
+        )
+        response = self.client.get(self.url)
+        self.assertIn('Last-Modified', response)
+        
+        with mock.patch.object(NotificationSerializer, 'to_representation') as to_representation:
+            with self.assertNumQueries(1):
+                not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(not_modified['ETag'], response['ETag'])
+            
+            not_modified = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        to_representation.assert_not_called()
+    
+    def test_detail_changes_with_the_row(self):
+        """Testa que alterações da notificação mudam o ETag dos detalhes"""
+        etag = self.client.get(self.url)['ETag']
+        self.notification.status = 'failed'
+        self.notification.save()
+        
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'failed')
+        self.assertNotEqual(response['ETag'], etag)
+    
+    def test_detail_changed_within_the_same_second(self):
+        """Testa que uma alteração no mesmo segundo da leitura não responde 304 a If-Modified-Since"""
+        from django.utils.http import http_date
+        
+        second = datetime(2026, 10, 17, 12, 0, 0, tzinfo=dt_timezone.utc)
+        Notification.objects.filter(pk=self.notification.pk).update(
+            updated_at=second + timedelta(milliseconds=200)
+        )
+        with mock.patch('notifications.caching.timezone.now', return_value=second + timedelta(milliseconds=500)):
+            response = self.client.get(self.url)
+            self.assertNotIn('Last-Modified', response)
+            
+            # A notificação muda no mesmo segundo da leitura
+            Notification.objects.filter(pk=self.notification.pk).update(
+                status='failed', updated_at=second + timedelta(milliseconds=700)
+            )
+            response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=http_date(second.timestamp()))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['status'], 'failed')
+        
+        # Terminado o segundo, Last-Modified volta e a próxima alteração já cai em outro segundo
+        with mock.patch('notifications.caching.timezone.now', return_value=second + timedelta(seconds=1)):
+            response = self.client.get(self.url)
+            self.assertEqual(response['Last-Modified'], http_date(second.timestamp()))
+            not_modified = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+    
+    def test_list_not_modified_until_rows_change(self):
+        """Testa o 304 da listagem e sua invalidação por envios, reenvios e remoções"""
+        url = '/api/notifications/?status=failed'
+        failed = Notification.objects.create(
+            recipient_email='falha@example.com', subject='Falha', message='Corpo', status='failed'
+        )
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        
+        # Requeue altera as linhas com um UPDATE em massa
+        Notification.objects.bulk_requeue(Notification.objects.filter(pk=failed.pk))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 0)
+        
+        etag = self.client.get('/api/notifications/')['ETag']
+        Notification.objects.bulk_delete(Notification.objects.filter(pk=failed.pk))
+        response = self.client.get('/api/notifications/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+    
+    def test_list_has_no_last_modified(self):
+        """Testa que a listagem não responde 304 a If-Modified-Since após uma remoção"""
+        from django.utils import timezone
+        from django.utils.http import http_date
+        
+        other = Notification.objects.create(
+            recipient_email='removida@example.com', subject='Removida', message='Corpo', status='sent'
+        )
+        response = self.client.get('/api/notifications/')
+        self.assertNotIn('Last-Modified', response)
+        
+        other.delete()
+        response = self.client.get(
+            '/api/notifications/', HTTP_IF_MODIFIED_SINCE=http_date(timezone.now().timestamp() + 60)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+    
+    def test_etag_depends_on_query(self):
+        """Testa que filtros e página diferentes têm ETags diferentes"""
+        etags = {
+            self.client.get(url)['ETag']
+            for url in ('/api/notifications/', '/api/notifications/?page_size=1',
+                        '/api/notifications/?status=sent', '/api/notifications/?fields=all')
+        }
+        self.assertEqual(len(etags), 4)
+    
+    @override_settings(NOTIFICATIONS_RESPONSE_CACHE_TIMEOUT=60)
+    def test_etag_survives_unrelated_cache_invalidation(self):
+        """Testa que o ETag dos detalhes não muda com alterações de outras notificações"""
+        from django.core.cache import cache
+        
+        cache.clear()
+        etag = self.client.get(self.url)['ETag']
+        Notification.objects.create(recipient_email='outra@example.com', subject='Outra', message='Corpo')
+        
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class SlimListTest(APITestCase):
+    """Testes para a listagem resumida, sem o corpo das mensagens"""
+    
+    def setUp(self):
+        self.notification = Notification.objects.create(
+            recipient_email='teste@example.com',
+            subject='Teste',
+            message='<html>' + 'x' * 10000 + '</html>',
+            status='failed',
+            error_message='Falha ao enviar'
+        )
+    
+    def test_list_omits_text_columns(self):
+        """Testa que a listagem padrão não carrega nem retorna message/error_message"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/notifications/')
+        
+        item = response.data['results'][0]
+        self.assertEqual(set(item), set(NotificationSerializer.LIST_FIELDS))
+        select = [q['sql'] for q in queries.captured_queries if 'LIMIT' in q['sql']][0]
+        self.assertNotIn('"message"', select)
+        self.assertNotIn('"error_message"', select)
+    
+    def test_detail_keeps_full_body(self):
+        """Testa que os detalhes continuam retornando todos os campos"""
+        response = self.client.get(f'/api/notifications/{self.notification.id}/')
+        
+        self.assertEqual(response.data['message'], self.notification.message)
+        self.assertEqual(response.data['error_message'], 'Falha ao enviar')
+    
+    def test_list_fields_param(self):
+        """Testa a escolha dos campos da listagem com ?fields="""
+        response = self.client.get('/api/notifications/?fields=status,message')
+        self.assertEqual(set(response.data['results'][0]), {'id', 'status', 'message'})
+        
+        response = self.client.get('/api/notifications/?fields=all')
+        self.assertIn('error_message', response.data['results'][0])
+        
+        response = self.client.get('/api/notifications/?fields=status,senha')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', response.data)
+
+
+class BenchmarkAPITest(TestCase):
+    """Testes para os cálculos e a comparação do comando benchmark_api"""
+    
+    def result(self, rps=100.0, p95=10.0, queries=2.0):
+        return {
+            'sequential_rps_median': rps, 'p95_ms_median': p95, 'queries_mean': queries,
+        }
+    
+    def test_percentile_nearest_rank(self):
+        """Testa o percentil pela posição mais próxima (ceil(q * n) - 1)"""
+        from notifications.management.commands.benchmark_api import percentile
+        
+        values = list(range(1, 21))
+        self.assertEqual(percentile(values, 0.95), 19)
+        self.assertEqual(percentile(values, 0.50), 10)
+        self.assertEqual(percentile(values, 1.0), 20)
+        self.assertEqual(percentile(values, 0.0), 1)
+        self.assertEqual(percentile([1, 2, 3, 4], 0.5), 2)
+        # Quando quantile * n é inteiro, o percentil é a própria amostra
+        # dessa posição, e não a seguinte
+        self.assertEqual(percentile(list(range(1, 11)), 0.1), 1)
+        self.assertEqual(percentile(list(range(1, 11)), 0.3), 3)
+        self.assertIsNone(percentile([], 0.5))
+    
+    def test_summarize_rounds(self):
+        """Testa o resumo das rodadas: amostras agregadas e medianas por rodada"""
+        from notifications.management.commands.benchmark_api import summarize
+        
+        rounds = [
+            ([0.01] * 10, [2] * 10, [200] * 10, 0.1),
+            ([0.02] * 10, [2] * 10, [200] * 10, 0.2),
+            ([0.01] * 9 + [0.5], [3] * 10, [200] * 9 + [404], 1.0),
+        ]
+        result = summarize(rounds)
+        
+        self.assertEqual(result['requests'], 30)
+        self.assertEqual(result['rounds'], 3)
+        self.assertEqual(result['sequential_rps'], 23.1)
+        self.assertEqual(result['sequential_rps_median'], 50.0)
+        self.assertEqual(result['p95_ms_median'], 20.0)
+        self.assertEqual(result['p99_ms'], 500.0)
+        self.assertEqual(result['queries_mean'], 2.33)
+        self.assertEqual(result['queries_max'], 3)
+        self.assertEqual(result['statuses'], {'200': 29, '404': 1})
+    
+    def test_compare_results(self):
+        """Testa as regressões de latência, de requisições por segundo e de consultas"""
+        from notifications.management.commands.benchmark_api import compare_results
+        
+        baseline = {'scenarios': {
+            'estavel': self.result(), 'lento': self.result(), 'consultas': self.result(),
+        }}
+        current = {'scenarios': {
+            'estavel': self.result(rps=90.0, p95=11.0),
+            'lento': self.result(rps=70.0, p95=13.0),
+            'consultas': self.result(queries=3.0),
+            'novo': self.result(),
+        }}
+        
+        lines, regressions = compare_results(baseline, current, 0.2)
+        
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(regressions, [
+            'lento: requisições por segundo caíram 30.0%',
+            'lento: p95 aumentou 30.0%',
+            'consultas: consultas por requisição passaram de 2.0 para 3.0',
+        ])
+    
+    def test_option_differences(self):
+        """Testa que execuções com opções de medição diferentes não são comparadas"""
+        from notifications.management.commands.benchmark_api import MEASUREMENT_OPTIONS, option_differences
+        
+        options = {name: 1 for name in MEASUREMENT_OPTIONS}
+        self.assertEqual(option_differences({'options': options}, {'options': dict(options)}), [])
+        self.assertEqual(
+            option_differences({'options': options}, {'options': {**options, 'rows': 500}}),
+            [('rows', 1, 500)]
+        )
+        self.assertIn(('rounds', None, 1), option_differences({}, {'options': options}))
@@ -0,0 +1,193 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+# Espera sugerida quando todas as conexões permitidas para o domínio estão
+# em uso; não há como prever quando uma delas será liberada.
+CONCURRENCY_RETRY_DELAY = 1.0
+
+
+def recipient_domain(recipient_email):
+    """
+    Extrai o domínio (normalizado) do email do destinatário.
+    """
+    return recipient_email.rsplit('@', 1)[-1].strip().lower()
+
+
+class DomainThrottled(Exception):
+    """
+    Levantada quando o envio para um domínio excede o limite configurado.
+    """
+    
+    def __init__(self, domain, retry_after):
+        super().__init__(
+            f"Limite de envio para o domínio {domain} atingido; "
+            f"nova tentativa em {retry_after:.1f}s"
+        )
+        self.domain = domain
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Token bucket: acumula `rate` fichas por segundo, até `burst`, e cada
+    envio consome uma ficha.
+    """
+    
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated = clock()
+    
+    def take(self):
+        """
+        Consome uma ficha, se houver.
+        
+        Returns:
+            float: 0 se a ficha foi consumida, ou os segundos até a próxima
+                ficha ficar disponível
+        """
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class DomainThrottle:
+    """
+    Limita a taxa de envios e o número de envios simultâneos por domínio do
+    destinatário, para não disparar o throttling/greylisting de provedores
+    como Gmail e Outlook.
+    
+    Os limites de cada domínio vêm de `limits` (domínio -> dicionário com
+    'rate', 'burst' e 'concurrency'), e os ausentes de `default`. Um valor
+    0 ou None desativa o limite correspondente. O estado é mantido em
+    memória, portanto os limites valem por processo.
+    """
+    
+    def __init__(self, limits=None, default=None, clock=time.monotonic):
+        self.limits = {domain.lower(): value for domain, value in (limits or {}).items()}
+        self.default = default or {}
+        self.clock = clock
+        self._buckets = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+    
+    def limits_for(self, domain):
+        return {**self.default, **self.limits.get(domain, {})}
+    
+    def take(self, domain):
+        """
+        Consome uma ficha de envio do domínio, sem ocupar uma conexão.
+        
+        Returns:
+            float: 0 se permitido, ou os segundos até poder tentar de novo
+        """
+        limits = self.limits_for(domain)
+        if not limits.get('rate'):
+            return 0.0
+        
+        with self._lock:
+            bucket = self._buckets.get(domain)
+            if bucket is None:
+                bucket = self._buckets[domain] = TokenBucket(
+                    limits['rate'], limits.get('burst') or max(1, limits['rate']), self.clock
+                )
+            return bucket.take()
+    
+    def acquire(self, domain):
+        """
+        Ocupa uma das conexões simultâneas permitidas para o domínio e
+        consome uma ficha de envio. Se retornar 0, o chamador deve chamar
+        release(domain) ao terminar o envio.
+        
+        Returns:
+            float: 0 se permitido, ou os segundos até poder tentar de novo
+        """
+        concurrency = self.limits_for(domain).get('concurrency')
+        
+        with self._lock:
+            in_flight = self._in_flight.get(domain, 0)
+            if concurrency and in_flight >= concurrency:
+                return CONCURRENCY_RETRY_DELAY
+            self._in_flight[domain] = in_flight + 1
+        
+        retry_after = self.take(domain)
+        if retry_after:
+            self.release(domain)
+        return retry_after
+    
+    def release(self, domain):
+        with self._lock:
+            self._in_flight[domain] -= 1
+            if not self._in_flight[domain]:
+                del self._in_flight[domain]
+    
+    @contextmanager
+    def slot(self, recipient_email):
+        """
+        Reserva o envio de uma mensagem para `recipient_email` durante o
+        bloco.
+        
+        Raises:
+            DomainThrottled: se o domínio estiver acima do limite
+        """
+        domain = recipient_domain(recipient_email)
+        retry_after = self.acquire(domain)
+        if retry_after:
+            raise DomainThrottled(domain, retry_after)
+        try:
+            yield
+        finally:
+            self.release(domain)
+
+
+_throttle = None
+_throttle_lock = threading.Lock()
+
+
+def get_throttle():
+    """
+    Retorna o limitador por domínio do processo, criado na primeira chamada
+    a partir das configurações NOTIFICATIONS_DOMAIN_*.
+    """
+    global _throttle
+    if _throttle is None:
+        with _throttle_lock:
+            if _throttle is None:
+                _throttle = DomainThrottle(
+                    limits=settings.NOTIFICATIONS_DOMAIN_LIMITS,
+                    default={
+                        'rate': settings.NOTIFICATIONS_DOMAIN_RATE,
+                        'burst': settings.NOTIFICATIONS_DOMAIN_BURST,
+                        'concurrency': settings.NOTIFICATIONS_DOMAIN_CONCURRENCY,
+                    },
+                )
+    return _throttle
+
+
+def reset_throttle():
+    """
+    Descarta o limitador do processo; o próximo get_throttle() cria um novo
+    com as configurações atuais.
+    """
+    global _throttle
+    with _throttle_lock:
+        _throttle = None
+
+
+@receiver(setting_changed)
+def _reset_throttle_on_setting_change(setting, **kwargs):
+    if setting.startswith('NOTIFICATIONS_DOMAIN_'):
+        reset_throttle()
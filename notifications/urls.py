@@ -1,10 +1,21 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import NotificationViewSet
+from .views import (
+    NotificationTemplateViewSet,
+    NotificationViewSet,
+    notification_events,
+    send_notification_async,
+    wait_notification,
+)
 
 router = DefaultRouter()
 router.register(r'notifications', NotificationViewSet, basename='notification')
+router.register(r'templates', NotificationTemplateViewSet, basename='notification-template')
 
 urlpatterns = [
+    # Antes das rotas do router, para não ser tomada pela rota de detalhes
+    path('notifications/send-async/', send_notification_async, name='notification-send-async'),
+    path('notifications/events/', notification_events, name='notification-events'),
+    path('notifications/<int:pk>/wait/', wait_notification, name='notification-wait'),
     path('', include(router.urls)),
 ]
@@ -1,13 +1,135 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.cache import patch_vary_headers
 
-from .models import Notification
-from .serializers import NotificationSerializer, SendNotificationSerializer
+from .caching import cache_response, conditional, validator_etag
+from .events import get_broker, read_events
+from .export import CSVRenderer, JSONLinesRenderer, buffered, export_lines, gzip_stream
+from .metrics import latency_by_priority
+from .models import Notification, NotificationCounter, NotificationTemplate, truncate_to_hour
+from .pagination import NotificationCursorPagination, NotificationPageNumberPagination
+from .serializers import (
+    BulkActionSerializer,
+    BulkRequeueSerializer,
+    NotificationSerializer,
+    NotificationTemplateSerializer,
+    SendNotificationSerializer,
+)
 from .services import EmailService
+from datetime import datetime, time, timedelta
+import asyncio
+import json
+
+
+def format_statistics(counts):
+    """
+    Monta o dicionário de estatísticas a partir das contagens por status.
+    """
+    total = counts['total']
+    sent = counts['sent']
+    return {
+        'total': total,
+        'sent': sent,
+        'failed': counts['failed'],
+        'pending': counts['pending'],
+        'success_rate': round((sent / total * 100) if total > 0 else 0, 2)
+    }
+
+
+def format_send_result(success, notification, error_message):
+    """
+    Monta o corpo e o status HTTP da resposta de um envio síncrono.
+    
+    Returns:
+        tuple: (data, status_code)
+    """
+    if success:
+        return {
+            'success': True,
+            'message': 'Notificação enviada com sucesso!',
+            'notification': NotificationSerializer(notification).data
+        }, status.HTTP_201_CREATED
+    elif notification.status == 'pending':
+        # Erro temporário, limite do domínio atingido ou duplicata de uma
+        # notificação ainda pendente: o envio acontece depois, pelos workers
+        return {
+            'success': False,
+            'message': (
+                'Envio adiado. Uma nova tentativa foi agendada.' if error_message
+                else 'Uma notificação idêntica já está pendente de envio.'
+            ),
+            'error': error_message,
+            'notification': NotificationSerializer(notification).data
+        }, status.HTTP_202_ACCEPTED
+    else:
+        return {
+            'success': False,
+            'message': 'Falha ao enviar notificação',
+            'error': error_message,
+            'notification': NotificationSerializer(notification).data
+        }, status.HTTP_500_INTERNAL_SERVER_ERROR
+
+
+def parse_period_boundary(value):
+    """
+    Converte um limite de período (data ou data e hora ISO 8601) em um
+    datetime com fuso horário. Retorna None se o valor for inválido.
+    """
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            date = parse_date(value)
+            if date is None:
+                return None
+            parsed = datetime.combine(date, time.min)
+    except ValueError:
+        return None
+    
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def parse_wait_timeout(value):
+    """
+    Converte o query parameter `timeout` das esperas (long-poll e SSE) em
+    segundos, limitado a NOTIFICATIONS_WAIT_MAX_TIMEOUT.
+    
+    Raises:
+        ValueError: se o valor for inválido ou estiver fora do limite
+    """
+    if not value:
+        return settings.NOTIFICATIONS_WAIT_TIMEOUT
+    timeout = float(value)
+    if not 0 <= timeout <= settings.NOTIFICATIONS_WAIT_MAX_TIMEOUT:
+        raise ValueError(value)
+    return timeout
+
+
+def format_sse(event, data):
+    """
+    Formata um evento server-sent events com dados em JSON.
+    """
+    return f'event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+
+
+def read_notification_data(pk):
+    """
+    Retorna a notificação serializada, ou None se ela não existir.
+    """
+    notification = Notification.objects.select_related('template', 'message_body').filter(pk=pk).first()
+    return None if notification is None else NotificationSerializer(notification).data
 
 
 class NotificationViewSet(viewsets.ModelViewSet):
@@ -18,6 +140,17 @@ class NotificationViewSet(viewsets.ModelViewSet):
     - GET /api/notifications/ - Lista todas as notificações
     - GET /api/notifications/{id}/ - Detalhes de uma notificação
     - POST /api/notifications/send/ - Envia uma nova notificação
+    - POST /api/notifications/send-batch/ - Envia um lote de notificações
+    - GET /api/notifications/latency/ - Latência de envio por prioridade
+    - GET /api/notifications/export/ - Exporta o histórico em JSONL ou CSV
+    - POST /api/notifications/send-async/ - Envio assíncrono (ASGI), fora
+      do ViewSet (ver send_notification_async)
+    - GET /api/notifications/{id}/wait/ - Aguarda o envio (long-poll, ASGI;
+      ver wait_notification)
+    - GET /api/notifications/events/ - Eventos de status (SSE, ASGI; ver
+      notification_events)
+    - POST /api/notifications/bulk-delete/ - Remove notificações em conjunto
+    - POST /api/notifications/bulk-requeue/ - Reenfileira notificações com falha
     - DELETE /api/notifications/{id}/ - Remove uma notificação
     """
     queryset = Notification.objects.all()
@@ -26,17 +159,194 @@ class NotificationViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """
-        Permite filtrar notificações por status via query parameter.
+        Permite filtrar notificações por status ou destinatário via query
+        parameter.
         Exemplo: /api/notifications/?status=sent
+        Exemplo: /api/notifications/?recipient_email=usuario@example.com
         """
-        queryset = Notification.objects.all()
+        # id desempata notificações criadas no mesmo instante, mantendo a
+        # ordem estável entre páginas e coberta por notif_created_id_idx
+        queryset = Notification.objects.order_by('-created_at', '-id')
         status_filter = self.request.query_params.get('status', None)
         
         if status_filter:
             queryset = queryset.filter(status=status_filter)
         
+        recipient_filter = self.request.query_params.get('recipient_email', None)
+        if recipient_filter:
+            queryset = queryset.filter(recipient_email=recipient_filter.strip().lower())
+        
+        list_fields = self.get_list_fields()
+        if list_fields is None or 'message' in list_fields:
+            # O corpo vem do MessageBody ou, nas notificações geradas por
+            # template, do template renderizado com o contexto
+            queryset = queryset.select_related('template', 'message_body')
+            if list_fields is not None:
+                list_fields = [
+                    *(field for field in list_fields if field != 'message'),
+                    'message_body', 'template', 'context'
+                ]
+        if list_fields is not None:
+            # Não carrega do banco as colunas que não serão serializadas,
+            # exceto created_at, usado no cursor da paginação
+            queryset = queryset.only(*list_fields, 'created_at')
+        
         return queryset
     
+    def create(self, request, *args, **kwargs):
+        """
+        Registra uma notificação pendente, entregue depois pelos workers.
+        
+        Como os envios, passa pela reserva do conteúdo (ver
+        EmailService.claim_notification): se já houver uma notificação
+        pendente ou enviada com o mesmo conteúdo, ela é retornada com status
+        200 em vez de uma nova ser criada.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # Instância não salva, apenas para obter o corpo (renderizado, se
+        # vier de um template) usado no hash do conteúdo
+        pending = Notification(**serializer.validated_data)
+        notification, created = EmailService.claim_notification(
+            pending.recipient_email,
+            pending.subject,
+            pending.body,
+            priority=pending.priority,
+            template=pending.template,
+            context=pending.context
+        )
+        return Response(
+            self.get_serializer(notification).data,
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+    
+    def update(self, request, *args, **kwargs):
+        """
+        Edita uma notificação. Se o novo conteúdo coincidir com o de outra
+        notificação pendente ou enviada, a resposta é 409, e a notificação
+        não é alterada.
+        """
+        try:
+            with transaction.atomic():
+                return super().update(request, *args, **kwargs)
+        except IntegrityError:
+            return Response(
+                {
+                    'success': False,
+                    'errors': {
+                        'non_field_errors': ['Já existe uma notificação pendente ou enviada com o mesmo conteúdo.']
+                    }
+                },
+                status=status.HTTP_409_CONFLICT
+            )
+    
+    @conditional
+    @cache_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    @conditional
+    @cache_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+    
+    def get_validators(self):
+        """
+        Retorna o ETag e a data da última alteração (Last-Modified) da
+        resposta de list/retrieve, sem serializar as notificações.
+        
+        Nos detalhes, vêm do updated_at da notificação, lido pela chave
+        primária (o corpo gerado por template não muda com edições do
+        template, ver Notification.template_version). Na listagem, o ETag vem do maior
+        updated_at das notificações que atendem aos filtros (pelos índices
+        notif_updated_idx e notif_status_updated_idx) e dos totais por status
+        de NotificationCounter, que mudam quando uma notificação é removida.
+        A listagem não tem Last-Modified: uma remoção não altera o maior
+        updated_at, e If-Modified-Since responderia 304 com a lista antiga.
+        """
+        if self.action == 'retrieve':
+            try:
+                updated_at = Notification.objects.filter(pk=self.kwargs['pk']).values_list(
+                    'updated_at', flat=True
+                ).first()
+            except (TypeError, ValueError):
+                return None
+            if updated_at is None:
+                return None
+            return validator_etag(self.request, updated_at), updated_at
+        
+        queryset = self.filter_queryset(self.get_queryset())
+        last_modified = queryset.order_by().aggregate(last_modified=Max('updated_at'))['last_modified']
+        return validator_etag(self.request, NotificationCounter.objects.totals(), last_modified), None
+    
+    def get_list_fields(self):
+        """
+        Retorna os campos serializados na listagem e na exportação, ou None
+        para todos os campos.
+        
+        Por padrão a listagem é resumida (NotificationSerializer.LIST_FIELDS),
+        sem o corpo da mensagem, que continua disponível nos detalhes, e a
+        exportação traz todos os campos. O query parameter `fields` escolhe
+        os campos (ex.: `?fields=id,status`), e `?fields=all` retorna todos.
+        """
+        if self.action not in ('list', 'export'):
+            return None
+        
+        requested = self.request.query_params.get('fields')
+        if not requested:
+            return NotificationSerializer.LIST_FIELDS if self.action == 'list' else None
+        
+        available = NotificationSerializer.Meta.fields
+        if requested == 'all':
+            return available
+        
+        fields = [name.strip() for name in requested.split(',') if name.strip()]
+        invalid = [name for name in fields if name not in available]
+        if invalid:
+            raise ValidationError({
+                'fields': [f"Campo(s) inválido(s): {', '.join(invalid)}. Disponíveis: {', '.join(available)}."]
+            })
+        return ['id'] + [name for name in fields if name != 'id']
+    
+    def get_serializer(self, *args, **kwargs):
+        list_fields = self.get_list_fields()
+        if list_fields is not None:
+            kwargs.setdefault('fields', list_fields)
+        return super().get_serializer(*args, **kwargs)
+    
+    @property
+    def paginator(self):
+        """
+        Escolhe a paginação da listagem: por cursor quando a requisição usa
+        `?pagination=cursor` ou já traz um `cursor`, ou conforme
+        NOTIFICATIONS_PAGINATION; caso contrário, por número de página.
+        """
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            mode = params.get('pagination', settings.NOTIFICATIONS_PAGINATION)
+            if mode == 'cursor' or 'cursor' in params:
+                self._paginator = NotificationCursorPagination()
+            else:
+                self._paginator = NotificationPageNumberPagination()
+        return self._paginator
+    
+    def get_send_mode(self, request):
+        """
+        Retorna o modo de envio ('sync' ou 'queue') da requisição, ou None se
+        o query parameter `mode` for inválido.
+        """
+        mode = request.query_params.get('mode', settings.NOTIFICATIONS_SEND_MODE)
+        return mode if mode in ('sync', 'queue') else None
+    
+    def invalid_mode_response(self):
+        return Response(
+            {
+                'success': False,
+                'errors': {'mode': ["Valor inválido. Use 'sync' ou 'queue'."]}
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
     @action(detail=False, methods=['post'], url_path='send')
     def send(self, request):
         """
@@ -46,8 +356,17 @@ class NotificationViewSet(viewsets.ModelViewSet):
         Body: {
             "recipient_email": "usuario@example.com",
             "subject": "Título da notificação",
-            "message": "Mensagem da notificação"
+            "message": "Mensagem da notificação",
+            "priority": "high"  (opcional: high, normal ou low)
         }
+        
+        No lugar de subject e message, pode-se usar um template:
+        {"recipient_email": "...", "template_id": 1, "context": {"nome": "Ana"}}
+        
+        Query parameter opcional `mode` (`sync` ou `queue`) sobrepõe
+        NOTIFICATIONS_SEND_MODE. No modo `queue` a notificação é apenas
+        registrada como pendente e a resposta é 202; a entrega fica a cargo
+        de `manage.py deliver_notifications`.
         """
         serializer = SendNotificationSerializer(data=request.data)
         
@@ -65,50 +384,565 @@ class NotificationViewSet(viewsets.ModelViewSet):
         recipient_email = validated_data['recipient_email']
         subject = validated_data['subject']
         message = validated_data['message']
+        priority = validated_data['priority']
+        template = validated_data.get('template')
+        context = validated_data.get('context')
+        
+        mode = self.get_send_mode(request)
+        if mode is None:
+            return self.invalid_mode_response()
+        
+        if mode == 'queue':
+            notification, created = EmailService.enqueue_notification(
+                recipient_email=recipient_email,
+                subject=subject,
+                message=message,
+                priority=priority,
+                template=template,
+                context=context
+            )
+            return Response(
+                {
+                    'success': True,
+                    'message': 'Notificação enfileirada para envio.',
+                    'notification': NotificationSerializer(notification).data
+                },
+                status=status.HTTP_202_ACCEPTED
+            )
         
         # Envia o email usando o serviço
         success, notification, error_message = EmailService.send_notification(
             recipient_email=recipient_email,
             subject=subject,
-            message=message
+            message=message,
+            priority=priority,
+            template=template,
+            context=context
+        )
+        
+        data, status_code = format_send_result(success, notification, error_message)
+        return Response(data, status=status_code)
+    
+    @action(detail=False, methods=['post'], url_path='send-batch')
+    def send_batch(self, request):
+        """
+        Endpoint para envio de várias notificações em uma única requisição.
+        
+        POST /api/notifications/send-batch/
+        Body: [
+            {"recipient_email": "...", "subject": "...", "message": "..."},
+            ...
+        ]
+        
+        Aceita o mesmo query parameter `mode` do endpoint de envio. A resposta
+        traz o resultado de cada item, na ordem em que foram enviados.
+        """
+        serializer = SendNotificationSerializer(
+            data=request.data,
+            many=True,
+            allow_empty=False,
+            max_length=settings.NOTIFICATIONS_BATCH_MAX_SIZE
         )
         
-        if success:
+        if not serializer.is_valid():
             return Response(
                 {
-                    'success': True,
-                    'message': 'Notificação enviada com sucesso!',
-                    'notification': NotificationSerializer(notification).data
+                    'success': False,
+                    'errors': serializer.errors
                 },
-                status=status.HTTP_201_CREATED
+                status=status.HTTP_400_BAD_REQUEST
             )
-        else:
+        
+        mode = self.get_send_mode(request)
+        if mode is None:
+            return self.invalid_mode_response()
+        
+        results = EmailService.send_batch(
+            serializer.validated_data,
+            deliver=(mode == 'sync')
+        )
+        
+        failed = sum(
+            1 for result in results
+            if result['error'] and result['notification'].status == 'failed'
+        )
+        deferred = sum(
+            1 for result in results
+            if result['error'] and result['notification'].status == 'pending'
+        )
+        duplicates = sum(1 for result in results if result['duplicate'])
+        return Response(
+            {
+                'success': failed == 0,
+                'total': len(results),
+                'created': len(results) - duplicates,
+                'duplicates': duplicates,
+                'failed': failed,
+                'deferred': deferred,
+                'results': [
+                    {
+                        'index': index,
+                        'id': result['notification'].id,
+                        'status': result['notification'].status,
+                        'duplicate': result['duplicate'],
+                        'error': result['error'],
+                    }
+                    for index, result in enumerate(results)
+                ]
+            },
+            status=status.HTTP_202_ACCEPTED if mode == 'queue' else status.HTTP_200_OK
+        )
+    
+    @action(detail=False, methods=['post'], url_path='bulk-delete')
+    def bulk_delete(self, request):
+        """
+        Endpoint para remover várias notificações de uma vez.
+        
+        POST /api/notifications/bulk-delete/
+        Body: {"ids": [1, 2, 3]} e/ou filtros: {"status": "failed",
+        "recipient_email": "...", "since": "...", "until": "..."}
+        
+        A remoção é feita em blocos de NOTIFICATIONS_BULK_CHUNK_SIZE, com um
+        DELETE por bloco, sem carregar as notificações.
+        """
+        serializer = BulkActionSerializer(data=request.data)
+        if not serializer.is_valid():
             return Response(
                 {
                     'success': False,
-                    'message': 'Falha ao enviar notificação',
-                    'error': error_message,
-                    'notification': NotificationSerializer(notification).data
+                    'errors': serializer.errors
                 },
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                status=status.HTTP_400_BAD_REQUEST
             )
+        
+        deleted = Notification.objects.bulk_delete(
+            serializer.filter_queryset(Notification.objects.all())
+        )
+        return Response({'success': True, 'deleted': deleted})
+    
+    @action(detail=False, methods=['post'], url_path='bulk-requeue')
+    def bulk_requeue(self, request):
+        """
+        Endpoint para devolver à fila de entrega notificações com falha.
+        
+        POST /api/notifications/bulk-requeue/
+        Body: {"ids": [1, 2, 3]} e/ou filtros: {"recipient_email": "...",
+        "since": "...", "until": "..."}
+        
+        As notificações com falha selecionadas voltam a pendentes, com as
+        tentativas zeradas, e são entregues pelos workers (comando
+        deliver_notifications). As que já têm outra notificação pendente ou
+        enviada com o mesmo conteúdo são ignoradas (`skipped`).
+        """
+        serializer = BulkRequeueSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(
+                {
+                    'success': False,
+                    'errors': serializer.errors
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        requeued, skipped = Notification.objects.bulk_requeue(
+            serializer.filter_queryset(Notification.objects.all())
+        )
+        return Response({'success': True, 'requeued': requeued, 'skipped': skipped})
     
     @action(detail=False, methods=['get'], url_path='statistics')
+    @cache_response
     def statistics(self, request):
         """
         Endpoint para obter estatísticas de notificações.
         
         GET /api/notifications/statistics/
+        
+        Query parameters opcionais:
+        - since / until: limitam o período pela data de criação (ISO 8601),
+          com granularidade de uma hora
+        - group_by: `day` ou `hour`, inclui a série temporal em `series`
+        
+        Os valores são lidos da tabela de contadores (NotificationCounter),
+        mantida a cada criação ou mudança de status, então o custo não
+        depende do tamanho da tabela de notificações.
         """
-        total = Notification.objects.count()
-        sent = Notification.objects.filter(status='sent').count()
-        failed = Notification.objects.filter(status='failed').count()
-        pending = Notification.objects.filter(status='pending').count()
+        errors = {}
+        period = {}
+        for param, lookup in (('since', 'bucket__gte'), ('until', 'bucket__lt')):
+            value = request.query_params.get(param)
+            if value:
+                parsed = parse_period_boundary(value)
+                if parsed is None:
+                    errors[param] = ['Data inválida. Use o formato ISO 8601.']
+                else:
+                    period[lookup] = parsed
+        
+        group_by = request.query_params.get('group_by')
+        if group_by and group_by not in ('day', 'hour'):
+            errors['group_by'] = ["Valor inválido. Use 'day' ou 'hour'."]
+        
+        if errors:
+            return Response(
+                {
+                    'success': False,
+                    'errors': errors
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if 'bucket__gte' in period:
+            # O bucket da hora que contém `since` também entra no período
+            period['bucket__gte'] = truncate_to_hour(period['bucket__gte'])
+        
+        counters = NotificationCounter.objects
+        if period:
+            data = format_statistics(counters.totals(counters.filter(period='hour', **period)))
+        else:
+            data = format_statistics(counters.totals())
+        
+        if group_by:
+            if 'bucket__gte' in period and group_by == 'day':
+                period['bucket__gte'] = period['bucket__gte'].replace(hour=0)
+            data['series'] = [
+                {'bucket': bucket['bucket'], **format_statistics(bucket)}
+                for bucket in counters.series(group_by, counters.filter(**period))
+            ]
+        
+        return Response(data)
+    
+    @action(detail=False, methods=['get'], url_path='latency')
+    def latency(self, request):
+        """
+        Endpoint com a latência de envio (do registro até o envio) de cada
+        faixa de prioridade.
+        
+        GET /api/notifications/latency/
+        
+        Query parameters opcionais:
+        - since / until: período pela data de envio (ISO 8601); por padrão,
+          a última hora
+        
+        Para cada faixa retorna a quantidade de notificações enviadas, os
+        quantis p50, p95 e p99 (em segundos, estimados a partir de um
+        histograma) e o próprio histograma cumulativo.
+        """
+        errors = {}
+        period = {}
+        for param in ('since', 'until'):
+            value = request.query_params.get(param)
+            if value:
+                period[param] = parse_period_boundary(value)
+                if period[param] is None:
+                    errors[param] = ['Data inválida. Use o formato ISO 8601.']
+        
+        if errors:
+            return Response(
+                {
+                    'success': False,
+                    'errors': errors
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        until = period.get('until') or timezone.now()
+        since = period.get('since') or until - timedelta(hours=1)
+        queryset = Notification.objects.filter(sent_at__gte=since, sent_at__lt=until)
         
         return Response({
-            'total': total,
-            'sent': sent,
-            'failed': failed,
-            'pending': pending,
-            'success_rate': round((sent / total * 100) if total > 0 else 0, 2)
+            'since': since,
+            'until': until,
+            'lanes': latency_by_priority(queryset),
         })
+    
+    @action(
+        detail=False, methods=['get'], url_path='export',
+        renderer_classes=[JSONLinesRenderer, CSVRenderer]
+    )
+    def export(self, request):
+        """
+        Endpoint de exportação do histórico de notificações.
+        
+        GET /api/notifications/export/?format=jsonl|csv
+        
+        Query parameters opcionais:
+        - format: `jsonl` (padrão, um objeto JSON por linha) ou `csv`; o
+          formato também pode vir do cabeçalho Accept
+        - status / recipient_email / fields: os mesmos da listagem, mas
+          por padrão com todos os campos
+        - since / until: período pela data de criação (ISO 8601)
+        
+        As linhas são geradas durante o envio da resposta, lendo o banco em
+        blocos de NOTIFICATIONS_EXPORT_CHUNK_SIZE notificações, de modo que
+        a memória usada não depende do tamanho do resultado. Com
+        `Accept-Encoding: gzip`, a resposta é comprimida também durante o
+        envio.
+        """
+        errors = {}
+        queryset = self.get_queryset()
+        for param, lookup in (('since', 'created_at__gte'), ('until', 'created_at__lt')):
+            value = request.query_params.get(param)
+            if value:
+                parsed = parse_period_boundary(value)
+                if parsed is None:
+                    errors[param] = ['Data inválida. Use o formato ISO 8601.']
+                else:
+                    queryset = queryset.filter(**{lookup: parsed})
+        
+        if errors:
+            return Response(
+                {
+                    'success': False,
+                    'errors': errors
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        serializer = self.get_serializer()
+        if 'message' in serializer.fields:
+            # O corpo é buscado uma vez por bloco para cada MessageBody
+            # distinto, em vez de repetido em cada linha do JOIN
+            queryset = queryset.select_related(None).select_related('template').prefetch_related(
+                'message_body'
+            )
+        notifications = queryset.iterator(chunk_size=settings.NOTIFICATIONS_EXPORT_CHUNK_SIZE)
+        export_format = request.accepted_renderer.format
+        chunks = buffered(export_lines(notifications, serializer, export_format))
+        
+        compress = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        response = StreamingHttpResponse(
+            gzip_stream(chunks) if compress else chunks,
+            content_type=f'{request.accepted_renderer.media_type}; charset=utf-8'
+        )
+        response['Content-Disposition'] = f'attachment; filename="notifications.{export_format}"'
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
+
+class NotificationTemplateViewSet(viewsets.ModelViewSet):
+    """
+    ViewSet para gerenciamento dos templates de notificação.
+    
+    Endpoints disponíveis:
+    - GET/POST /api/templates/ - Lista ou cria templates
+    - GET/PUT/PATCH/DELETE /api/templates/{id}/ - Detalhes, edição ou remoção
+    
+    Templates já usados por notificações não podem ser removidos.
+    """
+    queryset = NotificationTemplate.objects.all()
+    serializer_class = NotificationTemplateSerializer
+    permission_classes = [AllowAny]  # Em produção, considerar adicionar autenticacao
+    
+    def destroy(self, request, *args, **kwargs):
+        template = self.get_object()
+        if template.notifications.exists():
+            return Response(
+                {
+                    'success': False,
+                    'errors': {'template': ['O template está em uso por notificações e não pode ser removido.']}
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return super().destroy(request, *args, **kwargs)
+
+
+async def send_notification_async(request):
+    """
+    Versão assíncrona (ASGI) do endpoint de envio.
+    
+    POST /api/notifications/send-async/
+    Body: o mesmo de POST /api/notifications/send/
+    
+    O envio usa EmailService.asend_notification: servido por ASGI (ver
+    config/asgi.py), um único processo mantém muitas conversas SMTP em
+    andamento sem ocupar uma thread por requisição. As respostas são as
+    mesmas do envio síncrono (201, 202 ou 500).
+    
+    É uma view Django comum, e não uma action do ViewSet, porque as views
+    do Django REST Framework são apenas síncronas.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse(
+            {
+                'success': False,
+                'errors': {'non_field_errors': ['JSON inválido.']}
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    serializer = SendNotificationSerializer(data=payload)
+    # A validação pode consultar o banco (template_id)
+    if not await sync_to_async(serializer.is_valid)():
+        return JsonResponse(
+            {
+                'success': False,
+                'errors': serializer.errors
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    success, notification, error_message = await EmailService.asend_notification(
+        **serializer.validated_data
+    )
+    data, status_code = format_send_result(success, notification, error_message)
+    return JsonResponse(data, status=status_code)
+
+
+# A API não usa autenticação por sessão (como as views do DRF, que já são
+# isentas de CSRF). O decorator csrf_exempt do Django 4.2 não preserva
+# views assíncronas, por isso o atributo é definido diretamente.
+send_notification_async.csrf_exempt = True
+
+
+def timeout_error_response():
+    return JsonResponse(
+        {
+            'success': False,
+            'errors': {
+                'timeout': [
+                    f"Informe um número de segundos entre 0 e {settings.NOTIFICATIONS_WAIT_MAX_TIMEOUT}."
+                ]
+            }
+        },
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+
+async def wait_notification(request, pk):
+    """
+    Aguarda (long-poll) até que uma notificação deixe de estar pendente.
+    
+    GET /api/notifications/{id}/wait/?timeout=30
+    
+    Responde com a notificação serializada, como os detalhes, assim que ela
+    for enviada ou falhar, ou ao fim de `timeout` segundos (padrão
+    NOTIFICATIONS_WAIT_TIMEOUT); nesse caso, o status continua 'pending' e
+    o cliente pode repetir a requisição. Se a notificação já não estiver
+    pendente, a resposta é imediata.
+    
+    A espera não ocupa uma thread nem consulta o banco a cada cliente: os
+    eventos vêm do broker do processo (ver notifications/events.py).
+    Deve ser servida por ASGI (config/asgi.py); por WSGI, cada espera
+    ocupa um worker.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        timeout = parse_wait_timeout(request.GET.get('timeout'))
+    except ValueError:
+        return timeout_error_response()
+    
+    read = sync_to_async(read_notification_data)
+    not_found = JsonResponse({'detail': str(NotFound.default_detail)}, status=status.HTTP_404_NOT_FOUND)
+    # A inscrição é feita antes da leitura, para não perder uma transição
+    # que aconteça entre as duas
+    with get_broker().subscribe([pk]) as subscription:
+        data = await read(pk)
+        if data is None:
+            return not_found
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while data['status'] == 'pending':
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            event = await subscription.next_event(remaining)
+            if event is None:
+                break
+            if event['status'] != 'pending':
+                data = await read(pk)
+                if data is None:
+                    return not_found
+    return JsonResponse(data)
+
+
+# Intervalo máximo, em segundos, sem dados no stream SSE
+SSE_KEEPALIVE_INTERVAL = 15
+
+
+async def notification_status_stream(ids, timeout):
+    """
+    Gera os eventos SSE de notification_events.
+    """
+    with get_broker().subscribe(ids) as subscription:
+        pending = set()
+        for event in await sync_to_async(read_events)(ids):
+            subscription.mark(event)
+            if event['status'] == 'pending':
+                pending.add(event['id'])
+            yield format_sse('status', event)
+        
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            event = await subscription.next_event(min(remaining, SSE_KEEPALIVE_INTERVAL))
+            if event is None:
+                # Comentário SSE: mantém a conexão aberta em proxies
+                yield ': keep-alive\n\n'
+                continue
+            yield format_sse('status', event)
+            if event['status'] == 'pending':
+                pending.add(event['id'])
+            else:
+                pending.discard(event['id'])
+        yield format_sse('end', {'pending': sorted(pending)})
+
+
+async def notification_events(request):
+    """
+    Stream server-sent events (SSE) das mudanças de status de um conjunto
+    de notificações.
+    
+    GET /api/notifications/events/?ids=1,2,3&timeout=60
+    
+    Envia primeiro um evento `status` com o estado atual de cada notificação
+    encontrada e depois um a cada mudança (envio, falha, nova tentativa
+    agendada). O stream termina com um evento `end` quando nenhuma das
+    notificações está pendente ou ao fim de `timeout` segundos (padrão
+    NOTIFICATIONS_WAIT_TIMEOUT), trazendo os ids ainda pendentes.
+    
+    São aceitos até NOTIFICATIONS_EVENTS_MAX_IDS ids. Como wait_notification,
+    deve ser servida por ASGI.
+    """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        timeout = parse_wait_timeout(request.GET.get('timeout'))
+    except ValueError:
+        return timeout_error_response()
+    
+    try:
+        ids = {int(value) for value in request.GET.get('ids', '').split(',') if value.strip()}
+    except ValueError:
+        ids = None
+    if not ids or len(ids) > settings.NOTIFICATIONS_EVENTS_MAX_IDS:
+        return JsonResponse(
+            {
+                'success': False,
+                'errors': {
+                    'ids': [
+                        f"Informe de 1 a {settings.NOTIFICATIONS_EVENTS_MAX_IDS} ids numéricos "
+                        f"separados por vírgula."
+                    ]
+                }
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    response = StreamingHttpResponse(
+        notification_status_stream(sorted(ids), timeout), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Desativa o buffer de proxies como o nginx, que atrasaria os eventos
+    response['X-Accel-Buffering'] = 'no'
+    return response